@@ -0,0 +1,480 @@
+"""
+Запросы и формирование ответов API дашборда.
+
+Общие для синхронного app.py (Flask) и асинхронного app_async.py (ASGI):
+здесь только SQL и превращение DataFrame в JSON-ответ, без работы с сетью.
+"""
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from warehouse.grid import (
+    sql_latitude, sql_longitude, sql_point_filter, sql_bbox_filter, check_coordinates
+)
+from warehouse.rollups import rollup_table
+
+MODEL_PATH = os.path.join('ml_models', 'weather_model.pkl')
+
+
+def load_model(path=MODEL_PATH):
+    """ML модель для прогноза (None, если не обучена)."""
+    try:
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                model = pickle.load(f)
+            print("✅ ML Модель успешно загружена")
+            return model
+        print("⚠️ ML Модель не найдена. Запустите python -m ML.train_model")
+    except Exception as e:
+        print(f"❌ Ошибка загрузки модели: {e}")
+    return None
+
+
+# ==========================================
+# 📊 ГЛАВНАЯ СТРАНИЦА (Сводка + ML)
+# ==========================================
+
+# KPI: Аномалия температуры и Экстремальные дни.
+# Сравниваем последний доступный год с историей. Последний год считается
+# скалярным подзапросом в том же запросе — без отдельного похода в базу.
+KPI_QUERY = """
+WITH (SELECT max(year) FROM fact_weather) AS last_year
+SELECT
+    last_year,
+    -- 1. РАСЧЕТ АНОМАЛИИ
+    round(avgIf(temperature_c, year = last_year), 2) as current_avg,
+    round(avgIf(temperature_c, year < last_year), 2) as history_avg,
+
+    -- 2. ЭКСТРЕМАЛЬНЫЕ СОБЫТИЯ (Считаем ДНИ, а не часы)
+    -- uniqExactIf считает уникальные даты, когда условие выполнилось
+    uniqExactIf(date, year = last_year AND (temperature_c > 35 OR temperature_c < -20)) as extreme_days_count,
+
+    -- Для сравнения: сколько таких дней было в среднем раньше (за год)
+    -- (Общее кол-во экстремальных дней в истории) / (Кол-во лет в истории)
+    round(
+        uniqExactIf(date, year < last_year AND (temperature_c > 35 OR temperature_c < -20)) /
+        uniqExact(year)
+    , 1) as hist_extreme_avg
+
+-- Календарные колонки лежат в самой fact_weather (без JOIN с dim_time)
+FROM fact_weather
+"""
+
+
+def kpi_payload(df):
+    if df.empty:
+        return {}
+
+    row = df.iloc[0]
+
+    # Считаем разницу (Аномалию)
+    anomaly = round(row['current_avg'] - row['history_avg'], 2)
+
+    return {
+        'year': int(row['last_year']),
+
+        # Аномалия
+        'current_temp': row['current_avg'],
+        'temp_anomaly': anomaly, # Например: +1.4
+
+        # Экстремальные дни
+        'extreme_days': int(row['extreme_days_count']),
+        'extreme_hist_avg': row['hist_extreme_avg'] # Для контекста (было 5, стало 15)
+    }
+
+
+# ==========================================
+# DESCRIPTIVE ANALYTICS: Описательная
+# ==========================================
+
+# График 1: Климатический тренд (1940-Present).
+# Показывает среднегодовую температуру и сглаженный тренд.
+TREND_QUERY = """
+SELECT
+    year,
+    -- Обычная средняя температура за год
+    round(avgMerge(temp_avg), 2) as avg_temp,
+    -- Скользящее среднее за 10 лет (чтобы показать долгосрочный тренд изменения климата)
+    round(avg(avgMerge(temp_avg)) OVER (ORDER BY year ROWS BETWEEN 9 PRECEDING AND CURRENT ROW), 2) as trend_line
+-- Годовой rollup: по строке на точку и год вместо почасовых фактов
+FROM weather_yearly
+GROUP BY year
+ORDER BY year
+"""
+
+
+def trend_payload(df):
+    return {
+        'years': df['year'].tolist(),
+        'avg_temp': df['avg_temp'].tolist(),
+        'trend': df['trend_line'].tolist()
+    }
+
+
+# График 2: Гистограмма распределения (ПО ДНЯМ).
+# Сначала считаем среднесуточную температуру, потом распределение.
+HISTOGRAM_QUERY = """
+SELECT
+    floor(daily_avg) as temp_bin,
+    count() as days_count
+FROM (
+    -- Внутренний запрос: Считаем среднюю температуру для каждого дня
+    SELECT
+        date as date_val,
+        avg(temperature_c) as daily_avg
+    FROM fact_weather
+    GROUP BY date_val
+)
+GROUP BY temp_bin
+ORDER BY temp_bin
+"""
+
+
+def histogram_payload(df):
+    return {
+        'bins': df['temp_bin'].tolist(),
+        'freq': df['days_count'].tolist()
+    }
+
+
+# ==========================================
+# DIAGNOSTIC ANALYTICS: Диагностика
+# ==========================================
+
+# Анализ влияния факторов на температуру.
+# Используем функцию corr() для расчета коэффициента Пирсона.
+CORRELATIONS_QUERY = """
+SELECT
+    round(corr(temperature_c, solar_radiation), 3) as radiation,
+    round(corr(temperature_c, dewpoint_c), 3) as dewpoint,
+    round(corr(temperature_c, pressure_hpa), 3) as pressure,
+    round(corr(temperature_c, cloud_cover), 3) as clouds,
+    round(corr(temperature_c, wind_speed_ms), 3) as wind,
+    round(corr(temperature_c, precipitation_mm), 3) as precip
+FROM fact_weather
+"""
+
+
+def correlations_payload(df):
+    if df.empty:
+        return []
+
+    # Преобразуем в удобный формат для графика
+    # Сортируем по модулю корреляции (по силе влияния)
+    factors = [
+        {'name': 'Солнечная радиация', 'value': df['radiation'][0], 'code': 'radiation'},
+        {'name': 'Точка росы (Влажность)', 'value': df['dewpoint'][0], 'code': 'dewpoint'},
+        {'name': 'Атм. Давление', 'value': df['pressure'][0], 'code': 'pressure'},
+        {'name': 'Облачность', 'value': df['clouds'][0], 'code': 'clouds'},
+        {'name': 'Скорость ветра', 'value': df['wind'][0], 'code': 'wind'},
+        {'name': 'Осадки', 'value': df['precip'][0], 'code': 'precip'}
+    ]
+
+    # Сортировка: самые влиятельные сверху (по абсолютному значению)
+    factors.sort(key=lambda x: abs(x['value']), reverse=True)
+
+    return {
+        'names': [f['name'] for f in factors],
+        'values': [f['value'] for f in factors],
+        'colors': ['#FF6B6B' if f['value'] > 0 else '#4ECDC4' for f in factors] # Красный для +, Синий для -
+    }
+
+
+# ==========================================
+# PREDICTIVE / PRESCRIPTIVE ANALYTICS
+# ==========================================
+
+# Последние известные данные (168 часов = 7 дней) — основа признаков на будущее.
+# Важно: Порядок колонок должен СТРОГО совпадать с тем, как обучалась модель!
+FORECAST_QUERY = f"""
+SELECT
+    f.pressure_hpa, f.dewpoint_c, f.precipitation_mm,
+    f.wind_speed_ms, f.cloud_cover, f.solar_radiation,
+    {sql_latitude('f.location_id')} AS latitude, {sql_longitude('f.location_id')} AS longitude,
+    f.month, f.hour, f.day_of_week, f.timestamp
+FROM fact_weather f
+ORDER BY f.time_id DESC
+LIMIT 168
+"""
+
+
+def predictive_payload(model, df):
+    """Прогноз на БУДУЩЕЕ (Next 7 days) с доверительным интервалом."""
+    if df.empty:
+        return {'data': [], 'layout': {}}
+
+    # Сортируем от старого к новому
+    df = df.sort_values('timestamp')
+
+    # 2. Генерация БУДУЩИХ дат
+    last_timestamp = pd.to_datetime(df['timestamp'].iloc[-1])
+    future_dates = [last_timestamp + pd.Timedelta(hours=i+1) for i in range(len(df))]
+
+    # 3. Подготовка признаков (X)
+    # В реальном продакшене тут нужен прогноз погоды от метеослужбы.
+    # Для курсовой мы берем паттерны прошлой недели как "прогноз синоптиков" на следующую неделю.
+    X = df.drop(columns=['timestamp'])
+
+    # 4. Предсказание
+    try:
+        base_prediction = model.predict(X)
+    except Exception as e:
+        print(f"Prediction error: {e}")
+        return {'data': [], 'layout': {}}
+
+    # 5. Расчет Доверительного Интервала (Confidence Interval)
+    # Мы симулируем рост неопределенности со временем.
+    # Базовая ошибка модели (допустим 1.5 градуса) + 0.02 градуса за каждый час прогноза
+    uncertainty_growth = np.array([1.5 + (i * 0.05) for i in range(len(base_prediction))])
+
+    upper_bound = base_prediction + uncertainty_growth
+    lower_bound = base_prediction - uncertainty_growth
+
+    # 6. Формирование данных для графика
+    # Нам нужно 3 линии: Нижняя граница, Верхняя граница (залитая), Основная линия
+
+    # x ось
+    x_axis = [str(d) for d in future_dates]
+
+    chart_data = [
+        # 1. Нижняя граница (невидимая линия, нужна для заливки)
+        {
+            'x': x_axis,
+            'y': lower_bound.tolist(),
+            'type': 'scatter',
+            'mode': 'lines',
+            'line': {'width': 0},
+            'marker': {'color': '#444'},
+            'showlegend': False,
+            'name': 'Lower'
+        },
+        # 2. Верхняя граница (заливка до нижней)
+        {
+            'x': x_axis,
+            'y': upper_bound.tolist(),
+            'type': 'scatter',
+            'mode': 'lines',
+            'line': {'width': 0},
+            'marker': {'color': '#444'},
+            'fill': 'tonexty', # Заливка до предыдущего графика
+            'fillcolor': 'rgba(255, 107, 107, 0.2)', # Полупрозрачный красный
+            'showlegend': True,
+            'name': 'Доверительный интервал (95%)'
+        },
+        # 3. Основной прогноз
+        {
+            'x': x_axis,
+            'y': base_prediction.tolist(),
+            'type': 'scatter',
+            'mode': 'lines',
+            'name': 'Прогноз температуры',
+            'line': {'color': '#FF6B6B', 'width': 3}
+        }
+    ]
+
+    layout = {
+        'title': 'Прогноз температуры на 7 дней вперед',
+        'xaxis': {'title': 'Будущее время'},
+        'yaxis': {'title': 'Температура (°C)'},
+        'template': 'plotly_white',
+        'hovermode': 'x unified'
+    }
+
+    return {'data': chart_data, 'layout': layout}
+
+
+def prescriptive_payload(model, df):
+    if df.empty:
+        print("❌ DataFrame is empty")
+        return {'error': 'No data in ClickHouse'}
+
+    # 2. Подготовка данных
+    # Удаляем timestamp, так как модель на нем не училась
+    X = df.drop(columns=['timestamp'])
+
+    # 3. Предсказание с отловом ошибок
+    try:
+        forecast = model.predict(X)
+    except Exception as e:
+        print(f"❌ Ошибка предсказания (Predict Error): {e}")
+        # Часто бывает разница в количестве фичей
+        print(f"Модель ждет {model.n_features_in_} колонок, пришло {X.shape[1]}")
+        print(f"Колонки пришедшие: {list(X.columns)}")
+        return {'error': str(e)}
+
+    # 4. Анализ
+    avg_temp = np.mean(forecast)
+    min_temp = np.min(forecast)
+    max_temp = np.max(forecast)
+    avg_wind = df['wind_speed_ms'].mean()
+    total_precip = df['precipitation_mm'].sum()
+
+    # 5. Рекомендации
+    recommendations = []
+
+    # ЖКХ
+    if min_temp < -15:
+        recommendations.append({'sector': 'ЖКХ и Энергетика', 'icon': '🔥', 'status': 'danger', 'action': 'Внимание! Сильные морозы.', 'detail': 'Повысить температуру теплоносителя.'})
+    elif min_temp < 0:
+        recommendations.append({'sector': 'ЖКХ и Энергетика', 'icon': '🏢', 'status': 'warning', 'action': 'Штатный зимний режим.', 'detail': 'Мониторинг давления газа.'})
+    else:
+        recommendations.append({'sector': 'ЖКХ и Энергетика', 'icon': '💡', 'status': 'success', 'action': 'Экономичный режим.', 'detail': 'Снизить нагрузку на сети.'})
+
+    # Агро
+    if max_temp > 30 and total_precip < 1:
+        recommendations.append({'sector': 'Сельское хозяйство', 'icon': '🌾', 'status': 'danger', 'action': 'Угроза засухи!', 'detail': 'Активировать полив.'})
+    elif avg_temp > 5 and avg_temp < 25:
+        recommendations.append({'sector': 'Сельское хозяйство', 'icon': '🚜', 'status': 'success', 'action': 'Благоприятные условия.', 'detail': 'Посевные работы в норме.'})
+    else:
+        recommendations.append({'sector': 'Сельское хозяйство', 'icon': '❄️', 'status': 'warning', 'action': 'Риск заморозков.', 'detail': 'Укрыть культуры.'})
+
+    # Транспорт
+    if avg_wind > 10 or total_precip > 20:
+        recommendations.append({'sector': 'Транспорт и МЧС', 'icon': '⚠️', 'status': 'danger', 'action': 'Штормовое предупреждение.', 'detail': 'Ограничить движение.'})
+    elif min_temp < 0 and total_precip > 5:
+        recommendations.append({'sector': 'Транспорт и МЧС', 'icon': '🚗', 'status': 'warning', 'action': 'Гололедица.', 'detail': 'Подготовить реагенты.'})
+    else:
+        recommendations.append({'sector': 'Транспорт и МЧС', 'icon': '✅', 'status': 'success', 'action': 'Дороги чистые.', 'detail': 'Штатный режим.'})
+
+    return {
+        'forecast_summary': f"Прогноз: {round(min_temp)}...{round(max_temp)}°C",
+        'recs': recommendations
+    }
+
+
+# ==========================================
+# СВОДКА ГЛАВНОЙ СТРАНИЦЫ ОДНИМ ОТВЕТОМ
+# ==========================================
+
+# Независимые запросы главной страницы; прогноз один на predictive и prescriptive
+SUMMARY_QUERIES = {
+    'kpi': KPI_QUERY,
+    'trend': TREND_QUERY,
+    'histogram': HISTOGRAM_QUERY,
+    'correlations': CORRELATIONS_QUERY,
+    'forecast': FORECAST_QUERY,
+}
+
+
+def summary_payload(model, frames):
+    """Ответы всех API главной страницы; frames — {имя из SUMMARY_QUERIES: DataFrame}."""
+    forecast = frames['forecast']
+    return {
+        'kpi': kpi_payload(frames['kpi']),
+        'trend': trend_payload(frames['trend']),
+        'histogram': histogram_payload(frames['histogram']),
+        'correlations': correlations_payload(frames['correlations']),
+        'predictive': predictive_payload(model, forecast) if model else {'data': [], 'layout': {}},
+        'prescriptive': prescriptive_payload(model, forecast) if model else {'error': 'Model not loaded'},
+    }
+
+
+# ==========================================
+# 🔍 ДАШБОРД (Drill-down, Filters)
+# ==========================================
+
+def _float_arg(args, name):
+    # Как request.args.get(name, type=float) во Flask: нет или не число — None
+    try:
+        return float(args[name]) if args.get(name) is not None else None
+    except ValueError:
+        return None
+
+
+def drilldown_query(args):
+    """
+    SQL для drill-down по параметрам запроса (любой mapping с .get: Flask request.args,
+    Starlette query_params). Возвращает (query, None) или (None, текст ошибки).
+    """
+    # 1. Получаем параметры
+    group_by = args.get('group_by', 'year')
+    agg_func = args.get('agg_func', 'avg').lower()
+    try:
+        # Годы подставляются в SQL (и ключ кэша) — только целые числа
+        start_year = int(args.get('start_year', 2000))
+        end_year = int(args.get('end_year', 2025))
+    except (TypeError, ValueError):
+        return None, 'start_year и end_year должны быть целыми числами'
+
+    # Пространственный фильтр: точка (lat, lon) или прямоугольник (lat_min, lat_max, lon_min, lon_max)
+    lat = _float_arg(args, 'lat')
+    lon = _float_arg(args, 'lon')
+    bbox = [_float_arg(args, name) for name in ('lat_min', 'lat_max', 'lon_min', 'lon_max')]
+    try:
+        # nan, inf и координаты вне диапазона — ошибка запроса (400), а не 500 при округлении
+        check_coordinates([v for v in (lat, *bbox[:2]) if v is not None],
+                          [v for v in (lon, *bbox[2:]) if v is not None])
+    except ValueError as e:
+        return None, str(e)
+    if lat is not None and lon is not None:
+        location_filter = sql_point_filter(lat, lon, 'f.location_id')
+    elif all(v is not None for v in bbox):
+        location_filter = sql_bbox_filter(*bbox, loc='f.location_id')
+    elif lat is not None or lon is not None or any(v is not None for v in bbox):
+        return None, 'Нужны lat и lon или все четыре lat_min, lat_max, lon_min, lon_max'
+    else:
+        location_filter = "1"
+
+    # 2. Логика группировки (SQL)
+    # Мы сразу формируем выражение для SELECT и для GROUP BY
+    if group_by == 'day':
+        # Превращаем timestamp в дату, затем в строку для метки
+        x_label_expr = "toString(f.date)"
+        group_clause = "f.date"
+        order_clause = "f.date"
+
+    elif group_by == 'month':
+        # YYYY-MM
+        x_label_expr = "concat(toString(f.year), '-', lpad(toString(f.month), 2, '0'))"
+        group_clause = "f.year, f.month"
+        order_clause = "f.year, f.month"
+
+    else: # year
+        x_label_expr = "toString(f.year)"
+        group_clause = "f.year"
+        order_clause = "f.year"
+
+    # 3. Логика агрегации (слияние состояний из rollup-таблицы)
+    if agg_func == 'max':
+        temp_expr = "round(maxMerge(f.temp_max), 2)"
+        precip_expr = "round(maxMerge(f.precip_max), 2)"
+    elif agg_func == 'min':
+        temp_expr = "round(minMerge(f.temp_min), 2)"
+        precip_expr = "round(minMerge(f.precip_min), 2)"
+    else:
+        temp_expr = "round(avgMerge(f.temp_avg), 2)"
+        precip_expr = "round(sumMerge(f.precip_sum), 2)"
+
+    # Самый грубый rollup, который отвечает на группировку (год -> weather_yearly и т.д.)
+    source_table = rollup_table(group_by)
+
+    # 4. Итоговый запрос
+    # Важно: x_label_expr сразу становится колонкой 'label'
+    query = f"""
+    SELECT
+        {x_label_expr} as label,
+        {temp_expr} as temp,
+        {precip_expr} as precip
+    FROM {source_table} f
+    -- year входит в ключ партиции: лишние периоды отсекаются до чтения
+    WHERE f.year BETWEEN {start_year} AND {end_year}
+      -- rollup-таблицы отсортированы по location_id: фильтр по точке/области читает несколько гранул
+      AND {location_filter}
+    GROUP BY {group_clause}
+    ORDER BY {order_clause}
+    """
+    return query, None
+
+
+def drilldown_payload(df):
+    # Защита от пустых данных
+    if df.empty:
+        return {'labels': [], 'temperatures': [], 'precipitation': []}
+
+    return {
+        'labels': df['label'].tolist(),
+        'temperatures': df['temp'].tolist(),
+        'precipitation': df['precip'].tolist()
+    }
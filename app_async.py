@@ -0,0 +1,149 @@
+"""
+Асинхронный режим дашборда (ASGI): те же страницы и API, что у app.py,
+но запросы к ClickHouse идут через асинхронный HTTP-клиент.
+
+Медленный запрос не держит поток: пока ClickHouse считает, event loop
+обслуживает остальные запросы страницы. Запуск:
+    uvicorn app_async:app --port 8000
+"""
+import os
+import sys
+import json
+import asyncio
+from contextlib import asynccontextmanager
+
+import pandas as pd
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.routing import Route, Mount
+from starlette.staticfiles import StaticFiles
+from starlette.templating import Jinja2Templates
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config import QUERY_CACHE_ENABLED
+from warehouse.async_client import AsyncClickHouse
+from warehouse.query_cache import QueryCache
+from app import api
+
+model = api.load_model()
+clickhouse = AsyncClickHouse()
+# Свой кэш результатов (как в app.py), версия данных тоже спрашивается асинхронно
+query_cache = QueryCache(clickhouse.data_version)
+
+templates = Jinja2Templates(directory='app/templates')
+# Шаблоны написаны под Flask: url_for('static', filename=...)
+templates.env.globals['url_for'] = lambda endpoint, filename: f"/static/{filename}"
+
+
+class FlaskJSONResponse(JSONResponse):
+    """JSON как у Flask jsonify: NaN пропускается как есть (Starlette по умолчанию падает)."""
+
+    def render(self, content):
+        return json.dumps(content, ensure_ascii=False, allow_nan=True, default=str).encode("utf-8")
+
+
+async def get_data_from_ch(query):
+    try:
+        if not QUERY_CACHE_ENABLED:
+            return await clickhouse.query_dataframe(query)
+        return await query_cache.aget_or_run(query, clickhouse.query_dataframe)
+    except Exception as e:
+        print(f"DB Error: {e}")
+        return pd.DataFrame()
+
+
+# --- ROUTES (HTML СТРАНИЦЫ) ---
+async def index(request):
+    return templates.TemplateResponse(request, 'index.html')
+
+
+async def dashboard(request):
+    return templates.TemplateResponse(request, 'dashboard.html')
+
+
+# --- API ---
+async def get_kpi(request):
+    return FlaskJSONResponse(api.kpi_payload(await get_data_from_ch(api.KPI_QUERY)))
+
+
+async def descriptive_trend(request):
+    return FlaskJSONResponse(api.trend_payload(await get_data_from_ch(api.TREND_QUERY)))
+
+
+async def descriptive_histogram(request):
+    return FlaskJSONResponse(api.histogram_payload(await get_data_from_ch(api.HISTOGRAM_QUERY)))
+
+
+async def diagnostic_correlations(request):
+    return FlaskJSONResponse(api.correlations_payload(await get_data_from_ch(api.CORRELATIONS_QUERY)))
+
+
+async def predictive_chart(request):
+    if not model:
+        return FlaskJSONResponse({'data': [], 'layout': {}})
+    df = await get_data_from_ch(api.FORECAST_QUERY)
+    # predict — работа CPU, не блокируем event loop
+    return FlaskJSONResponse(await run_in_threadpool(api.predictive_payload, model, df))
+
+
+async def prescriptive_analytics(request):
+    if not model:
+        print("❌ Model is None")
+        return FlaskJSONResponse({'error': 'Model not loaded'})
+    df = await get_data_from_ch(api.FORECAST_QUERY)
+    return FlaskJSONResponse(await run_in_threadpool(api.prescriptive_payload, model, df))
+
+
+async def summary(request):
+    """Вся главная страница одним ответом: независимые запросы идут в ClickHouse одновременно."""
+    names = list(api.SUMMARY_QUERIES)
+    frames = await asyncio.gather(*(get_data_from_ch(api.SUMMARY_QUERIES[name]) for name in names))
+    return FlaskJSONResponse(await run_in_threadpool(api.summary_payload, model, dict(zip(names, frames))))
+
+
+async def dashboard_drilldown(request):
+    query, error = api.drilldown_query(request.query_params)
+    if error:
+        return FlaskJSONResponse({'error': error}, status_code=400)
+    return FlaskJSONResponse(api.drilldown_payload(await get_data_from_ch(query)))
+
+
+async def clickhouse_stats(request):
+    """Запросы в работе, всего, ошибки асинхронного клиента."""
+    return FlaskJSONResponse(clickhouse.stats())
+
+
+async def query_cache_stats(request):
+    return FlaskJSONResponse(query_cache.stats())
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await clickhouse.close()
+
+
+app = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/dashboard', dashboard),
+        Route('/api/kpi', get_kpi),
+        Route('/api/descriptive/trend', descriptive_trend),
+        Route('/api/descriptive/histogram', descriptive_histogram),
+        Route('/api/diagnostic/correlations', diagnostic_correlations),
+        Route('/api/predictive-temp', predictive_chart),
+        Route('/api/prescriptive', prescriptive_analytics),
+        Route('/api/summary', summary),
+        Route('/api/dashboard-drilldown', dashboard_drilldown),
+        Route('/api/health/clickhouse', clickhouse_stats),
+        Route('/api/health/query-cache', query_cache_stats),
+        Mount('/static', StaticFiles(directory='app/static'), name='static'),
+    ],
+    lifespan=lifespan,
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, port=8000)
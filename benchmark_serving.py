@@ -0,0 +1,110 @@
+"""
+Нагрузочный тест дашборда: синхронный app.py против асинхронного app_async.py.
+
+Каждый виртуальный пользователь открывает главную страницу так же, как браузер:
+index.js параллельно запрашивает шесть API. Считаются p50/p99 по каждому API и в целом.
+Серверы запускаются заранее (для честного сравнения — с QUERY_CACHE_ENABLED = False):
+    python app.py                          # http://127.0.0.1:5000
+    uvicorn app_async:app --port 8000      # http://127.0.0.1:8000
+    python benchmark_serving.py --users 20 --duration 60
+    python benchmark_serving.py --summary     # та же страница одним /api/summary (запросы внутри
+                                              # обработчика: sync — по очереди, async — asyncio.gather)
+"""
+import time
+import asyncio
+import argparse
+
+import aiohttp
+
+# Запросы главной страницы (app/static/js/index.js)
+INDEX_ENDPOINTS = [
+    '/api/kpi',
+    '/api/descriptive/trend',
+    '/api/descriptive/histogram',
+    '/api/diagnostic/correlations',
+    '/api/predictive-temp',
+    '/api/prescriptive',
+]
+SUMMARY_ENDPOINTS = ['/api/summary']
+
+
+def percentile(values, p):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+async def _fetch(session, base_url, path, latencies, errors):
+    started = time.perf_counter()
+    try:
+        async with session.get(base_url + path) as response:
+            await response.read()
+            if response.status != 200:
+                errors[path] = errors.get(path, 0) + 1
+                return
+    except Exception:
+        errors[path] = errors.get(path, 0) + 1
+        return
+    latencies.setdefault(path, []).append(time.perf_counter() - started)
+
+
+async def _user(session, base_url, endpoints, deadline, latencies, page_times, errors):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await asyncio.gather(*(_fetch(session, base_url, path, latencies, errors) for path in endpoints))
+        page_times.append(time.perf_counter() - started)
+
+
+async def run_load(base_url, users, duration, endpoints=INDEX_ENDPOINTS):
+    latencies, page_times, errors = {}, [], {}
+    timeout = aiohttp.ClientTimeout(total=300)
+    async with aiohttp.ClientSession(timeout=timeout, connector=aiohttp.TCPConnector(limit=0)) as session:
+        # Прогрев: модель, словари и соединения с ClickHouse
+        await asyncio.gather(*(_fetch(session, base_url, p, {}, {}) for p in endpoints))
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(_user(session, base_url, endpoints, deadline, latencies, page_times, errors)
+                               for _ in range(users)))
+    return latencies, page_times, errors
+
+
+def report(name, latencies, page_times, errors, duration, endpoints=INDEX_ENDPOINTS):
+    print(f"\n=== {name} ===")
+    print(f"{'API':<30} {'Запросов':>9} {'p50, мс':>9} {'p99, мс':>9} {'Ошибок':>7}")
+    for path in endpoints:
+        values = latencies.get(path, [])
+        print(f"{path:<30} {len(values):>9} {percentile(values, 50) * 1000:>9.0f} "
+              f"{percentile(values, 99) * 1000:>9.0f} {errors.get(path, 0):>7}")
+    all_values = [v for values in latencies.values() for v in values]
+    print(f"{'Все API':<30} {len(all_values):>9} {percentile(all_values, 50) * 1000:>9.0f} "
+          f"{percentile(all_values, 99) * 1000:>9.0f} {sum(errors.values()):>7}")
+    print(f"Страница целиком: p50 {percentile(page_times, 50) * 1000:.0f} мс, "
+          f"p99 {percentile(page_times, 99) * 1000:.0f} мс, {len(page_times) / duration:.2f} страниц/с")
+    return {"p50": percentile(all_values, 50), "p99": percentile(all_values, 99),
+            "pages_per_sec": len(page_times) / duration}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест: app.py (sync) vs app_async.py (ASGI)")
+    parser.add_argument("--sync-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--async-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=20, help="Одновременных пользователей (страниц)")
+    parser.add_argument("--duration", type=float, default=60, help="Секунд на каждый сервер")
+    parser.add_argument("--summary", action="store_true", help="Страница одним запросом /api/summary")
+    args = parser.parse_args(argv)
+
+    endpoints = SUMMARY_ENDPOINTS if args.summary else INDEX_ENDPOINTS
+    results = {}
+    for name, url in (("sync (app.py)", args.sync_url), ("async (app_async.py)", args.async_url)):
+        print(f"Нагрузка на {url}: {args.users} пользователей, {args.duration:.0f} с...")
+        latencies, page_times, errors = asyncio.run(run_load(url, args.users, args.duration, endpoints))
+        results[name] = report(name, latencies, page_times, errors, args.duration, endpoints)
+
+    sync, async_ = results.values()
+    print(f"\nasync/sync: p50 x{sync['p50'] / async_['p50']:.2f}, p99 x{sync['p99'] / async_['p99']:.2f}, "
+          f"страниц/с x{async_['pages_per_sec'] / max(sync['pages_per_sec'], 1e-9):.2f}")
+
+
+if __name__ == "__main__":
+    main()
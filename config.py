@@ -6,6 +6,7 @@ DB_NAME = 'weather_db'
 # Параметры подключения
 CLICKHOUSE_HOST = 'localhost'
 CLICKHOUSE_PORT = 9000
+CLICKHOUSE_HTTP_PORT = 8123   # HTTP-интерфейс (асинхронный клиент app_async.py)
 CLICKHOUSE_USER = 'default'
 CLICKHOUSE_PASSWORD = '' # Впиши пароль, если есть
 
@@ -16,3 +17,91 @@ db_config = {
     'user': CLICKHOUSE_USER,
     'password': CLICKHOUSE_PASSWORD
 }
+
+# Пул соединений для дашборда и ML (warehouse/connection.py)
+DB_POOL_SIZE = 8            # Максимум одновременно открытых соединений
+DB_POOL_TIMEOUT = 10        # Сколько секунд ждать свободное соединение
+DB_HEALTH_CHECK_IDLE = 30   # Соединение, простоявшее дольше (с), проверяется SELECT 1 перед выдачей
+# Сжатие трафика (нужны пакеты lz4 и clickhouse-cityhash); False — без сжатия
+DB_COMPRESSION = 'lz4'
+# Настройки ClickHouse для каждого запроса через пул (например, {'max_threads': 8})
+DB_SETTINGS = {}
+ASYNC_QUERY_TIMEOUT = 60    # Предел (с) на один запрос асинхронного клиента
+
+# --- Настройки загрузки ERA5 (CDS API) ---
+# Корневая папка для сырых данных (NetCDF/Parquet)
+RAW_DATA_DIR = 'raw_data'
+CDS_DATASET = 'reanalysis-era5-single-levels'
+
+ERA5_VARIABLES = [
+    "10m_u_component_of_wind", "10m_v_component_of_wind",
+    "2m_dewpoint_temperature", "2m_temperature",
+    "mean_sea_level_pressure", "total_precipitation",
+    "maximum_2m_temperature_since_previous_post_processing",
+    "minimum_2m_temperature_since_previous_post_processing",
+    "mean_surface_downward_short_wave_radiation_flux",
+    "total_cloud_cover"
+]
+
+# Регион: [North, West, South, East]
+ERA5_AREA = [44.5, 68, 38, 82]
+
+# Сколько запросов к CDS держим "в полете" одновременно
+INGESTION_MAX_WORKERS = 4
+
+# Лимит CDS на размер одного запроса (переменные × дни × часы)
+CDS_MAX_FIELDS = 120000
+
+# Потолок памяти (МБ) на один кусок при конвертации NetCDF -> Parquet
+CONVERTER_MAX_MEMORY_MB = 512
+
+# --- Озеро Parquet (raw_data/lake, Hive-разбиение year=/month=/day=) ---
+LAKE_DIR = os.path.join(RAW_DATA_DIR, 'lake')
+LAKE_COMPRESSION = 'zstd'
+LAKE_COMPRESSION_LEVEL = 3
+# ~1500 точек × 24 часа ≈ 36 тыс. строк в день; месяц ≈ 4 row group
+LAKE_ROW_GROUP_ROWS = 262144
+
+# --- Кэш скачанных архивов CDS (ключ = хэш payload запроса) ---
+INGESTION_CACHE_DIR = os.path.join(RAW_DATA_DIR, '_cache')
+INGESTION_CACHE_MAX_GB = 20
+
+# Движок конвертации NetCDF -> Parquet: 'arrow' (напрямую из буферов numpy) или 'pandas'
+CONVERTER_ENGINE = 'arrow'
+
+# --- Загрузка в ClickHouse ---
+# Сколько строк отправлять одним INSERT (колоночный блок)
+LOADER_BLOCK_SIZE = 100000
+# Режим загрузки фактов: 'driver' (всё через драйвер) или 'partitions' (каждая партиция Spark пишет сама)
+LOADER_MODE = 'partitions'
+# Потолок одновременных писателей в ClickHouse в режиме 'partitions'
+LOADER_MAX_WRITERS = 4
+
+# Уровень хранения преобразованного DataFrame в Spark ETL (считается один раз и переиспользуется)
+SPARK_STORAGE_LEVEL = 'MEMORY_AND_DISK'
+
+# Движок обработки дня: 'auto' (по объему входа), 'arrow' (pyarrow/numpy без JVM) или 'spark'
+PROCESSING_ENGINE = 'auto'
+# В режиме 'auto' до этого числа строк за день работает arrow, больше — Spark
+ARROW_ENGINE_MAX_ROWS = 5000000
+
+# Локальный кэш ключей dim_location/dim_time (вставляются только новые строки измерений)
+DIM_CACHE_PATH = os.path.join(RAW_DATA_DIR, '_dim_keys.json')
+
+# Шаг регулярной сетки ERA5 (градусы): location_id = индекс точки на этой сетке
+GRID_STEP = 0.25
+
+# Схема колонок fact_weather (warehouse/fact_schema.py):
+# 'wide' — Float64 и кодек по умолчанию, 'compact' — Float32 и кодеки для гладких рядов
+FACT_SCHEMA = 'wide'
+
+# Кэш результатов запросов дашборда (warehouse/query_cache.py)
+QUERY_CACHE_ENABLED = True          # False — каждый запрос идет в ClickHouse (например, для нагрузочного теста)
+QUERY_CACHE_MAX_MB = 256            # Предел памяти; вытесняются давно не использованные результаты
+QUERY_CACHE_DIR = os.path.join(RAW_DATA_DIR, '_query_cache')  # Куда вытеснять на диск; None — не вытеснять
+QUERY_CACHE_VERSION_TTL = 30        # Как часто (с) спрашивать ClickHouse о версии данных
+
+# Потоковое чтение для ML (warehouse/arrow_stream.py): строк в одном Arrow-батче
+ML_BATCH_SIZE = 65536
+ML_STREAM_CONNECT_TIMEOUT = 10      # Секунд на подключение к HTTP-интерфейсу ClickHouse
+ML_STREAM_READ_TIMEOUT = 300        # Секунд без единого байта от сервера — запрос считается зависшим
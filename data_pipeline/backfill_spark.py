@@ -0,0 +1,232 @@
+import os
+import sys
+import json
+import time
+import argparse
+import calendar
+from datetime import date, datetime
+import pandas as pd
+import findspark
+
+findspark.init()
+
+from pyspark import StorageLevel
+from pyspark.sql import SparkSession
+from pyspark.sql.functions import col, lit, count, countDistinct, collect_set
+from clickhouse_driver import Client
+
+from config import db_config, RAW_DATA_DIR, SPARK_STORAGE_LEVEL
+from data_pipeline.process_data_spark import (
+    month_lake_paths, read_lake, read_period, transform, split_star_schema
+)
+from warehouse.loader import load_spark
+from warehouse.dim_cache import DimKeyCache, load_dimension
+from warehouse.partition_loader import replace_partition
+
+# Какие месяцы уже загружены в ClickHouse (перезапуск продолжает со следующего)
+CHECKPOINT_PATH = os.path.join(RAW_DATA_DIR, "_backfill_checkpoint.json")
+
+
+def month_range(start, end):
+    """Месяцы (year, month) от start до end включительно; start/end — строки YYYY-MM."""
+    y, m = map(int, start.split("-"))
+    end_y, end_m = map(int, end.split("-"))
+    result = []
+    while (y, m) <= (end_y, end_m):
+        result.append((y, m))
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return result
+
+
+def _month_key(year, month):
+    return f"{year:04d}-{month:02d}"
+
+
+def read_checkpoint(path=CHECKPOINT_PATH):
+    if not os.path.exists(path):
+        return {"committed": [], "in_progress": None}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_checkpoint(state, path=CHECKPOINT_PATH):
+    # Атомарная запись: при падении посреди записи остается прежний файл
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def plan_sources(months):
+    """
+    Разом находит источники всех месяцев: файлы озера или старые папки raw_data/YYYY_MM.
+    Возвращает (monthly_paths, daily_parts, legacy_dirs, missing); daily_parts — {дата: дневная партиция}.
+    """
+    monthly_paths, daily_parts, legacy_dirs, missing = [], {}, {}, []
+    for year, month in months:
+        monthly_path, month_days = month_lake_paths(year, month)
+        legacy_dir = os.path.join(RAW_DATA_DIR, f"{year:04d}_{month:02d}")
+        if monthly_path or month_days:
+            if monthly_path:
+                monthly_paths.append(monthly_path)
+            daily_parts.update(month_days)
+        elif os.path.isdir(legacy_dir):
+            legacy_dirs[(year, month)] = legacy_dir
+        else:
+            missing.append((year, month))
+    return monthly_paths, daily_parts, legacy_dirs, missing
+
+
+def read_months(spark, monthly_paths, daily_parts, legacy_dirs):
+    """
+    Один DataFrame на все месяцы: файлы озера читаются одним сканом (день — из дневной партиции,
+    если она есть, иначе из месячного файла), старые папки — объединяются.
+    """
+    full_df = read_lake(spark, monthly_paths, daily_parts)
+    for legacy_dir in legacy_dirs.values():
+        df = read_period(spark, legacy_dir)
+        full_df = df if full_df is None else full_df.unionByName(df, allowMissingColumns=True)
+    return full_df
+
+
+def _month_filter(df, year, month):
+    # Фильтр по time: Parquet отсекает файлы и row group других месяцев по статистике
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return df.filter((col("time") >= lit(start)) & (col("time") < lit(end)))
+
+
+def load_month(client, dim_cache, year, month, month_df):
+    """
+    Трансформация и загрузка одного месяца. Возвращает число фактов.
+    Факты идут через staging и REPLACE PARTITION: недогруженный при падении месяц
+    просто перезаписывается при перезапуске.
+    """
+    processed_df = transform(month_df).persist(getattr(StorageLevel, SPARK_STORAGE_LEVEL))
+    try:
+        # Одно действие на месяц: число строк, уникальные ключи и дни, которые реально есть в источнике
+        stats = processed_df.agg(
+            count(lit(1)).alias("rows"),
+            countDistinct("time_id", "location_id").alias("unique_rows"),
+            collect_set((col("time_id") / 100).cast("long")).alias("days"),
+        ).first()
+        total_rows = stats["rows"]
+        if total_rows == 0:
+            return 0
+        # Сверка строк ниже идет по этому же DataFrame, поэтому дубли ключей проверяются отдельно
+        if stats["unique_rows"] != total_rows:
+            raise ValueError(f"{_month_key(year, month)}: {total_rows - stats['unique_rows']} повторяющихся "
+                             f"(time_id, location_id) — день прочитан из нескольких источников?")
+        days = sorted(date(d // 10000, d // 100 % 100, d % 100) for d in stats["days"])
+        # Неполный месяц: остальные дни партиции копируются в staging из fact_weather, а не удаляются
+        replaced_days = days if len(days) < calendar.monthrange(year, month)[1] else None
+        dim_time_df, dim_location_df, fact_df = split_star_schema(processed_df)
+
+        load_dimension(client, dim_cache, 'weather_db.dim_location', dim_location_df.toPandas(), verbose=False)
+
+        pdf_dim_time = dim_time_df.toPandas()
+        pdf_dim_time['timestamp'] = pd.to_datetime(pdf_dim_time['timestamp'])  # Фикс для драйвера
+        load_dimension(client, dim_cache, 'weather_db.dim_time', pdf_dim_time, verbose=False)
+
+        replace_partition(
+            client, year * 100 + month,
+            lambda table: load_spark(client, table, fact_df, expected=total_rows),
+            replaced_days=replaced_days, source=f"month:{_month_key(year, month)}", engine="spark"
+        )
+        return total_rows
+    finally:
+        processed_df.unpersist()
+
+
+def backfill(months, checkpoint_path=CHECKPOINT_PATH):
+    """
+    Загрузка многих месяцев в ОДНОЙ SparkSession.
+
+    Все месяцы читаются как один набор данных, затем грузятся помесячно;
+    после каждого месяца он записывается в checkpoint. Повторный запуск
+    пропускает загруженные месяцы; недогруженный (in_progress) грузится заново
+    заменой партиции, без дублей.
+    Возвращает True, если загружены все месяцы, для которых есть данные.
+    """
+    state = read_checkpoint(checkpoint_path)
+    committed = set(state["committed"])
+    todo = [m for m in months if _month_key(*m) not in committed]
+    print(f"--- BACKFILL: {len(months)} мес., уже загружено {len(months) - len(todo)}, осталось {len(todo)} ---")
+    if not todo:
+        return True
+
+    monthly_paths, daily_parts, legacy_dirs, missing = plan_sources(todo)
+    if missing:
+        print(f"⚠️ Нет данных за {len(missing)} мес.: {', '.join(_month_key(*m) for m in missing)}")
+    todo = [m for m in todo if m not in missing]
+    if not todo:
+        return True
+
+    spark = SparkSession.builder \
+        .appName("WeatherETL_Backfill") \
+        .master("local[*]") \
+        .config("spark.driver.memory", "4g") \
+        .getOrCreate()
+    spark.conf.set("spark.sql.session.timeZone", "UTC")
+    spark.conf.set("spark.sql.execution.arrow.pyspark.enabled", "true")
+    spark.sparkContext.setLogLevel("WARN")
+
+    started = time.time()
+    loaded_rows = 0
+    try:
+        full_df = read_months(spark, monthly_paths, daily_parts, legacy_dirs)
+        print(f"Источник: {len(monthly_paths)} месячных файлов и {len(daily_parts)} дневных партиций озера, "
+              f"{len(legacy_dirs)} старых папок, "
+              f"{full_df.rdd.getNumPartitions()} партиций Spark")
+
+        client = Client(**db_config)
+        dim_cache = DimKeyCache().load(client)
+        for i, (year, month) in enumerate(todo, 1):
+            key = _month_key(year, month)
+            state["in_progress"] = key
+            write_checkpoint(state, checkpoint_path)
+
+            month_started = time.time()
+            rows = load_month(client, dim_cache, year, month, _month_filter(full_df, year, month))
+            loaded_rows += rows
+
+            state["committed"].append(key)
+            state["in_progress"] = None
+            write_checkpoint(state, checkpoint_path)
+
+            elapsed = time.time() - started
+            eta = elapsed / i * (len(todo) - i)
+            print(f"✅ [{i}/{len(todo)}] {key}: {rows} строк за {time.time() - month_started:.1f} с "
+                  f"(всего {loaded_rows} строк, осталось ~{eta / 60:.1f} мин)")
+    except Exception as e:
+        print(f"❌ Ошибка backfill: {e}")
+        print(f"Перезапустите команду — продолжение с {state.get('in_progress')}")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        spark.stop()
+
+    print(f"\n✅ BACKFILL ЗАВЕРШЕН: {loaded_rows} строк за {(time.time() - started) / 60:.1f} мин")
+    print("Измерения:")
+    dim_cache.report()
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Загрузка истории в ClickHouse одной SparkSession")
+    parser.add_argument("--start", required=True, help="YYYY-MM")
+    parser.add_argument("--end", required=True, help="YYYY-MM")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    parser.add_argument("--reset", action="store_true", help="Забыть checkpoint и грузить все заново")
+    args = parser.parse_args(argv)
+
+    if args.reset and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    if not backfill(month_range(args.start, args.end), args.checkpoint):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
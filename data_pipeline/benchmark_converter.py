@@ -0,0 +1,106 @@
+import os
+import sys
+import time
+import shutil
+import zipfile
+import argparse
+import tempfile
+import multiprocessing as mp
+
+from data_pipeline.converter import ENGINES, merge_step_types, WIDE_PARQUET_NAME
+from data_pipeline.fake_cds import FakeCDSClient
+from data_pipeline.ingestion_executor import build_request
+
+
+def _peak_rss_mb():
+    """Пиковая память текущего процесса (МБ)."""
+    try:
+        import resource
+        # Linux: ru_maxrss в КБ
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        import psutil
+        # Windows: пиковый рабочий набор
+        return psutil.Process().memory_info().peak_wset / 1024 ** 2
+
+
+def _run_engine(fixture_dir, work_dir, engine, max_memory_mb, queue):
+    # Отдельный процесс на движок: пиковая память не смешивается между прогонами
+    for filename in os.listdir(fixture_dir):
+        shutil.copy(os.path.join(fixture_dir, filename), work_dir)
+    rss_before = _peak_rss_mb()
+    started = time.perf_counter()
+    _, rows = merge_step_types(work_dir, max_memory_mb, engine)
+    seconds = time.perf_counter() - started
+    queue.put({"engine": engine, "seconds": seconds, "rows": rows,
+               "peak_rss_mb": _peak_rss_mb(), "rss_before_mb": rss_before})
+
+
+def make_fixture(fixture_dir, year, month, days, area):
+    request = build_request(year, month, range(1, days + 1))
+    request["area"] = area
+    zip_path = os.path.join(fixture_dir, "data.zip")
+    FakeCDSClient().retrieve("reanalysis-era5-single-levels", request, zip_path)
+    with zipfile.ZipFile(zip_path, 'r') as zf:
+        zf.extractall(fixture_dir)
+    os.remove(zip_path)
+
+
+def tables_equal(path_a, path_b):
+    """Одинаковые ли данные (без учета метаданных pandas и порядка колонок)."""
+    import pyarrow.parquet as pq
+    a, b = pq.read_table(path_a), pq.read_table(path_b)
+    b = b.select(a.column_names)
+    a = a.replace_schema_metadata(None)
+    b = b.replace_schema_metadata(None)
+    return a.equals(b)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сравнение движков конвертации NetCDF -> Parquet")
+    parser.add_argument("--days", type=int, default=31)
+    parser.add_argument("--area", nargs=4, type=float, default=[44.5, 68, 38, 82],
+                        help="North West South East (больше область — больше данных)")
+    parser.add_argument("--max-memory-mb", type=int, default=4096,
+                        help="Потолок куска: большой, чтобы сравнивать сами движки, а не нарезку")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fixture_dir = os.path.join(tmp, "fixture")
+        os.makedirs(fixture_dir)
+        print("Генерация тестового месяца ERA5...")
+        make_fixture(fixture_dir, 2024, 1, args.days, args.area)
+        nc_mb = sum(os.path.getsize(os.path.join(fixture_dir, f)) for f in os.listdir(fixture_dir)) / 1024 ** 2
+        print(f"NetCDF: {nc_mb:.1f} МБ")
+
+        ctx = mp.get_context("spawn")
+        results = []
+        for engine in ENGINES:
+            work_dir = os.path.join(tmp, engine)
+            os.makedirs(work_dir)
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_run_engine,
+                               args=(fixture_dir, work_dir, engine, args.max_memory_mb, queue))
+            proc.start()
+            proc.join()
+            if proc.exitcode != 0:
+                print(f"❌ {engine}: процесс завершился с кодом {proc.exitcode}")
+                sys.exit(1)
+            results.append(queue.get())
+
+        print(f"\n{'Движок':<8} {'Время, с':>10} {'Пик RSS, МБ':>12} {'Строк':>12}")
+        for r in results:
+            print(f"{r['engine']:<8} {r['seconds']:>10.2f} {r['peak_rss_mb']:>12.0f} {r['rows']:>12,}")
+
+        by_engine = {r["engine"]: r for r in results}
+        if "pandas" in by_engine and "arrow" in by_engine:
+            p, a = by_engine["pandas"], by_engine["arrow"]
+            print(f"\nArrow vs pandas: время x{p['seconds'] / max(a['seconds'], 1e-9):.2f}, "
+                  f"память -{p['peak_rss_mb'] - a['peak_rss_mb']:.0f} МБ")
+            same = tables_equal(os.path.join(tmp, "pandas", WIDE_PARQUET_NAME),
+                                os.path.join(tmp, "arrow", WIDE_PARQUET_NAME))
+            print("Результаты совпадают ✅" if same else "❌ Результаты различаются!")
+
+
+if __name__ == "__main__":
+    main()
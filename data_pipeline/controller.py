@@ -13,6 +13,35 @@ LOG_FILE_PATH = os.path.join(PROJECT_ROOT, "pipeline.log")
 # Путь к лог-файлу (будет лежать в корне проекта)
 LOG_FILE = os.path.join(PROJECT_ROOT, "pipeline.log")
 
+# --- ВЫБОР ДВИЖКА ОБРАБОТКИ ---
+def choose_processing_module():
+    """
+    Модуль обработки дня: для небольших объемов — pyarrow/numpy (без старта JVM),
+    для больших — Spark. Объем берется из метаданных Parquet, данные не читаются.
+    """
+    sys.path.insert(0, PROJECT_ROOT)
+    from config import PROCESSING_ENGINE, ARROW_ENGINE_MAX_ROWS
+
+    if PROCESSING_ENGINE == "spark":
+        return "data_pipeline.process_data_spark"
+    if PROCESSING_ENGINE == "arrow":
+        return "data_pipeline.process_data_arrow"
+
+    # Путь к raw_data/ в модуле относительный — считаем из корня проекта
+    cwd = os.getcwd()
+    os.chdir(PROJECT_ROOT)
+    try:
+        from data_pipeline.process_data_arrow import day_input_rows, target_date
+        rows = day_input_rows(target_date)
+    finally:
+        os.chdir(cwd)
+
+    if rows is not None and rows <= ARROW_ENGINE_MAX_ROWS:
+        logger.info(f"Строк за {target_date}: {rows} <= {ARROW_ENGINE_MAX_ROWS} -> движок arrow")
+        return "data_pipeline.process_data_arrow"
+    logger.info(f"Строк за {target_date}: {rows} -> движок Spark")
+    return "data_pipeline.process_data_spark"
+
 # --- НАСТРОЙКА ЛОГГЕРА ---
 def setup_logger():
     """Настраивает логгер: вывод в консоль и в файл (UTF-8)"""
@@ -88,9 +117,9 @@ def main():
         logger.warning("⛔ Пайплайн остановлен на этапе Ingestion.")
         return
 
-    # ШАГ 2: Spark Processing
-    if not run_module("data_pipeline.process_data_spark"):
-        logger.warning("⛔ Пайплайн остановлен на этапе Spark Processing.")
+    # ШАГ 2: Processing (arrow для небольших дней, Spark для больших)
+    if not run_module(choose_processing_module()):
+        logger.warning("⛔ Пайплайн остановлен на этапе Processing.")
         return
     
     # ШАГ 3: ML Retraining (Обучение модели)
@@ -0,0 +1,180 @@
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from config import RAW_DATA_DIR, CONVERTER_MAX_MEMORY_MB, CONVERTER_ENGINE
+from data_pipeline.converter import ENGINES
+from data_pipeline.ingestion_executor import (
+    convert_and_publish, read_manifest, write_manifest, STATUS_CONVERTED
+)
+
+# Служебные папки raw_data/, в которых нет периодов
+SKIP_DIRS = ("lake", "_cache")
+
+
+def default_workers(max_memory_mb=CONVERTER_MAX_MEMORY_MB):
+    """
+    Размер пула под машину: по ядру на процесс, но не больше, чем влезает в память
+    (каждый воркер держит до max_memory_mb на кусок конвертации).
+    """
+    workers = os.cpu_count() or 1
+    try:
+        import psutil
+        available_mb = psutil.virtual_memory().available / 1024 ** 2
+        workers = min(workers, max(1, int(available_mb // (max_memory_mb * 2))))
+    except ImportError:
+        pass
+    return workers
+
+
+def find_period_dirs(base_dir=RAW_DATA_DIR):
+    """Папки периодов, в которых остались несконвертированные .nc файлы."""
+    result = []
+    if not os.path.isdir(base_dir):
+        return result
+    for name in sorted(os.listdir(base_dir)):
+        path = os.path.join(base_dir, name)
+        if name in SKIP_DIRS or not os.path.isdir(path):
+            continue
+        if any(f.endswith(".nc") for f in os.listdir(path)):
+            result.append(path)
+    return result
+
+
+def _convert_task(output_dir, cache_key, engine=CONVERTER_ENGINE):
+    """
+    Воркер: конвертирует одну папку и возвращает статистику.
+    Исключения не пробрасываются — ошибка одной папки не должна ронять весь пакет.
+    """
+    nc_bytes = sum(os.path.getsize(os.path.join(output_dir, f))
+                   for f in os.listdir(output_dir) if f.endswith(".nc"))
+    started = time.time()
+    try:
+        written = convert_and_publish(output_dir, cache_key, engine=engine)
+        return {
+            "dir": output_dir, "ok": True, "error": None,
+            "seconds": time.time() - started, "nc_bytes": nc_bytes,
+            "rows": sum(written.values()), "days": sorted(d.isoformat() for d in written),
+        }
+    except Exception as e:
+        return {
+            "dir": output_dir, "ok": False, "error": f"{type(e).__name__}: {e}",
+            "seconds": time.time() - started, "nc_bytes": nc_bytes, "rows": 0, "days": [],
+        }
+
+
+def _report(stats):
+    name = os.path.basename(stats["dir"])
+    if not stats["ok"]:
+        print(f"❌ {name}: {stats['error']}")
+        return
+    seconds = max(stats["seconds"], 1e-6)
+    mb = stats["nc_bytes"] / 1024 ** 2
+    print(f"✅ {name}: {mb:.1f} МБ за {seconds:.1f} с "
+          f"({mb / seconds:.1f} МБ/с, {stats['rows'] / seconds:,.0f} строк/с)")
+
+
+def _mark_converted(stats):
+    """Если папку вел IngestionExecutor — отмечаем в манифесте, что конвертация завершена."""
+    manifest = read_manifest(stats["dir"])
+    if manifest is None:
+        return
+    manifest["lake_days"] = stats["days"]
+    manifest["last_ok"] = STATUS_CONVERTED
+    manifest["status"] = STATUS_CONVERTED
+    manifest["error"] = None
+    write_manifest(stats["dir"], manifest)
+
+
+def _failed(output_dir, error):
+    return {"dir": output_dir, "ok": False, "error": error,
+            "seconds": 0, "nc_bytes": 0, "rows": 0, "days": []}
+
+
+def _run_pool(period_dirs, workers, engine):
+    """
+    Один пул процессов на period_dirs. Возвращает (статистики, незавершенные папки).
+    Если пул сломался (воркер убит), все недосчитанные к этому моменту папки
+    возвращаются как незавершенные — какая из них виновата, здесь не известно.
+    """
+    results, unfinished = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for i, output_dir in enumerate(period_dirs):
+            manifest = read_manifest(output_dir) or {}
+            try:
+                futures[pool.submit(_convert_task, output_dir, manifest.get("content_key"), engine)] = output_dir
+            except BrokenProcessPool:
+                unfinished.extend(period_dirs[i:])
+                break
+
+        for future in as_completed(futures):
+            output_dir = futures[future]
+            try:
+                stats = future.result()
+            except BrokenProcessPool:
+                unfinished.append(output_dir)
+                continue
+            except Exception as e:
+                stats = _failed(output_dir, str(e))
+            results.append(stats)
+            _report(stats)
+            if stats["ok"]:
+                _mark_converted(stats)
+    return results, unfinished
+
+
+def convert_parallel(period_dirs, workers=None, engine=CONVERTER_ENGINE):
+    """
+    Раскидывает папки периодов по пулу процессов. Возвращает список статистик.
+
+    Если воркер падает целиком (segfault в netCDF, OOM-killer), пул ломается, и
+    все недосчитанные папки пересчитываются по одной, каждая в своем процессе.
+    Ошибкой помечается только папка, которая роняет процесс, работая в нем одна.
+    """
+    workers = workers or default_workers()
+    period_dirs = list(period_dirs)
+    started = time.time()
+    print(f"Конвертация {len(period_dirs)} папок в {workers} процессах...")
+
+    results, suspects = _run_pool(period_dirs, workers, engine)
+    if suspects:
+        print(f"⚠️ Процесс-воркер аварийно завершился, {len(suspects)} папок пересчитываются по одной...")
+    for output_dir in suspects:
+        isolated, crashed = _run_pool([output_dir], 1, engine)
+        results.extend(isolated)
+        if crashed:
+            stats = _failed(output_dir, "процесс-воркер аварийно завершился")
+            results.append(stats)
+            _report(stats)
+
+    total_seconds = time.time() - started
+    ok = [s for s in results if s["ok"]]
+    total_mb = sum(s["nc_bytes"] for s in ok) / 1024 ** 2
+    print(f"\nИтого: {len(ok)}/{len(results)} папок, {total_mb:.1f} МБ за {total_seconds:.1f} с "
+          f"({total_mb / max(total_seconds, 1e-6):.1f} МБ/с)")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Параллельная конвертация NetCDF -> Parquet")
+    parser.add_argument("dirs", nargs="*", help="Папки периодов (по умолчанию — все в raw_data/ с .nc)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--engine", choices=ENGINES, default=CONVERTER_ENGINE)
+    args = parser.parse_args(argv)
+
+    period_dirs = args.dirs or find_period_dirs()
+    if not period_dirs:
+        print("Нет папок с .nc файлами.")
+        return
+
+    results = convert_parallel(period_dirs, args.workers, args.engine)
+    if not all(s["ok"] for s in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+import os
+import numpy as np
+import xarray as xr
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config import CONVERTER_MAX_MEMORY_MB, CONVERTER_ENGINE
+
+# Версия формата конвертации: входит в ключ кэша ingestion,
+# поэтому при изменении логики конвертера периоды пересобираются автоматически
+CONVERTER_VERSION = 2
+
+# Во сколько раз пиковая память больше "чистого" размера куска:
+# pandas: массивы xarray + DataFrame с MultiIndex + reset_index + Arrow таблица;
+# arrow: массивы xarray + развернутые координаты (буферы переменных не копируются)
+MEMORY_OVERHEAD = {"pandas": 4, "arrow": 2}
+ENGINES = tuple(MEMORY_OVERHEAD)
+TIME_DIMS = ("valid_time", "time")
+
+# Файлы ERA5 из одного архива: одна сетка и одна ось времени, разные stepType
+STEP_TYPES = ("instant", "accum", "avg", "max")
+STEP_TYPE_FILE = "data_stream-oper_stepType-{}.nc"
+WIDE_PARQUET_NAME = "data_wide.parquet"
+
+
+def clean_dataset(ds, filename=""):
+    """
+    Приводит ERA5 Dataset к единому виду:
+    объединяет версии expver и удаляет служебные координаты.
+    """
+    # 1. Проверяем expver (версии данных)
+    if 'expver' in ds.dims:
+        print(f"Объединение версий ERA5T в файле {filename}...")
+        ds = ds.sel(expver=5).combine_first(ds.sel(expver=1))
+    elif 'expver' in ds.coords:
+        # Удаляем лишнюю координату
+        ds = ds.drop_vars('expver')
+
+    # 2. Удаляем 'number' (номер ансамбля)
+    if 'number' in ds.coords:
+        ds = ds.drop_vars('number')
+
+    return ds
+
+
+def time_dim(ds):
+    for name in TIME_DIMS:
+        if name in ds.dims:
+            return name
+    return None
+
+
+def time_slice_size(ds, dim, max_memory_mb=CONVERTER_MAX_MEMORY_MB, engine=CONVERTER_ENGINE):
+    """Сколько шагов времени можно взять за раз, чтобы уложиться в max_memory_mb."""
+    cells_per_step = 1
+    for name, size in ds.sizes.items():
+        if name != dim:
+            cells_per_step *= size
+    n_columns = len(ds.data_vars) + len(ds.dims)
+    bytes_per_step = cells_per_step * n_columns * 8 * MEMORY_OVERHEAD[engine]
+    return max(1, int(max_memory_mb * 1024 * 1024 // max(1, bytes_per_step)))
+
+
+def _slice_to_frame(ds):
+    # Конвертация в DataFrame
+    df = ds.to_dataframe().reset_index()
+
+    # Унификация имени колонки времени (valid_time -> time)
+    if 'valid_time' in df.columns:
+        df = df.rename(columns={'valid_time': 'time'})
+
+    if 'time' in df.columns:
+        df['time'] = df['time'].astype('datetime64[us]')
+    return df
+
+
+def _slice_to_table(ds):
+    """
+    Arrow-путь: колонки собираются прямо из буферов numpy, без pandas и MultiIndex.
+
+    Переменные разворачиваются ravel() (для C-порядка это view, без копии),
+    координаты размножаются np.repeat/np.tile — без построчной работы в Python.
+    Порядок и имена колонок совпадают с pandas-путем (to_dataframe().reset_index()).
+    """
+    dims = list(ds.dims)
+    sizes = [ds.sizes[d] for d in dims]
+    total = int(np.prod(sizes)) if sizes else 1
+
+    names, arrays = [], []
+    for i, dim in enumerate(dims):
+        values = ds[dim].values
+        inner = int(np.prod(sizes[i + 1:])) if i + 1 < len(sizes) else 1
+        outer = total // (inner * sizes[i])
+        column = np.tile(np.repeat(values, inner), outer)
+        name = 'time' if dim == 'valid_time' else dim
+        if name == 'time':
+            column = column.astype('datetime64[us]')
+        names.append(name)
+        arrays.append(pa.array(column))
+
+    for name in list(ds.coords) + list(ds.data_vars):
+        if name in dims:
+            continue
+        var = ds[name]
+        if var.dims != tuple(dims):
+            # Неполные/переставленные измерения — приводим к общей форме
+            var = var.broadcast_like(ds).transpose(*dims)
+        names.append(name)
+        arrays.append(pa.array(np.ascontiguousarray(var.values).ravel()))
+
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+def slice_to_table(ds, engine=CONVERTER_ENGINE):
+    if engine == "arrow":
+        return _slice_to_table(ds)
+    if engine == "pandas":
+        return pa.Table.from_pandas(_slice_to_frame(ds), preserve_index=False)
+    raise ValueError(f"Неизвестный движок конвертации: {engine} (есть: {', '.join(ENGINES)})")
+
+
+def iter_time_slices(ds, max_memory_mb=CONVERTER_MAX_MEMORY_MB, engine=CONVERTER_ENGINE):
+    """Отдает Dataset кусками по оси времени (каждый кусок читается с диска отдельно)."""
+    dim = time_dim(ds)
+    if dim is None:
+        yield ds
+        return
+    step = time_slice_size(ds, dim, max_memory_mb, engine)
+    for start in range(0, ds.sizes[dim], step):
+        yield ds.isel({dim: slice(start, start + step)})
+
+
+def write_parquet(ds, full_parquet_path, max_memory_mb=CONVERTER_MAX_MEMORY_MB, engine=CONVERTER_ENGINE):
+    """
+    Потоково пишет Dataset в Parquet.
+
+    Dataset обходится кусками по времени, каждый кусок дописывается отдельной row group,
+    поэтому пиковая память ограничена max_memory_mb, а не размером файла.
+    Результат пишется во временный файл и переименовывается только после успеха.
+    Возвращает число записанных строк; если строк нет — ValueError (вызывающий не удаляет исходник).
+    """
+    tmp_path = full_parquet_path + ".tmp"
+    writer = None
+    rows = 0
+    try:
+        for part in iter_time_slices(ds, max_memory_mb, engine):
+            table = slice_to_table(part, engine)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table)
+            rows += table.num_rows
+            del table
+
+        if rows == 0:
+            # Пустой файл (0 шагов времени): Parquet не пишется, исходник удалять нельзя
+            raise ValueError(f"{os.path.basename(full_parquet_path)}: нет ни одной строки, Parquet не записан")
+        writer.close()
+        writer = None
+        os.replace(tmp_path, full_parquet_path)
+        return rows
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def convert_nc_file(full_nc_path, full_parquet_path, max_memory_mb=CONVERTER_MAX_MEMORY_MB,
+                    engine=CONVERTER_ENGINE):
+    """Потоково конвертирует один NetCDF файл в Parquet. Возвращает число строк."""
+    ds = xr.open_dataset(full_nc_path, engine="netcdf4")
+    try:
+        ds = clean_dataset(ds, os.path.basename(full_nc_path))
+        return write_parquet(ds, full_parquet_path, max_memory_mb, engine)
+    finally:
+        ds.close()
+
+
+def step_type_files(output_dir):
+    """Пути к .nc файлам всех stepType или None, если какого-то не хватает."""
+    paths = {st: os.path.join(output_dir, STEP_TYPE_FILE.format(st)) for st in STEP_TYPES}
+    if all(os.path.exists(p) for p in paths.values()):
+        return paths
+    return None
+
+
+def check_grid_alignment(datasets):
+    """
+    Проверяет, что все Dataset лежат на одной сетке и одной оси времени.
+    Бросает ValueError с описанием первого расхождения.
+    """
+    (base_name, base), *others = datasets.items()
+    base_time = time_dim(base)
+    for name, ds in others:
+        if time_dim(ds) != base_time:
+            raise ValueError(f"{name}: ось времени '{time_dim(ds)}', ожидалась '{base_time}'")
+        for coord in (base_time, "latitude", "longitude"):
+            if coord is None:
+                continue
+            a, b = base[coord].values, ds[coord].values
+            if a.shape != b.shape or not (a == b).all():
+                raise ValueError(
+                    f"{name}: координата '{coord}' не совпадает с {base_name} "
+                    f"({b.size} vs {a.size} значений)"
+                )
+
+
+def merge_step_types(output_dir, max_memory_mb=CONVERTER_MAX_MEMORY_MB, engine=CONVERTER_ENGINE):
+    """
+    Склеивает файлы instant/accum/avg/max по общим координатам (как массивы, без JOIN)
+    и пишет один широкий Parquet на период. Возвращает (путь к Parquet, число строк).
+    """
+    paths = step_type_files(output_dir)
+    datasets = {}
+    try:
+        for st, path in paths.items():
+            datasets[st] = clean_dataset(xr.open_dataset(path, engine="netcdf4"), os.path.basename(path))
+
+        check_grid_alignment(datasets)
+        # join="exact" — дополнительная страховка: xarray упадет при любом расхождении индексов
+        wide = xr.merge(list(datasets.values()), join="exact", compat="override")
+
+        full_parquet_path = os.path.join(output_dir, WIDE_PARQUET_NAME)
+        rows = write_parquet(wide, full_parquet_path, max_memory_mb, engine)
+        return full_parquet_path, rows
+    finally:
+        for ds in datasets.values():
+            ds.close()
+
+
+def convert_folder(output_dir, remove_source=True, max_memory_mb=CONVERTER_MAX_MEMORY_MB, merge=True,
+                   engine=CONVERTER_ENGINE):
+    """
+    Конвертирует все .nc файлы папки в Parquet.
+    Если в папке есть все четыре stepType, они склеиваются в один data_wide.parquet
+    (тогда Spark не нужно делать три JOIN). Иначе — по одному Parquet на файл.
+    Возвращает True, если все файлы сконвертированы без ошибок.
+    """
+    print("Начинаю конвертацию NetCDF -> Parquet...")
+    merged = set()
+
+    step_paths = step_type_files(output_dir) if merge else None
+    if step_paths:
+        try:
+            path, rows = merge_step_types(output_dir, max_memory_mb, engine)
+            print(f"Склеены stepType {', '.join(STEP_TYPES)} -> {os.path.basename(path)} ({rows} строк)")
+            merged = {os.path.basename(p) for p in step_paths.values()}
+            if remove_source:
+                for nc_path in step_paths.values():
+                    os.remove(nc_path)
+        except Exception as e:
+            print(f"Ошибка при склейке stepType: {e}")
+            return False
+
+    ok = True
+
+    # Перебираем оставшиеся файлы в целевой папке
+    for filename in sorted(os.listdir(output_dir)):
+        if not filename.endswith(".nc") or filename in merged:
+            continue
+
+        # Формируем полные пути к файлам
+        full_nc_path = os.path.join(output_dir, filename)
+        full_parquet_path = os.path.join(output_dir, filename.replace(".nc", ".parquet"))
+
+        try:
+            rows = convert_nc_file(full_nc_path, full_parquet_path, max_memory_mb, engine)
+            print(f"Конвертирован: {filename} -> {os.path.basename(full_parquet_path)} ({rows} строк)")
+
+            # Удаляем исходник
+            if remove_source:
+                os.remove(full_nc_path)
+
+        except Exception as e:
+            ok = False
+            print(f"Ошибка при обработке {filename}: {e}")
+
+    return ok
@@ -0,0 +1,103 @@
+import os
+import time
+import zipfile
+import tempfile
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+# Какие переменные ERA5 попадают в какой файл stepType (как в реальных архивах CDS)
+STEP_TYPE_VARIABLES = {
+    "instant": ["u10", "v10", "d2m", "t2m", "msl", "tcc"],
+    "accum": ["tp"],
+    "avg": ["avg_sdswrf"],
+    "max": ["mx2t", "mn2t"],
+}
+
+# Правдоподобные значения, чтобы Spark-трансформации давали осмысленный результат
+_VARIABLE_RANGES = {
+    "u10": (-10, 10), "v10": (-10, 10),
+    "d2m": (250, 290), "t2m": (255, 305),
+    "msl": (99000, 103000), "tcc": (0, 1),
+    "tp": (0, 0.002), "avg_sdswrf": (0, 900),
+    "mx2t": (260, 310), "mn2t": (250, 300),
+}
+
+
+class FakeCDSClient:
+    """
+    Локальная замена cdsapi.Client для проверки пайплайна без сети.
+
+    retrieve() ждет latency секунд (имитация очереди CDS) и пишет zip-архив:
+    либо готовые .nc файлы из fixture_dir, либо сгенерированные по payload запроса.
+    """
+
+    def __init__(self, latency=0.0, fixture_dir=None, grid_step=0.25, seed=42):
+        self.latency = latency
+        self.fixture_dir = fixture_dir
+        self.grid_step = grid_step
+        self.seed = seed
+        self.calls = []
+
+    def retrieve(self, dataset, request, target):
+        self.calls.append((dataset, request, target))
+        if self.latency:
+            time.sleep(self.latency)
+
+        os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+        tmp_target = target + ".part"
+        with zipfile.ZipFile(tmp_target, 'w') as zf:
+            if self.fixture_dir:
+                for filename in sorted(os.listdir(self.fixture_dir)):
+                    if filename.endswith(".nc"):
+                        zf.write(os.path.join(self.fixture_dir, filename), filename)
+            else:
+                with tempfile.TemporaryDirectory() as tmp_dir:
+                    for step_type, path in self._generate(request, tmp_dir).items():
+                        zf.write(path, os.path.basename(path))
+        # Как и настоящий клиент: файл появляется только после полной загрузки
+        os.replace(tmp_target, target)
+        return target
+
+    def _times(self, request):
+        times = []
+        for y in request["year"]:
+            for m in request["month"]:
+                for d in request["day"]:
+                    for t in request["time"]:
+                        try:
+                            times.append(pd.Timestamp(f"{y}-{m}-{d} {t}"))
+                        except ValueError:
+                            # 31 февраля и т.п. CDS просто пропускает
+                            continue
+        return pd.DatetimeIndex(sorted(set(times)))
+
+    def _generate(self, request, out_dir):
+        north, west, south, east = request.get("area", [44.5, 68, 38, 82])
+        lats = np.arange(north, south - 1e-9, -self.grid_step)
+        lons = np.arange(west, east + 1e-9, self.grid_step)
+        times = self._times(request)
+        rng = np.random.default_rng(self.seed)
+        shape = (len(times), len(lats), len(lons))
+
+        paths = {}
+        for step_type, variables in STEP_TYPE_VARIABLES.items():
+            data_vars = {}
+            for var in variables:
+                low, high = _VARIABLE_RANGES[var]
+                data_vars[var] = (("valid_time", "latitude", "longitude"),
+                                  rng.uniform(low, high, shape).astype("float32"))
+            ds = xr.Dataset(
+                data_vars,
+                coords={
+                    "valid_time": times,
+                    "latitude": lats,
+                    "longitude": lons,
+                    "number": 0,
+                    "expver": ("valid_time", np.array(["0001"] * len(times))),
+                },
+            )
+            path = os.path.join(out_dir, f"data_stream-oper_stepType-{step_type}.nc")
+            ds.to_netcdf(path, engine="netcdf4")
+            paths[step_type] = path
+        return paths
@@ -0,0 +1,128 @@
+import os
+import json
+import shutil
+import hashlib
+import argparse
+import threading
+
+from config import INGESTION_CACHE_DIR, INGESTION_CACHE_MAX_GB
+from data_pipeline.converter import CONVERTER_VERSION
+
+# Поля payload, которые только выбирают даты (они определяют партицию, а не содержимое)
+DATE_FIELDS = ("year", "month", "day")
+
+
+def _hash(obj):
+    raw = json.dumps(obj, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def request_hash(request):
+    """Хэш точного payload запроса CDS (ключ для архива в кэше)."""
+    return _hash(request)
+
+
+def content_key(request):
+    """
+    Ключ содержимого дня: payload без полей даты + версия конвертера.
+
+    Одинаковый у всех дней, скачанных с теми же variables/area/time,
+    поэтому изменение любой переменной инвалидирует ровно те дни, что были скачаны по-старому.
+    """
+    content = {k: v for k, v in request.items() if k not in DATE_FIELDS}
+    return _hash({"request": content, "converter_version": CONVERTER_VERSION})[:16]
+
+
+class ZipCache:
+    """
+    Кэш скачанных zip-архивов CDS: raw_data/_cache/<sha256 payload>.zip.
+
+    Повторный запуск с тем же payload берет архив из кэша вместо очереди CDS.
+    Общий размер ограничен max_bytes: при превышении удаляются архивы,
+    к которым дольше всего не обращались.
+    """
+
+    def __init__(self, cache_dir=INGESTION_CACHE_DIR, max_bytes=int(INGESTION_CACHE_MAX_GB * 1024 ** 3)):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path_for(self, request):
+        return os.path.join(self.cache_dir, request_hash(request) + ".zip")
+
+    def get(self, request, target):
+        """Кладет архив из кэша в target. True — если был в кэше."""
+        path = self.path_for(request)
+        if not os.path.exists(path):
+            return False
+        _link_or_copy(path, target)
+        # Отмечаем обращение (для вытеснения по давности)
+        os.utime(path, None)
+        return True
+
+    def put(self, request, source):
+        """Сохраняет скачанный архив в кэш и вытесняет старые архивы при переполнении."""
+        path = self.path_for(request)
+        tmp_path = path + ".tmp"
+        _link_or_copy(source, tmp_path)
+        os.replace(tmp_path, path)
+        self.evict()
+        return path
+
+    def entries(self):
+        result = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".zip"):
+                path = os.path.join(self.cache_dir, name)
+                st = os.stat(path)
+                result.append((st.st_mtime, st.st_size, path))
+        return sorted(result)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, max_bytes=None):
+        """Удаляет самые старые архивы, пока кэш не влезет в лимит. Возвращает число удаленных."""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        removed = 0
+        with self._lock:
+            entries = self.entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= limit:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+        return removed
+
+
+def _link_or_copy(source, target):
+    if os.path.exists(target):
+        os.remove(target)
+    try:
+        # Жесткая ссылка: без копирования байтов (если тот же диск)
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Кэш архивов CDS")
+    parser.add_argument("--evict-to-gb", type=float, default=None,
+                        help="Ужать кэш до указанного размера (по умолчанию INGESTION_CACHE_MAX_GB)")
+    args = parser.parse_args(argv)
+
+    cache = ZipCache()
+    before = cache.size()
+    limit = None if args.evict_to_gb is None else int(args.evict_to_gb * 1024 ** 3)
+    removed = cache.evict(limit)
+    print(f"Кэш: {before / 1024 ** 2:.1f} МБ -> {cache.size() / 1024 ** 2:.1f} МБ, удалено архивов: {removed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import os
+import sys
+import json
+import time
+import zipfile
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+from config import (
+    RAW_DATA_DIR, CDS_DATASET, ERA5_VARIABLES, ERA5_AREA, INGESTION_MAX_WORKERS, CONVERTER_ENGINE
+)
+from data_pipeline.converter import convert_folder, ENGINES
+from data_pipeline.lake import publish_period
+from data_pipeline.ingestion_cache import ZipCache, content_key
+
+# --- СТАТУСЫ ПЕРИОДА (в порядке прохождения) ---
+STATUS_QUEUED = "queued"
+STATUS_DOWNLOADED = "downloaded"
+STATUS_UNZIPPED = "unzipped"
+STATUS_CONVERTED = "converted"
+STATUS_FAILED = "failed"
+
+STATUS_ORDER = [STATUS_QUEUED, STATUS_DOWNLOADED, STATUS_UNZIPPED, STATUS_CONVERTED]
+
+MANIFEST_NAME = "_manifest.json"
+ZIP_NAME = "data.zip"
+
+
+def build_request(year, month, days):
+    """Формирует payload для CDS API за один период (год/месяц/список дней)."""
+    return {
+        "product_type": ["reanalysis"],
+        "variable": list(ERA5_VARIABLES),
+        "year": [f"{int(year):04d}"],
+        "month": [f"{int(month):02d}"],
+        "day": [f"{int(d):02d}" for d in days],
+        "time": [f"{i:02d}:00" for i in range(24)],
+        "data_format": "netcdf",
+        "download_format": "zip",
+        "area": list(ERA5_AREA)
+    }
+
+
+def make_period(name, request, base_dir=RAW_DATA_DIR):
+    """Период = имя папки + payload запроса."""
+    return {
+        "name": name,
+        "output_dir": os.path.join(base_dir, name),
+        "request": request
+    }
+
+
+def month_periods(year, months, base_dir=RAW_DATA_DIR):
+    """Периоды-месяцы в формате папок YYYY_MM (как в скриптах бэкфилла)."""
+    return [
+        make_period(f"{int(year):04d}_{int(m):02d}", build_request(year, m, range(1, 32)), base_dir)
+        for m in months
+    ]
+
+
+# --- МАНИФЕСТ ---
+def read_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # Битый манифест (например, процесс убили во время записи) = начинаем заново
+        return None
+
+
+def write_manifest(output_dir, manifest):
+    """Атомарная запись манифеста: пишем во временный файл и переименовываем."""
+    manifest["updated_at"] = datetime.now().isoformat(timespec="seconds")
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _has_sources(output_dir):
+    """Есть ли в папке периода что конвертировать или публиковать (.nc или Parquet)."""
+    if not os.path.isdir(output_dir):
+        return False
+    return any(f.endswith((".nc", ".parquet")) for f in os.listdir(output_dir))
+
+
+def convert_and_publish(output_dir, cache_key=None, remove_source=True, engine=CONVERTER_ENGINE):
+    """
+    NetCDF -> Parquet -> партиции озера для одной папки периода.
+    Возвращает {дата: число строк}. Функция верхнего уровня, чтобы ее можно было
+    запускать в пуле процессов.
+    """
+    if not convert_folder(output_dir, remove_source=remove_source, engine=engine):
+        raise RuntimeError("не все .nc файлы сконвертированы")
+
+    # Раскладываем по партициям озера (raw_data/lake/daily/year=/month=/day=)
+    written = publish_period(output_dir, cache_key)
+    if remove_source:
+        # Озеро — основное хранилище, копия в папке периода не нужна
+        for filename in os.listdir(output_dir):
+            if filename.endswith(".parquet"):
+                os.remove(os.path.join(output_dir, filename))
+    return written
+
+
+class IngestionExecutor:
+    """
+    Параллельное скачивание периодов ERA5 с ограниченным числом запросов "в полете".
+
+    Для каждого периода на диске ведется манифест (queued / downloaded / unzipped / converted),
+    поэтому в режиме resume прерванный запуск продолжается с последнего завершенного шага.
+    client_factory создает клиента CDS (по одному на поток: cdsapi.Client не потокобезопасен).
+    Скачанные архивы кладутся в ZipCache: повтор того же payload не идет в CDS.
+    convert_pool (ProcessPoolExecutor) — если задан, конвертация идет в нем, а не в потоке загрузки.
+    """
+
+    def __init__(self, client_factory, max_workers=INGESTION_MAX_WORKERS, resume=True,
+                 dataset=CDS_DATASET, remove_source=True, cache=None, convert_pool=None,
+                 engine=CONVERTER_ENGINE):
+        self.client_factory = client_factory
+        self.max_workers = max(1, int(max_workers))
+        self.resume = resume
+        self.dataset = dataset
+        self.remove_source = remove_source
+        self.cache = cache if cache is not None else ZipCache()
+        self.convert_pool = convert_pool
+        self.engine = engine
+        self._local = threading.local()
+
+    def _client(self):
+        if not hasattr(self._local, "client"):
+            self._local.client = self.client_factory()
+        return self._local.client
+
+    def _set_status(self, period, manifest, status, error=None):
+        manifest["status"] = status
+        manifest["error"] = error
+        write_manifest(period["output_dir"], manifest)
+
+    def _start_status(self, period):
+        """С какого шага начинать период с учетом манифеста и режима resume."""
+        manifest = read_manifest(period["output_dir"])
+        key = content_key(period["request"])
+        if not self.resume or manifest is None:
+            return STATUS_QUEUED, {"period": period["name"], "request": period["request"], "content_key": key}
+
+        status = manifest.get("status")
+        if status == STATUS_FAILED:
+            # Продолжаем с последнего успешного шага
+            status = manifest.get("last_ok", STATUS_QUEUED)
+        if status not in STATUS_ORDER:
+            status = STATUS_QUEUED
+
+        # Если payload или версия конвертера поменялись — результат старого запуска не годится
+        if manifest.get("request") != period["request"] or manifest.get("content_key") != key:
+            status = STATUS_QUEUED
+        manifest["request"] = period["request"]
+        manifest["content_key"] = key
+
+        # Скачанный архив пропал — качаем заново
+        zip_path = os.path.join(period["output_dir"], ZIP_NAME)
+        if status == STATUS_DOWNLOADED and not os.path.exists(zip_path):
+            status = STATUS_QUEUED
+
+        # Процесс упал посреди конвертации: .nc/.parquet уже удалены, а манифест еще "unzipped".
+        # Исходники восстанавливаются из ZipCache, конвертация и публикация повторяются
+        if status == STATUS_UNZIPPED and not _has_sources(period["output_dir"]):
+            status = STATUS_QUEUED
+
+        return status, manifest
+
+    def run_period(self, period):
+        """Проводит один период через все шаги. Возвращает итоговый статус."""
+        output_dir = period["output_dir"]
+        os.makedirs(output_dir, exist_ok=True)
+        zip_path = os.path.join(output_dir, ZIP_NAME)
+
+        status, manifest = self._start_status(period)
+        if status == STATUS_CONVERTED:
+            print(f"⏭️  {period['name']}: уже сконвертирован, пропускаем.")
+            return status
+
+        step = status
+        try:
+            if status == STATUS_QUEUED:
+                self._set_status(period, manifest, STATUS_QUEUED)
+                step = "download"
+                started = time.time()
+                if self.cache.get(period["request"], zip_path):
+                    print(f"♻️  {period['name']}: архив взят из кэша.")
+                    manifest["from_cache"] = True
+                else:
+                    print(f"⬇️  {period['name']}: скачивание из CDS API...")
+                    self._client().retrieve(self.dataset, period["request"], zip_path)
+                    self.cache.put(period["request"], zip_path)
+                    manifest["from_cache"] = False
+                manifest["download_seconds"] = round(time.time() - started, 2)
+                manifest["last_ok"] = STATUS_DOWNLOADED
+                self._set_status(period, manifest, STATUS_DOWNLOADED)
+                status = STATUS_DOWNLOADED
+
+            if status == STATUS_DOWNLOADED:
+                step = "unzip"
+                print(f"📦 {period['name']}: распаковка архива...")
+                with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+                    zip_ref.extractall(output_dir)
+                os.remove(zip_path)
+                manifest["last_ok"] = STATUS_UNZIPPED
+                self._set_status(period, manifest, STATUS_UNZIPPED)
+                status = STATUS_UNZIPPED
+
+            if status == STATUS_UNZIPPED:
+                step = "convert"
+                args = (output_dir, manifest["content_key"], self.remove_source, self.engine)
+                if self.convert_pool is not None:
+                    # CPU-bound часть — в отдельном процессе (GIL не мешает соседним периодам)
+                    written = self.convert_pool.submit(convert_and_publish, *args).result()
+                else:
+                    written = convert_and_publish(*args)
+                manifest["lake_days"] = sorted(d.isoformat() for d in written)
+                manifest["last_ok"] = STATUS_CONVERTED
+                self._set_status(period, manifest, STATUS_CONVERTED)
+                status = STATUS_CONVERTED
+
+            print(f"✅ {period['name']}: готово.")
+            return status
+
+        except Exception as e:
+            print(f"❌ {period['name']}: ошибка на шаге '{step}': {e}")
+            self._set_status(period, manifest, STATUS_FAILED, error=f"{step}: {e}")
+            return STATUS_FAILED
+
+    def run(self, periods):
+        """Запускает все периоды в пуле. Возвращает {имя периода: статус}."""
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self.run_period, p): p["name"] for p in periods}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+
+        done = sum(1 for s in results.values() if s == STATUS_CONVERTED)
+        print(f"\nИтого: {done}/{len(periods)} периодов готово.")
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Параллельная загрузка ERA5 по месяцам")
+    parser.add_argument("--year", type=int, required=True)
+    parser.add_argument("--months", nargs="+", type=int, default=list(range(1, 13)))
+    parser.add_argument("--workers", type=int, default=INGESTION_MAX_WORKERS)
+    parser.add_argument("--no-resume", action="store_true", help="Игнорировать манифесты и качать заново")
+    parser.add_argument("--convert-workers", type=int, default=0,
+                        help="Конвертировать в пуле процессов такого размера (0 — в потоках загрузки)")
+    parser.add_argument("--engine", choices=ENGINES, default=CONVERTER_ENGINE,
+                        help="Движок конвертации NetCDF -> Parquet")
+    parser.add_argument("--fake", action="store_true", help="Локальный фейковый CDS (для проверки)")
+    parser.add_argument("--fake-latency", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    if args.fake:
+        from data_pipeline.fake_cds import FakeCDSClient
+        client_factory = lambda: FakeCDSClient(latency=args.fake_latency)
+    else:
+        import cdsapi
+        client_factory = cdsapi.Client
+
+    convert_pool = ProcessPoolExecutor(max_workers=args.convert_workers) if args.convert_workers else None
+    try:
+        executor = IngestionExecutor(client_factory, max_workers=args.workers, resume=not args.no_resume,
+                                     convert_pool=convert_pool, engine=args.engine)
+        results = executor.run(month_periods(args.year, args.months))
+    finally:
+        if convert_pool is not None:
+            convert_pool.shutdown()
+
+    if any(s != STATUS_CONVERTED for s in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
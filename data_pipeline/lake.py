@@ -0,0 +1,298 @@
+import os
+import json
+import shutil
+import argparse
+import calendar
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from config import (
+    RAW_DATA_DIR, LAKE_DIR, LAKE_COMPRESSION, LAKE_COMPRESSION_LEVEL, LAKE_ROW_GROUP_ROWS
+)
+from data_pipeline.converter import WIDE_PARQUET_NAME, STEP_TYPES
+
+# Структура озера:
+#   lake/daily/year=2025/month=12/day=01/part-0.parquet   <- свежие дни
+#   lake/monthly/year=2025/month=11/part-0.parquet        <- после compaction
+#   lake/monthly/year=2025/month=11/_days.json            <- какие дни внутри
+DAILY_ROOT = os.path.join(LAKE_DIR, "daily")
+MONTHLY_ROOT = os.path.join(LAKE_DIR, "monthly")
+PART_NAME = "part-0.parquet"
+DAYS_NAME = "_days.json"
+
+# Ключ кэша ingestion (см. ingestion_cache.content_key) в метаданных Parquet
+CACHE_KEY_META = b"era5.cache_key"
+
+# Координаты храним как есть (Float64): из них считается location_id (индекс сетки).
+# Значений мало (сетка ~1500 точек, 24 часа), поэтому словарное кодирование сжимает их почти в ноль.
+COORD_COLUMNS = ["time", "latitude", "longitude"]
+JOIN_KEYS = ["time", "latitude", "longitude"]
+
+
+def daily_dir(d, root=DAILY_ROOT):
+    return os.path.join(root, f"year={d.year:04d}", f"month={d.month:02d}", f"day={d.day:02d}")
+
+
+def monthly_dir(year, month, root=MONTHLY_ROOT):
+    return os.path.join(root, f"year={int(year):04d}", f"month={int(month):02d}")
+
+
+def compact_schema(schema, cache_key=None):
+    """ERA5 переменные Float64 -> Float32 (исходные данные ERA5 и так float32)."""
+    fields = []
+    for field in schema:
+        if field.name not in COORD_COLUMNS and pa.types.is_float64(field.type):
+            field = field.with_type(pa.float32())
+        fields.append(field)
+
+    metadata = {k: v for k, v in (schema.metadata or {}).items() if k != CACHE_KEY_META}
+    if cache_key:
+        metadata[CACHE_KEY_META] = cache_key.encode("utf-8")
+    return pa.schema(fields, metadata=metadata)
+
+
+def file_cache_key(path):
+    """Ключ кэша, с которым был записан файл (None для старых файлов)."""
+    value = (pq.read_schema(path).metadata or {}).get(CACHE_KEY_META)
+    return value.decode("utf-8") if value else None
+
+
+def _writer(path, schema):
+    return pq.ParquetWriter(
+        path, schema,
+        compression=LAKE_COMPRESSION,
+        compression_level=LAKE_COMPRESSION_LEVEL,
+        use_dictionary=COORD_COLUMNS,
+        write_statistics=True,
+    )
+
+
+class _PartitionWriter:
+    """Пишет одну партицию row group'ами фиксированного размера, атомарно (tmp -> rename)."""
+
+    def __init__(self, path, schema):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.schema = schema
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.writer = _writer(self.tmp_path, schema)
+        self.pending = []
+        self.pending_rows = 0
+        self.rows = 0
+
+    def write(self, table):
+        self.pending.append(table.cast(self.schema))
+        self.pending_rows += table.num_rows
+        if self.pending_rows >= LAKE_ROW_GROUP_ROWS:
+            self._flush()
+
+    def _flush(self):
+        if self.pending:
+            table = pa.concat_tables(self.pending)
+            self.writer.write_table(table, row_group_size=LAKE_ROW_GROUP_ROWS)
+            self.rows += table.num_rows
+        self.pending, self.pending_rows = [], 0
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+        os.replace(self.tmp_path, self.path)
+        return self.rows
+
+    def abort(self):
+        self.writer.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def _day_of(table):
+    """Массив дат (date32) для колонки time."""
+    return pc.cast(table["time"], pa.date32())
+
+
+def _iter_period_batches(output_dir):
+    """Отдает данные периода батчами: из широкого Parquet или (старые папки) через JOIN."""
+    wide_path = os.path.join(output_dir, WIDE_PARQUET_NAME)
+    if os.path.exists(wide_path):
+        pf = pq.ParquetFile(wide_path)
+        for batch in pf.iter_batches(batch_size=LAKE_ROW_GROUP_ROWS):
+            yield pa.Table.from_batches([batch])
+        return
+
+    tables = [pq.read_table(os.path.join(output_dir, f"data_stream-oper_stepType-{st}.parquet"))
+              for st in STEP_TYPES]
+    joined = tables[0]
+    for t in tables[1:]:
+        joined = joined.join(t, keys=JOIN_KEYS, join_type="inner")
+    yield joined.sort_by([("time", "ascending")])
+
+
+def publish_period(output_dir, cache_key=None):
+    """
+    Раскладывает сконвертированный период по дневным партициям озера.
+    cache_key записывается в метаданные каждого файла.
+    Возвращает {дата: число строк}.
+    """
+    written = {}
+    writers = {}
+    try:
+        for table in _iter_period_batches(output_dir):
+            days = _day_of(table)
+            for d in pc.unique(days).to_pylist():
+                part = table.filter(pc.equal(days, pa.scalar(d, pa.date32())))
+                if d not in writers:
+                    schema = compact_schema(part.schema, cache_key)
+                    writers[d] = _PartitionWriter(os.path.join(daily_dir(d), PART_NAME), schema)
+                writers[d].write(part)
+        for d, w in writers.items():
+            written[d] = w.close()
+        writers = {}
+    finally:
+        for w in writers.values():
+            w.abort()
+    return written
+
+
+def _read_days_file(path):
+    """_days.json: {дата: ключ кэша} (старый формат — просто список дат)."""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        data = {d: None for d in data}
+    return {date.fromisoformat(d): key for d, key in data.items()}
+
+
+def lake_days(lake_dir=LAKE_DIR):
+    """
+    Даты, которые уже есть в озере (дневные партиции + дни внутри месячных файлов).
+    Возвращает {дата: ключ кэша или None}.
+    """
+    days = {}
+    daily_root = os.path.join(lake_dir, "daily")
+    monthly_root = os.path.join(lake_dir, "monthly")
+
+    if os.path.isdir(monthly_root):
+        for dirpath, _, filenames in os.walk(monthly_root):
+            if DAYS_NAME in filenames and PART_NAME in filenames:
+                days.update(_read_days_file(os.path.join(dirpath, DAYS_NAME)))
+
+    # Дневные партиции свежее месячных файлов
+    if os.path.isdir(daily_root):
+        for dirpath, _, filenames in os.walk(daily_root):
+            if PART_NAME not in filenames:
+                continue
+            parts = dict(p.split("=", 1) for p in os.path.relpath(dirpath, daily_root).split(os.sep))
+            d = date(int(parts["year"]), int(parts["month"]), int(parts["day"]))
+            days[d] = file_cache_key(os.path.join(dirpath, PART_NAME))
+    return days
+
+
+def compact_month(year, month, daily_root=DAILY_ROOT, monthly_root=MONTHLY_ROOT):
+    """
+    Сливает дневные партиции месяца (и уже существующий месячный файл) в один месячный Parquet.
+    Дни из дневных партиций перекрывают те же дни в старом месячном файле.
+    Возвращает число строк в месячном файле.
+    """
+    month_len = calendar.monthrange(year, month)[1]
+    day_dirs = []
+    for day in range(1, month_len + 1):
+        d = date(year, month, day)
+        path = os.path.join(daily_dir(d, daily_root), PART_NAME)
+        if os.path.exists(path):
+            day_dirs.append((d, path))
+
+    if not day_dirs:
+        print(f"Нет дневных партиций за {year}-{month:02d}")
+        return 0
+
+    out_dir = monthly_dir(year, month, monthly_root)
+    out_path = os.path.join(out_dir, PART_NAME)
+    days_path = os.path.join(out_dir, DAYS_NAME)
+
+    old_days = _read_days_file(days_path) if os.path.exists(days_path) else {}
+    new_days = {d for d, _ in day_dirs}
+    day_keys = {d: key for d, key in old_days.items() if d not in new_days}
+    day_keys.update({d: file_cache_key(path) for d, path in day_dirs})
+
+    # Старые дни из месячного файла, которые не перекрываются новыми дневными партициями
+    keep_days = sorted(d for d in old_days if d not in new_days) if os.path.exists(out_path) else []
+    if keep_days:
+        old_table = pq.read_table(out_path)
+        old_table_days = _day_of(old_table)
+
+    # Источники в порядке времени
+    sources = [(d, path) for d, path in day_dirs] + [(d, None) for d in keep_days]
+    sources.sort(key=lambda x: x[0])
+
+    writer = None
+    try:
+        for d, path in sources:
+            if path is not None:
+                table = pq.read_table(path)
+            else:
+                table = old_table.filter(pc.equal(old_table_days, pa.scalar(d, pa.date32())))
+            if writer is None:
+                writer = _PartitionWriter(out_path, compact_schema(table.schema))
+            writer.write(table)
+        rows = writer.close()
+        writer = None
+    finally:
+        if writer is not None:
+            writer.abort()
+
+    with open(days_path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump({d.isoformat(): day_keys.get(d) for d, _ in sources}, f, indent=1)
+    os.replace(days_path + ".tmp", days_path)
+
+    # Дневные партиции больше не нужны
+    for d, _ in day_dirs:
+        shutil.rmtree(daily_dir(d, daily_root))
+
+    print(f"✅ {year}-{month:02d}: {len(day_dirs)} дневных партиций -> {out_path} ({rows} строк)")
+    return rows
+
+
+def migrate_legacy(base_dir=RAW_DATA_DIR):
+    """Переносит старые папки raw_data/YYYY-MM-DD и raw_data/YYYY_MM в озеро."""
+    for name in sorted(os.listdir(base_dir)):
+        path = os.path.join(base_dir, name)
+        if path == LAKE_DIR or not os.path.isdir(path):
+            continue
+        if not any(f.endswith(".parquet") for f in os.listdir(path)):
+            continue
+        try:
+            written = publish_period(path)
+            print(f"Перенесено: {name} -> {len(written)} дневных партиций")
+        except Exception as e:
+            print(f"Ошибка переноса {name}: {e}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Озеро Parquet: публикация, compaction, миграция")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_pub = sub.add_parser("publish", help="Разложить папку периода по дневным партициям")
+    p_pub.add_argument("period_dir")
+
+    p_comp = sub.add_parser("compact", help="Слить дневные партиции в месячные файлы")
+    p_comp.add_argument("--year", type=int, required=True)
+    p_comp.add_argument("--months", nargs="+", type=int, default=list(range(1, 13)))
+
+    sub.add_parser("migrate", help="Перенести старые папки raw_data/ в озеро")
+
+    args = parser.parse_args(argv)
+    if args.command == "publish":
+        written = publish_period(args.period_dir)
+        print(f"Опубликовано дней: {len(written)}")
+    elif args.command == "compact":
+        for m in args.months:
+            compact_month(args.year, m)
+    elif args.command == "migrate":
+        migrate_legacy()
+
+
+if __name__ == "__main__":
+    main()
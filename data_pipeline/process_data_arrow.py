@@ -0,0 +1,310 @@
+import os
+import sys
+import time
+import argparse
+from datetime import date, datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from clickhouse_driver import Client
+
+from config import db_config
+from data_pipeline.converter import WIDE_PARQUET_NAME, STEP_TYPES, STEP_TYPE_FILE
+from data_pipeline import lake
+from warehouse.loader import insert_columns
+from warehouse import grid
+from warehouse.dim_cache import DimKeyCache, load_dimension
+from warehouse.partition_loader import replace_partition, month_partition
+
+# --- КОНФИГУРАЦИЯ ---
+LAG_DAYS = 5
+# target_date = date.today() - timedelta(days=LAG_DAYS)
+target_date = date(2025, 12, 1)
+
+# Колонки таблицы фактов (тот же порядок, что в fact_weather и в Spark-версии)
+FACT_COLUMNS = [
+    "time_id", "location_id",
+    "temperature_c", "dewpoint_c",
+    "max_temp_c", "min_temp_c",
+    "pressure_hpa", "precipitation_mm",
+    "wind_speed_ms", "cloud_cover", "solar_radiation"
+]
+
+# --- ЧТЕНИЕ ---
+
+def _legacy_table(data_dir):
+    """Старая папка периода: широкий файл или 4 файла stepType (JOIN по времени и координатам)."""
+    wide_path = os.path.join(data_dir, WIDE_PARQUET_NAME)
+    if os.path.exists(wide_path):
+        return pq.read_table(wide_path)
+    tables = [pq.read_table(os.path.join(data_dir, STEP_TYPE_FILE.format(s).replace(".nc", ".parquet")))
+              for s in STEP_TYPES]
+    result = tables[0]
+    for table in tables[1:]:
+        result = result.join(table, keys=lake.JOIN_KEYS, join_type="inner")
+    return result
+
+
+def read_day(d):
+    """
+    Читает один день в pyarrow Table (те же источники, что read_day в Spark-версии):
+    дневная партиция озера, месячный файл после compaction или папка raw_data/YYYY-MM-DD.
+    """
+    daily_path = os.path.join(lake.daily_dir(d), lake.PART_NAME)
+    if os.path.exists(daily_path):
+        print(f"Чтение партиции озера {daily_path}...")
+        return pq.read_table(daily_path)
+
+    monthly_path = os.path.join(lake.monthly_dir(d.year, d.month), lake.PART_NAME)
+    if os.path.exists(monthly_path):
+        start = datetime(d.year, d.month, d.day)
+        print(f"Чтение месячного файла озера {monthly_path}...")
+        return pq.read_table(monthly_path, filters=[("time", ">=", start),
+                                                     ("time", "<", start + timedelta(days=1))])
+
+    legacy_dir = os.path.join("raw_data", d.strftime("%Y-%m-%d"))
+    if os.path.exists(legacy_dir):
+        return _legacy_table(legacy_dir)
+    return None
+
+
+def day_input_rows(d):
+    """
+    Сколько строк придется обработать за день — по метаданным Parquet, без чтения данных.
+    None, если данных нет. Для месячного файла — среднее на день.
+    """
+    daily_path = os.path.join(lake.daily_dir(d), lake.PART_NAME)
+    if os.path.exists(daily_path):
+        return pq.ParquetFile(daily_path).metadata.num_rows
+
+    monthly_path = os.path.join(lake.monthly_dir(d.year, d.month), lake.PART_NAME)
+    if os.path.exists(monthly_path):
+        days = len(lake._read_days_file(os.path.join(os.path.dirname(monthly_path), lake.DAYS_NAME))) or 1
+        return pq.ParquetFile(monthly_path).metadata.num_rows // days
+
+    legacy_dir = os.path.join("raw_data", d.strftime("%Y-%m-%d"))
+    if os.path.exists(legacy_dir):
+        wide_path = os.path.join(legacy_dir, WIDE_PARQUET_NAME)
+        if os.path.exists(wide_path):
+            return pq.ParquetFile(wide_path).metadata.num_rows
+        instant = os.path.join(legacy_dir, STEP_TYPE_FILE.format("instant").replace(".nc", ".parquet"))
+        if os.path.exists(instant):
+            return pq.ParquetFile(instant).metadata.num_rows
+    return None
+
+
+# --- ТРАНСФОРМАЦИЯ (те же формулы, что transform() в process_data_spark) ---
+
+def spark_round(values, scale):
+    """
+    round(x, scale) как в Spark: HALF_UP по десятичной записи числа, а не банковское
+    округление numpy. Пограничные значения (...5) досчитываются через Decimal.
+    """
+    values = np.asarray(values)
+    x = values.astype(np.float64)
+    factor = 10.0 ** scale
+    scaled = np.abs(x) * factor
+    # + 0.0: в Spark результат идет через BigDecimal, у которого нет -0.0
+    result = np.sign(x) * np.floor(scaled + 0.5) / factor + 0.0
+
+    frac = scaled - np.floor(scaled)
+    edge = np.flatnonzero(np.abs(frac - 0.5) < 1e-6)
+    quantum = Decimal(1).scaleb(-scale)
+    for i in edge:
+        result[i] = 0.0 + float(Decimal(repr(float(x[i]))).quantize(quantum, rounding=ROUND_HALF_UP))
+    return result.astype(values.dtype)
+
+
+def _column(table, name):
+    return table.column(name).to_numpy()
+
+
+def transform(table):
+    """
+    Feature engineering на numpy: те же колонки и значения, что у Spark.
+    Возвращает {колонка: numpy массив}. float32 * int в Spark дает float, поэтому
+    precipitation_mm остается float32, а вычитание double-литерала и деление — float64.
+    """
+    t = _column(table, "time").astype("datetime64[us]")
+    hours = t.astype("datetime64[h]")
+    days = t.astype("datetime64[D]")
+    months = t.astype("datetime64[M]")
+
+    year_ = months.astype(np.int64) // 12 + 1970
+    month_ = months.astype(np.int64) % 12 + 1
+    day_ = (days - months.astype("datetime64[D]")).astype(np.int64) + 1
+    hour_ = (hours - days.astype("datetime64[h]")).astype(np.int64)
+
+    latitude = _column(table, "latitude")
+    longitude = _column(table, "longitude")
+    u10 = _column(table, "u10").astype(np.float64)
+    v10 = _column(table, "v10").astype(np.float64)
+    tp = _column(table, "tp")
+
+    return {
+        "time": t,
+        "latitude": latitude,
+        "longitude": longitude,
+        "time_id": year_ * 1000000 + month_ * 10000 + day_ * 100 + hour_,
+        "location_id": grid.location_id(latitude, longitude),
+        "temperature_c": spark_round(_column(table, "t2m").astype(np.float64) - 273.15, 2),
+        "dewpoint_c": spark_round(_column(table, "d2m").astype(np.float64) - 273.15, 2),
+        "max_temp_c": spark_round(_column(table, "mx2t").astype(np.float64) - 273.15, 2),
+        "min_temp_c": spark_round(_column(table, "mn2t").astype(np.float64) - 273.15, 2),
+        "pressure_hpa": spark_round(_column(table, "msl").astype(np.float64) / 100, 2),
+        "precipitation_mm": spark_round(tp * tp.dtype.type(1000), 4),
+        "wind_speed_ms": spark_round(np.power(u10 ** 2 + v10 ** 2, 0.5), 2),
+        "cloud_cover": _column(table, "tcc"),
+        "solar_radiation": _column(table, "avg_sdswrf"),
+    }
+
+
+def split_star_schema(processed):
+    """Делит результат transform() на dim_time, dim_location и fact_weather (словари колонок)."""
+    # A. DIM_TIME: уникальные часы
+    _, idx = np.unique(processed["time_id"], return_index=True)
+    t = processed["time"][idx]
+    days = t.astype("datetime64[D]")
+    months = t.astype("datetime64[M]")
+    month_ = (months.astype(np.int64) % 12 + 1).astype(np.int32)
+    dim_time = {
+        "time_id": processed["time_id"][idx],
+        "timestamp": t.astype("datetime64[ns]"),
+        "year": (months.astype(np.int64) // 12 + 1970).astype(np.int32),
+        "month": month_,
+        "day": ((days - months.astype("datetime64[D]")).astype(np.int64) + 1).astype(np.int32),
+        "hour": ((t.astype("datetime64[h]") - days.astype("datetime64[h]")).astype(np.int64)).astype(np.int32),
+        # 1970-01-01 — четверг (ISO 4): Пн=1 ... Вс=7
+        "day_of_week": ((days.astype(np.int64) + 3) % 7 + 1).astype(np.int32),
+        "quarter": ((month_ - 1) // 3 + 1).astype(np.int32),
+    }
+
+    # B. DIM_LOCATION: уникальные точки сетки
+    _, idx = np.unique(processed["location_id"], return_index=True)
+    dim_location = {
+        "location_id": processed["location_id"][idx],
+        "latitude": processed["latitude"][idx],
+        "longitude": processed["longitude"][idx],
+    }
+
+    # C. FACT_WEATHER
+    fact = {name: processed[name] for name in FACT_COLUMNS}
+    return dim_time, dim_location, fact
+
+
+# --- ПРОВЕРКА СОВПАДЕНИЯ СО SPARK ---
+
+def _sorted_frame(df, keys):
+    return df.sort_values(keys).reset_index(drop=True)
+
+
+def check_parity(d=target_date):
+    """
+    Прогоняет один день через оба движка и сравнивает три таблицы построчно.
+    Возвращает {таблица: True/False}. Нужен pyspark (импортируется только здесь).
+    """
+    from pyspark.sql import SparkSession
+    from data_pipeline import process_data_spark as spark_etl
+
+    table = read_day(d)
+    if table is None:
+        raise FileNotFoundError(f"Данных за {d} нет")
+    arrow_tables = split_star_schema(transform(table))
+
+    spark = SparkSession.builder.appName("WeatherETL_Parity").master("local[*]").getOrCreate()
+    spark.conf.set("spark.sql.session.timeZone", "UTC")
+    spark.conf.set("spark.sql.execution.arrow.pyspark.enabled", "true")
+    try:
+        spark_tables = spark_etl.split_star_schema(spark_etl.transform(spark_etl.read_day(spark, d)))
+        return compare_with_spark(arrow_tables, spark_tables)
+    finally:
+        spark.stop()
+
+
+def compare_with_spark(arrow_tables, spark_tables):
+    """
+    Сравнивает split_star_schema обоих движков (словари колонок и Spark DataFrame) построчно,
+    значения — точно. Возвращает {таблица: True/False}.
+    """
+    result = {}
+    for name, keys, arrow_cols, spark_df in zip(
+            ("dim_time", "dim_location", "fact_weather"),
+            (["time_id"], ["location_id"], ["time_id", "location_id"]),
+            arrow_tables, spark_tables):
+        expected = spark_df.toPandas()
+        if name == "dim_time":
+            expected["timestamp"] = pd.to_datetime(expected["timestamp"])
+        actual = pd.DataFrame(arrow_cols)[list(expected.columns)]
+        expected, actual = _sorted_frame(expected, keys), _sorted_frame(actual, keys)
+        try:
+            pd.testing.assert_frame_equal(actual, expected, check_dtype=False, check_exact=True)
+            result[name] = True
+        except AssertionError as e:
+            print(f"❌ {name}: {e}")
+            result[name] = False
+    return result
+
+
+# --- ETL ---
+
+def process_and_load(d=target_date):
+    print(f"--- ЗАПУСК ARROW STAR SCHEMA ETL ДЛЯ {d} ---")
+    started = time.time()
+
+    table = read_day(d)
+    if table is None:
+        print(f"❌ Ошибка: Данных за {d} нет. Сначала запустите daily_ingestion.py")
+        return False
+
+    print("Трансформация данных...")
+    dim_time, dim_location, fact = split_star_schema(transform(table))
+
+    print(f"Подключение к ClickHouse ({db_config['host']}:{db_config['port']})...")
+    client = Client(**db_config)
+    dim_cache = DimKeyCache().load(client)
+
+    print("Загрузка dim_location...")
+    load_dimension(client, dim_cache, 'weather_db.dim_location', dim_location)
+    print("Загрузка dim_time...")
+    load_dimension(client, dim_cache, 'weather_db.dim_time', dim_time)
+    print("Загрузка fact_weather...")
+    # День -> staging, затем REPLACE PARTITION месяца (повторный запуск не дублирует строки)
+    def load_facts(staging):
+        # Сверка до REPLACE PARTITION: недогруженный день не должен подменить месяц
+        result = insert_columns(client, staging, fact)
+        if result.rows != table.num_rows:
+            raise RuntimeError(f"fact_weather: вставлено {result.rows} строк, ожидалось {table.num_rows}")
+        return result
+
+    replace_partition(client, month_partition(d), load_facts,
+                      replaced_days=[d], source=f"day:{d}", engine="arrow")
+
+    print(f"\n✅ ETL УСПЕШНО ЗАВЕРШЕН за {time.time() - started:.1f} с!")
+    print("Измерения:")
+    dim_cache.report()
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ETL дня на pyarrow/numpy (без Spark)")
+    parser.add_argument("--date", default=None, help="YYYY-MM-DD (по умолчанию target_date)")
+    parser.add_argument("--check", action="store_true",
+                        help="Не грузить, а сравнить результат со Spark-версией")
+    args = parser.parse_args(argv)
+
+    d = date.fromisoformat(args.date) if args.date else target_date
+    if args.check:
+        result = check_parity(d)
+        print("Результаты совпадают со Spark ✅" if all(result.values()) else "❌ Есть расхождения со Spark")
+        if not all(result.values()):
+            sys.exit(1)
+        return
+
+    if not process_and_load(d):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
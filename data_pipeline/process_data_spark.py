@@ -1,21 +1,31 @@
 import os
 import sys
-from datetime import date, timedelta
+import calendar
+from datetime import date, datetime, timedelta
 import pandas as pd 
 import findspark
 
 findspark.init()
 
+from pyspark import StorageLevel
 from pyspark.sql import SparkSession
 from pyspark.sql.functions import (
-    col, round, lit, xxhash64, date_format, 
+    col, round, lit, pmod, date_format, 
     year, month, dayofmonth, hour, dayofweek, quarter
 )
 from clickhouse_driver import Client
 
+from data_pipeline.converter import WIDE_PARQUET_NAME
+from data_pipeline import lake
+from data_pipeline.spark_report import SparkJobReport
+from warehouse.grid import GRID_STEP, LON_CELLS
+from warehouse.loader import load_spark
+from warehouse.dim_cache import DimKeyCache, load_dimension
+from warehouse.partition_loader import replace_partition, month_partition
+
 # Импорт настроек подключения из модуля warehouse
 try:
-    from config import db_config
+    from config import db_config, SPARK_STORAGE_LEVEL
 except ImportError:
     print("⚠️ Ошибка импорта warehouse.config. Убедитесь, что запускаете скрипт из корня проекта.")
     sys.exit(1)
@@ -33,12 +43,169 @@ day_str = target_date.strftime("%d")
 # Путь к данным
 data_dir = os.path.join("raw_data", f"{year_str}-{month_str}-{day_str}")
 
-def process_and_load():
-    print(f"--- ЗАПУСК SPARK STAR SCHEMA ETL ДЛЯ {data_dir} ---")
+def read_period(spark, data_dir):
+    """
+    Читает данные периода в один широкий DataFrame.
+
+    Новые периоды уже склеены на этапе ingestion (data_wide.parquet) — JOIN не нужен.
+    Для старых папок с четырьмя файлами stepType делаем три JOIN по (time, latitude, longitude).
+    """
+    wide_path = os.path.join(data_dir, WIDE_PARQUET_NAME)
+    if os.path.exists(wide_path):
+        print("Чтение широкого Parquet (без JOIN)...")
+        return spark.read.parquet(wide_path)
+
+    df_instant = spark.read.parquet(os.path.join(data_dir, "data_stream-oper_stepType-instant.parquet"))
+    df_accum = spark.read.parquet(os.path.join(data_dir, "data_stream-oper_stepType-accum.parquet"))
+    df_avg = spark.read.parquet(os.path.join(data_dir, "data_stream-oper_stepType-avg.parquet"))
+    df_max = spark.read.parquet(os.path.join(data_dir, "data_stream-oper_stepType-max.parquet"))
+
+    print("Файлы успешно прочитаны.")
+
+    # Объединение (JOIN)
+    join_keys = ["time", "latitude", "longitude"]
+    return df_instant \
+        .join(df_accum, on=join_keys, how="inner") \
+        .join(df_avg, on=join_keys, how="inner") \
+        .join(df_max, on=join_keys, how="inner")
+
+def read_day(spark, d):
+    """
+    Читает один день: из дневной партиции озера, из месячного файла после compaction
+    или (старый формат) из папки raw_data/YYYY-MM-DD. Возвращает None, если данных нет.
+    """
+    daily_path = os.path.join(lake.daily_dir(d), lake.PART_NAME)
+    if os.path.exists(daily_path):
+        print(f"Чтение партиции озера {daily_path}...")
+        return spark.read.parquet(daily_path)
+
+    monthly_path = os.path.join(lake.monthly_dir(d.year, d.month), lake.PART_NAME)
+    if os.path.exists(monthly_path):
+        # Фильтр по time: Parquet отсекает лишние row group по статистике
+        start = datetime(d.year, d.month, d.day)
+        print(f"Чтение месячного файла озера {monthly_path}...")
+        return spark.read.parquet(monthly_path) \
+            .filter((col("time") >= lit(start)) & (col("time") < lit(start + timedelta(days=1))))
+
+    legacy_dir = os.path.join("raw_data", d.strftime("%Y-%m-%d"))
+    if os.path.exists(legacy_dir):
+        return read_period(spark, legacy_dir)
+    return None
+
+def month_lake_paths(year, month):
+    """
+    Файлы озера за месяц: (месячный файл после compaction или None, {дата: дневная партиция}).
+    Дневная партиция перекрывает тот же день в месячном файле (как в lake.lake_days):
+    день мог быть скачан заново уже после compaction.
+    """
+    monthly_path = os.path.join(lake.monthly_dir(year, month), lake.PART_NAME)
+    if not os.path.exists(monthly_path):
+        monthly_path = None
+    daily_parts = {}
+    for day in range(1, calendar.monthrange(year, month)[1] + 1):
+        d = date(year, month, day)
+        part = os.path.join(lake.daily_dir(d), lake.PART_NAME)
+        if os.path.exists(part):
+            daily_parts[d] = part
+    return monthly_path, daily_parts
+
+def _days_condition(days):
+    """Условие "time попадает в один из дней days" (фильтр по time, как в read_day)."""
+    condition = None
+    for d in sorted(days):
+        start = datetime(d.year, d.month, d.day)
+        day_cond = (col("time") >= lit(start)) & (col("time") < lit(start + timedelta(days=1)))
+        condition = day_cond if condition is None else condition | day_cond
+    return condition
+
+def read_lake(spark, monthly_paths, daily_parts):
+    """
+    Читает месячные файлы и дневные партиции озера одним DataFrame, каждый день — из одного источника.
+    Дни, для которых есть дневная партиция, отбрасываются из месячных файлов.
+    """
+    full_df = None
+    if monthly_paths:
+        full_df = spark.read.parquet(*monthly_paths)
+        if daily_parts:
+            full_df = full_df.filter(~_days_condition(daily_parts))
+    if daily_parts:
+        daily_df = spark.read.parquet(*daily_parts.values())
+        full_df = daily_df if full_df is None else full_df.unionByName(daily_df, allowMissingColumns=True)
+    return full_df
+
+def read_month(spark, year, month):
+    """Читает месяц из озера, иначе из старой папки raw_data/YYYY_MM. None, если данных нет."""
+    monthly_path, daily_parts = month_lake_paths(year, month)
+    if monthly_path or daily_parts:
+        return read_lake(spark, [monthly_path] if monthly_path else [], daily_parts)
 
-    if not os.path.exists(data_dir):
-        print(f"❌ Ошибка: Папка {data_dir} не найдена. Сначала запустите daily_ingest.py")
-        return
+    legacy_dir = os.path.join("raw_data", f"{year:04d}_{month:02d}")
+    if os.path.exists(legacy_dir):
+        return read_period(spark, legacy_dir)
+    return None
+
+# Колонки таблицы фактов (тот же порядок, что в fact_weather)
+FACT_COLUMNS = [
+    "time_id", "location_id",
+    "temperature_c", "dewpoint_c",
+    "max_temp_c", "min_temp_c",
+    "pressure_hpa", "precipitation_mm",
+    "wind_speed_ms", "cloud_cover", "solar_radiation"
+]
+
+def grid_location_id(lat, lon):
+    """location_id как в warehouse.grid.location_id: плотный индекс точки сетки (int, в ClickHouse UInt32)."""
+    lat_idx = round((lit(90) - lat) / GRID_STEP)
+    lon_idx = round(pmod(lon, lit(360)) / GRID_STEP) % LON_CELLS
+    return (lat_idx * LON_CELLS + lon_idx).cast("int")
+
+def transform(full_df):
+    """Feature engineering: ключи Star Schema и перевод единиц (K -> °C, Па -> гПа, м -> мм)."""
+    # Генерируем суррогатные ключи для Star Schema
+    # time_id: 2025120100 (YYYYMMDDHH)
+    # location_id: индекс точки на сетке ERA5 (lat_idx * 1440 + lon_idx)
+    processed_df = full_df \
+        .withColumn("time_id", date_format(col("time"), "yyyyMMddHH").cast("long")) \
+        .withColumn("location_id", grid_location_id(col("latitude"), col("longitude"))) \
+        .withColumn("temperature_c", round(col("t2m") - 273.15, 2)) \
+        .withColumn("dewpoint_c", round(col("d2m") - 273.15, 2)) \
+        .withColumn("max_temp_c", round(col("mx2t") - 273.15, 2)) \
+        .withColumn("min_temp_c", round(col("mn2t") - 273.15, 2)) \
+        .withColumn("pressure_hpa", round(col("msl") / 100, 2)) \
+        .withColumn("precipitation_mm", round(col("tp") * 1000, 4)) \
+        .withColumn("wind_speed_ms", round((col("u10")**2 + col("v10")**2)**0.5, 2)) \
+        .withColumnRenamed("avg_sdswrf", "solar_radiation") \
+        .withColumnRenamed("tcc", "cloud_cover")
+    return processed_df
+
+def split_star_schema(processed_df):
+    """Делит трансформированный DataFrame на dim_time, dim_location и fact_weather."""
+    # A. DIM_TIME (Измерение времени)
+    dim_time_df = processed_df.select(
+        col("time_id"),
+        date_format(col("time"), "yyyy-MM-dd HH:mm:ss").alias("timestamp"), # <-- Строка вместо Timestamp
+        year(col("time")).alias("year"),
+        month(col("time")).alias("month"),
+        dayofmonth(col("time")).alias("day"),
+        hour(col("time")).alias("hour"),
+        # Формула перевода: Spark(1=Sun) -> ISO(7=Sun)
+        ((dayofweek(col("time")) + 5) % 7 + 1).alias("day_of_week"),
+        quarter(col("time")).alias("quarter")
+    ).distinct()
+
+    # B. DIM_LOCATION (Измерение локации)
+    dim_location_df = processed_df.select(
+        col("location_id"),
+        col("latitude"),
+        col("longitude")
+    ).distinct()
+
+    # C. FACT_WEATHER (Таблица фактов)
+    fact_df = processed_df.select(*FACT_COLUMNS)
+    return dim_time_df, dim_location_df, fact_df
+
+def process_and_load(persist=True):
+    print(f"--- ЗАПУСК SPARK STAR SCHEMA ETL ДЛЯ {target_date} ---")
     
     # 1. Инициализация Spark (Локальный режим)
     spark = SparkSession.builder \
@@ -49,107 +216,86 @@ def process_and_load():
     # === ВАЖНОЕ ИСПРАВЛЕНИЕ 1: Работаем строго в UTC ===
     # Это уберет сдвиги на 1 час и прыжки дат
     spark.conf.set("spark.sql.session.timeZone", "UTC")
+    # Данные на драйвер — колоночными Arrow-буферами (toPandas/toArrow)
+    spark.conf.set("spark.sql.execution.arrow.pyspark.enabled", "true")
 
     spark.sparkContext.setLogLevel("WARN")
+    report = SparkJobReport(spark)
 
     try:
-        # 2. Чтение Parquet файлов
-        df_instant = spark.read.parquet(os.path.join(data_dir, "data_stream-oper_stepType-instant.parquet"))
-        df_accum = spark.read.parquet(os.path.join(data_dir, "data_stream-oper_stepType-accum.parquet"))
-        df_avg = spark.read.parquet(os.path.join(data_dir, "data_stream-oper_stepType-avg.parquet"))
-        df_max = spark.read.parquet(os.path.join(data_dir, "data_stream-oper_stepType-max.parquet"))
-
-        print("Файлы успешно прочитаны.")
-
-        # 3. Объединение (JOIN)
-        join_keys = ["time", "latitude", "longitude"]
-        full_df = df_instant \
-            .join(df_accum, on=join_keys, how="inner") \
-            .join(df_avg, on=join_keys, how="inner") \
-            .join(df_max, on=join_keys, how="inner")
+        # 2-3. Чтение Parquet (озеро, широкий файл или 4 файла stepType + JOIN)
+        full_df = read_day(spark, target_date)
+        if full_df is None:
+            print(f"❌ Ошибка: Данных за {target_date} нет. Сначала запустите daily_ingestion.py")
+            return
 
         # 4. Трансформация данных (Feature Engineering)
         print("Трансформация данных...")
-        # Генерируем суррогатные ключи для Star Schema
-        # time_id: 2025120100 (YYYYMMDDHH)
-        # location_id: 64-битный хэш от координат
-        processed_df = full_df \
-            .withColumn("time_id", date_format(col("time"), "yyyyMMddHH").cast("long")) \
-            .withColumn("location_id", xxhash64(col("latitude"), col("longitude"))) \
-            .withColumn("temperature_c", round(col("t2m") - 273.15, 2)) \
-            .withColumn("dewpoint_c", round(col("d2m") - 273.15, 2)) \
-            .withColumn("max_temp_c", round(col("mx2t") - 273.15, 2)) \
-            .withColumn("min_temp_c", round(col("mn2t") - 273.15, 2)) \
-            .withColumn("pressure_hpa", round(col("msl") / 100, 2)) \
-            .withColumn("precipitation_mm", round(col("tp") * 1000, 4)) \
-            .withColumn("wind_speed_ms", round((col("u10")**2 + col("v10")**2)**0.5, 2)) \
-            .withColumnRenamed("avg_sdswrf", "solar_radiation") \
-            .withColumnRenamed("tcc", "cloud_cover")
+        processed_df = transform(full_df)
+
+        # Чтение + JOIN + трансформация считаются ОДИН раз: все таблицы ниже берутся из кэша.
+        # count() здесь единственный: он же материализует кэш и дает число фактов для сверки.
+        if persist:
+            processed_df = processed_df.persist(getattr(StorageLevel, SPARK_STORAGE_LEVEL))
+        with report.step("read+transform"):
+            total_rows = processed_df.count()
+        print(f"Строк после трансформации: {total_rows}")
 
         # --- 5. РАЗДЕЛЕНИЕ НА ТАБЛИЦЫ (Схема Звезда) ---
-        # A. DIM_TIME (Измерение времени)
-        dim_time_df = processed_df.select(
-            col("time_id"),
-            date_format(col("time"), "yyyy-MM-dd HH:mm:ss").alias("timestamp"), # <-- Строка вместо Timestamp
-            year(col("time")).alias("year"),
-            month(col("time")).alias("month"),
-            dayofmonth(col("time")).alias("day"),
-            hour(col("time")).alias("hour"),
-            # Формула перевода: Spark(1=Sun) -> ISO(7=Sun)
-            ((dayofweek(col("time")) + 5) % 7 + 1).alias("day_of_week"),
-            quarter(col("time")).alias("quarter")
-        ).distinct()
-
-        # B. DIM_LOCATION (Измерение локации)
-        dim_location_df = processed_df.select(
-            col("location_id"),
-            col("latitude"),
-            col("longitude")
-        ).distinct()
-
-        # C. FACT_WEATHER (Таблица фактов)
-        fact_df = processed_df.select(
-            "time_id", "location_id",
-            "temperature_c", "dewpoint_c",
-            "max_temp_c", "min_temp_c",
-            "pressure_hpa", "precipitation_mm",
-            "wind_speed_ms", "cloud_cover", "solar_radiation"
-        )
+        dim_time_df, dim_location_df, fact_df = split_star_schema(processed_df)
 
         # --- 6. ЗАГРУЗКА В CLICKHOUSE ---
+        # Число строк печатается из результатов загрузки (LoadResult), без отдельных count()
         print(f"Подключение к ClickHouse ({db_config['host']}:{db_config['port']})...")
         client = Client(**db_config)
+        # Известные ключи измерений: вставляем только новые точки и часы
+        dim_cache = DimKeyCache().load(client)
 
-        # Загрузка DIM_LOCATION
-        print(f"Загрузка dim_location ({dim_location_df.count()} записей)...")
-        client.execute('INSERT INTO weather_db.dim_location VALUES', dim_location_df.toPandas().to_dict('records'))
+        # Загрузка DIM_LOCATION (после distinct — не больше ~1500 строк, фильтруем на драйвере)
+        print("Загрузка dim_location...")
+        with report.step("dim_location"):
+            load_dimension(client, dim_cache, 'weather_db.dim_location', dim_location_df.toPandas())
 
         # Загрузка DIM_TIME
-        print(f"Загрузка dim_time ({dim_time_df.count()} записей)...")
+        print("Загрузка dim_time...")
+        with report.step("dim_time"):
+            # Конвертируем в локальный Pandas DataFrame
+            pdf_dim_time = dim_time_df.toPandas()
 
-        # Конвертируем в локальный Pandas DataFrame
-        pdf_dim_time = dim_time_df.toPandas()
-        
-        # --- ФИКС ОШИБКИ 'str has no attribute tzinfo' ---
-        # Превращаем строковую колонку обратно в datetime, но БЕЗ часового пояса (naive).
-        # Это удовлетворяет драйвер (он видит datetime) и сохраняет значение 00:00:00.
-        pdf_dim_time['timestamp'] = pd.to_datetime(pdf_dim_time['timestamp'])
+            # --- ФИКС ОШИБКИ 'str has no attribute tzinfo' ---
+            # Превращаем строковую колонку обратно в datetime, но БЕЗ часового пояса (naive).
+            # Это удовлетворяет драйвер (он видит datetime) и сохраняет значение 00:00:00.
+            pdf_dim_time['timestamp'] = pd.to_datetime(pdf_dim_time['timestamp'])
 
-        client.execute('INSERT INTO weather_db.dim_time VALUES', pdf_dim_time.to_dict('records'))
+            load_dimension(client, dim_cache, 'weather_db.dim_time', pdf_dim_time)
 
-        # Загрузка FACT_WEATHER
-        print(f"Загрузка fact_weather ({fact_df.count()} записей)...")
-        client.execute('INSERT INTO weather_db.fact_weather VALUES', fact_df.toPandas().to_dict('records'))
+        # Загрузка FACT_WEATHER: день пишется в staging (по умолчанию параллельно из партиций Spark,
+        # LOADER_MODE), затем месяц в fact_weather атомарно заменяется (REPLACE PARTITION).
+        # Повторный запуск за ту же дату не дублирует строки.
+        print("Загрузка fact_weather...")
+        with report.step("fact_weather"):
+            replace_partition(
+                client, month_partition(target_date),
+                lambda table: load_spark(client, table, fact_df, expected=total_rows),
+                replaced_days=[target_date], source=f"day:{target_date}", engine="spark"
+            )
 
         print("\n✅ ETL УСПЕШНО ЗАВЕРШЕН!")
-
+        print("Измерения:")
+        dim_cache.report()
 
     except Exception as e:
         print(f"Ошибка Spark ETL: {e}")
         import traceback
         traceback.print_exc()
     finally:
+        report.print()
         spark.stop()
 
 if __name__ == "__main__":
-    process_and_load()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Spark ETL дня в ClickHouse")
+    parser.add_argument("--no-persist", action="store_true",
+                        help="Не кэшировать трансформированный DataFrame (для сравнения числа jobs)")
+    args = parser.parse_args()
+    process_and_load(persist=not args.no_persist)
\ No newline at end of file
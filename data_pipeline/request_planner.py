@@ -0,0 +1,184 @@
+import os
+import re
+import sys
+import calendar
+import argparse
+from datetime import date, timedelta
+
+from config import RAW_DATA_DIR, ERA5_VARIABLES, CDS_MAX_FIELDS, INGESTION_MAX_WORKERS
+from data_pipeline.ingestion_executor import (
+    build_request, make_period, read_manifest, STATUS_CONVERTED
+)
+from data_pipeline.lake import lake_days
+from data_pipeline.ingestion_cache import content_key
+
+# Форматы папок в raw_data/
+DAILY_DIR_RE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})$")       # 2025-12-01 (ежедневный запуск)
+MONTHLY_DIR_RE = re.compile(r"^(\d{4})_(\d{2})$")             # 2023_08 (бэкфилл)
+RANGE_DIR_RE = re.compile(r"^(\d{4})_(\d{2})_(\d{2})-(\d{2})") # 2023_08_05-20 (планировщик)
+
+HOURS_PER_DAY = 24
+
+
+def _has_parquet(path):
+    return any(f.endswith(".parquet") for f in os.listdir(path))
+
+
+def _request_days(request):
+    """Все даты, которые покрывает payload CDS (декартово произведение year × month × day)."""
+    days = set()
+    for y in request.get("year", []):
+        for m in request.get("month", []):
+            for d in request.get("day", []):
+                try:
+                    days.add(date(int(y), int(m), int(d)))
+                except ValueError:
+                    continue
+    return days
+
+
+def _dir_days(name, path, key=None):
+    """
+    Даты, которые уже лежат в папке периода (пустое множество, если данные не готовы
+    или были скачаны с другим payload / другой версией конвертера).
+    """
+    manifest = read_manifest(path)
+    if manifest is not None:
+        if manifest.get("status") != STATUS_CONVERTED:
+            return set()
+        if key is not None and manifest.get("content_key") != key:
+            return set()
+        return _request_days(manifest.get("request", {}))
+
+    # Старые папки без манифеста: судим по имени и наличию Parquet
+    if not _has_parquet(path):
+        return set()
+
+    m = DAILY_DIR_RE.match(name)
+    if m:
+        return {date(int(m.group(1)), int(m.group(2)), int(m.group(3)))}
+
+    m = MONTHLY_DIR_RE.match(name)
+    if m:
+        y, mo = int(m.group(1)), int(m.group(2))
+        return {date(y, mo, d) for d in range(1, calendar.monthrange(y, mo)[1] + 1)}
+
+    m = RANGE_DIR_RE.match(name)
+    if m:
+        y, mo = int(m.group(1)), int(m.group(2))
+        return {date(y, mo, d) for d in range(int(m.group(3)), int(m.group(4)) + 1)}
+
+    return set()
+
+
+def current_key():
+    """Ключ содержимого для текущих настроек (variables/area/время + версия конвертера)."""
+    return content_key(build_request(2000, 1, [1]))
+
+
+def existing_days(base_dir=RAW_DATA_DIR, key=None):
+    """
+    Множество дат, для которых в raw_data/ уже есть сконвертированные данные с ключом key.
+    Старые файлы без ключа (до кэша) считаются актуальными.
+    """
+    if not os.path.isdir(base_dir):
+        return set()
+    days = {d for d, k in lake_days(os.path.join(base_dir, "lake")).items()
+            if key is None or k is None or k == key}
+    for name in os.listdir(base_dir):
+        path = os.path.join(base_dir, name)
+        if name not in ("lake", "_cache") and os.path.isdir(path):
+            days |= _dir_days(name, path, key)
+    return days
+
+
+def missing_days(start, end, base_dir=RAW_DATA_DIR):
+    have = existing_days(base_dir, current_key())
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)
+            if start + timedelta(days=i) not in have]
+
+
+def max_days_per_request(n_variables=len(ERA5_VARIABLES), max_fields=CDS_MAX_FIELDS):
+    """Сколько дней влезает в один запрос с учетом лимита CDS на число полей."""
+    return max(1, max_fields // (n_variables * HOURS_PER_DAY))
+
+
+def _period_name(days, base_dir, taken):
+    first, last = days[0], days[-1]
+    month_len = calendar.monthrange(first.year, first.month)[1]
+
+    if len(days) == 1:
+        name = first.strftime("%Y-%m-%d")
+    elif len(days) == month_len:
+        name = f"{first.year:04d}_{first.month:02d}"
+    else:
+        name = f"{first.year:04d}_{first.month:02d}_{first.day:02d}-{last.day:02d}"
+
+    # Папка с таким именем уже содержит готовые данные — добавляем суффикс.
+    # Пустые/недокачанные папки переиспользуем (executor продолжит по манифесту).
+    candidate, i = name, 1
+    while candidate in taken or (
+        os.path.isdir(os.path.join(base_dir, candidate))
+        and _dir_days(candidate, os.path.join(base_dir, candidate))
+    ):
+        i += 1
+        candidate = f"{name}_{i}"
+    taken.add(candidate)
+    return candidate
+
+
+def plan_requests(start, end, base_dir=RAW_DATA_DIR, max_days=None):
+    """
+    Превращает пропуски в диапазоне [start, end] в минимальный набор запросов CDS.
+
+    Дни группируются по месяцам (payload CDS — декартово произведение year × month × day,
+    поэтому дни одного месяца можно просить одним запросом, даже если они идут не подряд).
+    Если месяц не влезает в лимит, он режется на куски по max_days дней.
+    Возвращает список периодов для IngestionExecutor.
+    """
+    if max_days is None:
+        max_days = max_days_per_request()
+
+    by_month = {}
+    for d in missing_days(start, end, base_dir):
+        by_month.setdefault((d.year, d.month), []).append(d)
+
+    periods, taken = [], set()
+    for (y, m), days in sorted(by_month.items()):
+        for i in range(0, len(days), max_days):
+            chunk = days[i:i + max_days]
+            name = _period_name(chunk, base_dir, taken)
+            request = build_request(y, m, [d.day for d in chunk])
+            periods.append(make_period(name, request, base_dir))
+    return periods
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Планирование запросов CDS по пропущенным датам")
+    parser.add_argument("--start", required=True, help="YYYY-MM-DD")
+    parser.add_argument("--end", required=True, help="YYYY-MM-DD")
+    parser.add_argument("--run", action="store_true", help="Сразу выполнить план")
+    parser.add_argument("--workers", type=int, default=INGESTION_MAX_WORKERS)
+    args = parser.parse_args(argv)
+
+    start, end = date.fromisoformat(args.start), date.fromisoformat(args.end)
+    periods = plan_requests(start, end)
+    n_days = sum(len(p["request"]["day"]) for p in periods)
+    print(f"Пропущено дней: {n_days} из {(end - start).days + 1}")
+    print(f"Запросов к CDS: {len(periods)}")
+    for p in periods:
+        print(f"  {p['name']}: дни {', '.join(p['request']['day'])}")
+
+    if not periods or not args.run:
+        return
+
+    import cdsapi
+    from data_pipeline.ingestion_executor import IngestionExecutor
+
+    results = IngestionExecutor(cdsapi.Client, max_workers=args.workers).run(periods)
+    if any(s != STATUS_CONVERTED for s in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
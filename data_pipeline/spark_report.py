@@ -0,0 +1,48 @@
+import time
+from contextlib import contextmanager
+
+
+class SparkJobReport:
+    """
+    Сколько Spark jobs/stages и времени ушло на каждый шаг ETL.
+
+    Каждый шаг выполняется в своей job group, после шага id джобов берутся
+    из statusTracker — так видно, какие действия (count, toPandas, запись)
+    заново пересчитывают чтение Parquet и трансформации.
+    """
+
+    def __init__(self, spark, prefix="etl"):
+        self.sc = spark.sparkContext
+        self.prefix = prefix
+        self.steps = []
+
+    @contextmanager
+    def step(self, name):
+        group = f"{self.prefix}-{len(self.steps)}-{name}"
+        self.sc.setJobGroup(group, name)
+        started = time.time()
+        try:
+            yield
+        finally:
+            seconds = time.time() - started
+            tracker = self.sc.statusTracker()
+            job_ids = tracker.getJobIdsForGroup(group)
+            stages = 0
+            for job_id in job_ids:
+                info = tracker.getJobInfo(job_id)
+                if info is not None:
+                    stages += len(info.stageIds)
+            self.steps.append({"step": name, "jobs": len(job_ids), "stages": stages, "seconds": seconds})
+            self.sc.setLocalProperty("spark.jobGroup.id", None)
+
+    @property
+    def total_jobs(self):
+        return sum(s["jobs"] for s in self.steps)
+
+    def print(self):
+        print(f"\n{'Шаг':<24} {'Jobs':>6} {'Stages':>7} {'Время, с':>10}")
+        for s in self.steps:
+            print(f"{s['step']:<24} {s['jobs']:>6} {s['stages']:>7} {s['seconds']:>10.2f}")
+        total_seconds = sum(s["seconds"] for s in self.steps)
+        total_stages = sum(s["stages"] for s in self.steps)
+        print(f"{'Итого':<24} {self.total_jobs:>6} {total_stages:>7} {total_seconds:>10.2f}")
@@ -7,48 +7,75 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
-from warehouse.connection import get_db_client
+from config import ML_BATCH_SIZE
+from warehouse.arrow_stream import stream_arrow, read_arrow_table
+from warehouse.grid import sql_latitude, sql_longitude
+
+TARGET = 'temperature_c'
+
+# Мы НЕ берем max_temp_c и min_temp_c как признаки (Features),
+# потому что они почти равны целевой переменной (это будет читерство/Data Leakage).
+# Мы предсказываем temperature_c на основе атмосферных явлений.
+TRAINING_QUERY = f'''
+SELECT 
+    -- Целевая переменная (Target)
+    f.temperature_c,
+    
+    -- Признаки (Features)
+    f.pressure_hpa,
+    f.dewpoint_c,
+    f.precipitation_mm,
+    f.wind_speed_ms,
+    f.cloud_cover,
+    f.solar_radiation,
+    
+    -- Контекст (координаты считаются из индекса сетки, без JOIN с dim_location)
+    {sql_latitude('f.location_id')} AS latitude,
+    {sql_longitude('f.location_id')} AS longitude,
+    f.month,
+    f.hour,
+    f.day_of_week
+FROM fact_weather f
+ORDER BY f.time_id
+'''
+
+
+def iter_batches(query=TRAINING_QUERY, batch_size=ML_BATCH_SIZE):
+    """
+    Генератор pandas DataFrame по batch_size строк: результат читается из ClickHouse
+    потоком Arrow-батчей, в памяти одновременно только текущий батч.
+    """
+    for batch in stream_arrow(query, batch_size):
+        yield batch.to_pandas()
+
+
+def iter_training_batches(query=TRAINING_QUERY, batch_size=ML_BATCH_SIZE, target=TARGET):
+    """Генератор (X, y) по батчам — для обучения по частям (partial_fit и т.п.)."""
+    for df in iter_batches(query, batch_size):
+        yield df.drop(columns=[target]), df[target]
+
+
+def load_dataframe(query, batch_size=ML_BATCH_SIZE):
+    """
+    Весь результат одним DataFrame. Колонки собираются из типизированных Arrow-батчей,
+    а не из Python-объектов на каждую ячейку; self_destruct освобождает Arrow-буферы
+    по мере конвертации, чтобы пик памяти не был двойным.
+    """
+    table = read_arrow_table(query, batch_size)
+    if table is None:
+        return pd.DataFrame()
+    return table.to_pandas(self_destruct=True, split_blocks=True)
+
 
 def load_data_from_clickhouse():
     """
-    Выгружает данные из ClickHouse, объединяя факты с измерениями.
+    Выгружает данные из ClickHouse для ML.
     Возвращает Pandas DataFrame.
     """
-    client = get_db_client()
-    
     print("--- ЗАГРУЗКА ДАННЫХ ДЛЯ ML ---")
     
-    # Мы НЕ берем max_temp_c и min_temp_c как признаки (Features),
-    # потому что они почти равны целевой переменной (это будет читерство/Data Leakage).
-    # Мы предсказываем temperature_c на основе атмосферных явлений.
-    
-    query = '''
-    SELECT 
-        -- Целевая переменная (Target)
-        f.temperature_c,
-        
-        -- Признаки (Features)
-        f.pressure_hpa,
-        f.dewpoint_c,
-        f.precipitation_mm,
-        f.wind_speed_ms,
-        f.cloud_cover,
-        f.solar_radiation,
-        
-        -- Контекст (из измерений)
-        l.latitude,
-        l.longitude,
-        t.month,
-        t.hour,
-        t.day_of_week
-    FROM fact_weather f
-    JOIN dim_time t ON f.time_id = t.time_id
-    JOIN dim_location l ON f.location_id = l.location_id
-    ORDER BY t.timestamp
-    '''
-    
     print("Выполнение SQL запроса...")
-    df = client.query_dataframe(query)
+    df = load_dataframe(TRAINING_QUERY)
     print(f"✅ Загружено строк: {len(df)}")
     print("Пример данных:")
     print(df.head())
@@ -56,4 +83,4 @@ def load_data_from_clickhouse():
     return df
 
 if __name__ == "__main__":
-    load_data_from_clickhouse()
\ No newline at end of file
+    load_data_from_clickhouse()
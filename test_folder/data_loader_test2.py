@@ -7,15 +7,14 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
-from warehouse.connection import get_db_client
+from ml_models.data_loader import load_dataframe
+from warehouse.grid import sql_latitude, sql_longitude
 
 def load_data_from_clickhouse():
     """
     Выгружает данные из ClickHouse для ML.
     Использует агрессивный сэмплинг для оптимизации памяти.
     """
-    client = get_db_client()
-    
     print("--- ЗАГРУЗКА ДАННЫХ ДЛЯ ML ---")
     
     # ЛОГИКА СЭМПЛИНГА:
@@ -23,7 +22,7 @@ def load_data_from_clickhouse():
     # Если взять каждую 20-ю строку (% 20 == 0), получим ~620 000 строк.
     # Это идеальный объем для быстрого обучения RandomForest на ноутбуке.
     
-    query = '''
+    query = f'''
     SELECT 
         f.temperature_c,
         f.pressure_hpa,
@@ -32,24 +31,23 @@ def load_data_from_clickhouse():
         f.wind_speed_ms,
         f.cloud_cover,
         f.solar_radiation,
-        l.latitude,
-        l.longitude,
-        t.month,
-        t.hour,
-        t.day_of_week
+        {sql_latitude('f.location_id')} AS latitude,
+        {sql_longitude('f.location_id')} AS longitude,
+        f.month,
+        f.hour,
+        f.day_of_week
     FROM fact_weather f
-    JOIN dim_time t ON f.time_id = t.time_id
-    JOIN dim_location l ON f.location_id = l.location_id    
     
-    WHERE t.year = 2025
+    WHERE f.year = 2025
       AND cityHash64(f.time_id, f.location_id) % 20 == 0  -- БЕРЕМ 5% ДАННЫХ (каждую 20-ю)
       
-    ORDER BY t.timestamp
+    ORDER BY f.time_id
     '''
     
     print("Выполнение SQL запроса (2025 год, выборка ~5%)...")
     try:
-        df = client.query_dataframe(query)
+        # Потоком Arrow-батчей, без Python-объекта на каждую ячейку
+        df = load_dataframe(query)
         print(f"✅ Загружено строк: {len(df)}")
         
         # Если вдруг даже 5% это много (больше 1млн), предупредим
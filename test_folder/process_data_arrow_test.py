@@ -0,0 +1,116 @@
+"""
+Совпадение numpy-движка (data_pipeline/process_data_arrow.py) со Spark-версией
+на маленьком наборе данных, без озера и ClickHouse:
+    python -m pytest test_folder/process_data_arrow_test.py
+Сравнение со Spark пропускается, если нет pyspark или Java.
+"""
+import os
+import sys
+from decimal import Decimal, ROUND_HALF_UP
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+pa = pytest.importorskip("pyarrow")
+pytest.importorskip("clickhouse_driver")  # импортируется модулями ETL
+
+from data_pipeline.process_data_arrow import spark_round, transform, split_star_schema, compare_with_spark
+
+
+def _half_up(value, scale):
+    """Эталон: HALF_UP по десятичной записи числа, как round() в Spark."""
+    return float(Decimal(repr(float(value))).quantize(Decimal(1).scaleb(-scale), rounding=ROUND_HALF_UP))
+
+
+# --- spark_round ---
+
+@pytest.mark.parametrize("value, scale, expected", [
+    (0.125, 2, 0.13),        # numpy: 0.12 (к четному)
+    (-0.125, 2, -0.13),
+    (2.675, 2, 2.68),        # в двоичном виде 2.67499..., но Spark смотрит на запись "2.675"
+    (1.005, 2, 1.01),
+    (0.5, 0, 1.0),
+    (-2.5, 0, -3.0),
+    (0.00005, 4, 0.0001),
+    (12.34449, 2, 12.34),
+])
+def test_spark_round_half_up(value, scale, expected):
+    assert spark_round(np.array([value]), scale)[0] == expected
+
+
+def test_spark_round_no_negative_zero():
+    # В Spark результат идет через BigDecimal, -0.0 там не бывает
+    result = spark_round(np.array([-0.001, -0.0]), 2)
+    assert not np.signbit(result).any()
+
+
+def test_spark_round_matches_decimal_on_edges():
+    # Все значения — "...5" в третьем знаке: ровно те, где numpy и Spark расходятся
+    values = np.array([k * 0.005 for k in range(-2000, 2001)]) - 273.15
+    expected = np.array([_half_up(v, 2) for v in values]) + 0.0
+    np.testing.assert_array_equal(spark_round(values, 2), expected)
+
+
+def test_spark_round_keeps_dtype():
+    values = np.array([0.00125, 1.5], dtype=np.float32)
+    assert spark_round(values, 4).dtype == np.float32
+
+
+# --- transform и split_star_schema против Spark ---
+
+def _fixture_frame():
+    """Три часа (високосный день, граница года) x 2 широты x 3 долготы, переменные — float32 как в озере."""
+    times = pd.to_datetime(["2024-02-28 22:00", "2024-02-29 23:00", "2024-12-31 23:00"])
+    grid = pd.MultiIndex.from_product([times, [50.0, 49.75], [-0.25, 0.0, 10.5]],
+                                      names=["time", "latitude", "longitude"]).to_frame(index=False)
+    rng = np.random.default_rng(7)
+    n = len(grid)
+
+    def measure(low, high):
+        return rng.uniform(low, high, n).astype(np.float32)
+
+    grid["t2m"] = measure(240, 310)
+    grid["d2m"] = measure(230, 300)
+    grid["mx2t"] = measure(245, 315)
+    grid["mn2t"] = measure(235, 305)
+    grid["msl"] = measure(96000, 104000)
+    grid["tp"] = measure(0, 0.01)
+    grid["u10"] = measure(-15, 15)
+    grid["v10"] = measure(-15, 15)
+    grid["tcc"] = measure(0, 1)
+    grid["avg_sdswrf"] = measure(0, 900)
+    # Граничные значения: ровно 0 °C, нулевые осадки и ветер 3-4-5
+    grid.loc[0, "t2m"] = np.float32(273.15)
+    grid.loc[1, "tp"] = np.float32(0)
+    grid.loc[2, ["u10", "v10"]] = np.float32(3), np.float32(4)
+    return grid
+
+
+@pytest.fixture(scope="module")
+def spark():
+    pytest.importorskip("pyspark")
+    pytest.importorskip("findspark")
+    from pyspark.sql import SparkSession
+    try:
+        session = SparkSession.builder.appName("WeatherETL_ParityTest").master("local[1]").getOrCreate()
+    except Exception as e:
+        pytest.skip(f"Spark не запускается: {e}")
+    session.conf.set("spark.sql.session.timeZone", "UTC")
+    session.conf.set("spark.sql.execution.arrow.pyspark.enabled", "true")
+    yield session
+    session.stop()
+
+
+def test_transform_matches_spark(spark):
+    from data_pipeline import process_data_spark as spark_etl
+
+    frame = _fixture_frame()
+    arrow_tables = split_star_schema(transform(pa.Table.from_pandas(frame, preserve_index=False)))
+    spark_tables = spark_etl.split_star_schema(spark_etl.transform(spark.createDataFrame(frame)))
+
+    assert compare_with_spark(arrow_tables, spark_tables) == {
+        "dim_time": True, "dim_location": True, "fact_weather": True
+    }
@@ -0,0 +1,63 @@
+import threading
+
+import requests
+import pyarrow as pa
+from requests.adapters import HTTPAdapter
+
+from config import (
+    CLICKHOUSE_HOST, CLICKHOUSE_HTTP_PORT, CLICKHOUSE_USER, CLICKHOUSE_PASSWORD, DB_NAME,
+    DB_POOL_SIZE, DB_SETTINGS, ML_BATCH_SIZE, ML_STREAM_CONNECT_TIMEOUT, ML_STREAM_READ_TIMEOUT
+)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Общая HTTP-сессия процесса (создается при первом обращении): keep-alive соединения
+    с ClickHouse переиспользуются, одновременно открыто не больше DB_POOL_SIZE.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            session.headers.update({"X-ClickHouse-User": CLICKHOUSE_USER, "X-ClickHouse-Key": CLICKHOUSE_PASSWORD})
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=DB_POOL_SIZE, pool_block=True)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def stream_arrow(query, batch_size=ML_BATCH_SIZE, settings=None):
+    """
+    Генератор pyarrow.RecordBatch с результатом query (HTTP-интерфейс, FORMAT ArrowStream).
+
+    ClickHouse отдает результат блоками по max_block_size строк, каждый блок — один
+    Arrow-батч с типизированными колонками. Батч читается из сокета, отдается
+    вызывающему и освобождается, поэтому память не растет с размером результата
+    (в отличие от query_dataframe, который строит Python-объект на каждую ячейку).
+    DateTime приходит как uint32 (секунды), Date — как uint16 (дни).
+    """
+    params = {"database": DB_NAME, **DB_SETTINGS, "max_block_size": batch_size, **(settings or {})}
+    url = f"http://{CLICKHOUSE_HOST}:{CLICKHOUSE_HTTP_PORT}/"
+
+    # Таймаут чтения — пауза между байтами ответа, а не время всего запроса
+    with get_session().post(url, params=params, stream=True,
+                            timeout=(ML_STREAM_CONNECT_TIMEOUT, ML_STREAM_READ_TIMEOUT),
+                            data=f"{query}\nFORMAT ArrowStream".encode("utf-8")) as response:
+        if response.status_code != 200:
+            raise RuntimeError(f"ClickHouse: {response.text.strip()}")
+        response.raw.decode_content = True
+        reader = pa.ipc.open_stream(response.raw)
+        for batch in reader:
+            if batch.num_rows:
+                yield batch
+
+
+def read_arrow_table(query, batch_size=ML_BATCH_SIZE, settings=None):
+    """Весь результат одной pyarrow.Table (колонки типизированы, без Python-объектов на ячейку)."""
+    batches = list(stream_arrow(query, batch_size, settings))
+    if not batches:
+        return None
+    return pa.Table.from_batches(batches)
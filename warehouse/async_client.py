@@ -0,0 +1,132 @@
+import json
+
+import aiohttp
+import pandas as pd
+
+from config import (
+    CLICKHOUSE_HOST, CLICKHOUSE_HTTP_PORT, CLICKHOUSE_USER, CLICKHOUSE_PASSWORD, DB_NAME,
+    DB_POOL_SIZE, DB_SETTINGS, ASYNC_QUERY_TIMEOUT
+)
+from warehouse.query_cache import DATA_VERSION_QUERY, DATA_VERSION_FALLBACK_QUERY
+
+
+class AsyncQueryError(RuntimeError):
+    """ClickHouse вернул ошибку на HTTP-запрос."""
+
+
+# Типы ClickHouse, которые JSONCompact отдает строками
+TEXT_TYPES = ("String", "FixedString", "Date", "Date32", "DateTime", "DateTime64")
+
+
+def _base_type(ch_type):
+    """Nullable(LowCardinality(String)) -> String, DateTime('UTC') -> DateTime."""
+    for wrapper in ("Nullable(", "LowCardinality("):
+        while ch_type.startswith(wrapper):
+            ch_type = ch_type[len(wrapper):-1]
+    return ch_type.split("(", 1)[0]
+
+
+def frame_from_json(result):
+    """
+    DataFrame из ответа JSONCompact ({"meta": [...], "data": [...]}).
+    Колонки приводятся по типам ClickHouse из meta; значение не того вида
+    (например, DateTime числом) — ошибка, а не тихий "b'2020'" или 1970 год в ответе API.
+    """
+    names = [column["name"] for column in result["meta"]]
+    df = pd.DataFrame(result["data"], columns=names)
+    for column in result["meta"]:
+        name, ch_type = column["name"], _base_type(column["type"])
+        # Строки, даты и время в JSON — строки; число здесь (DateTime как UInt32) — ошибка формата
+        if ch_type in TEXT_TYPES and not df[name].map(lambda v: v is None or isinstance(v, str)).all():
+            raise AsyncQueryError(f"Колонка {name} ({column['type']}): ожидались строки")
+        if ch_type.startswith("DateTime"):
+            df[name] = pd.to_datetime(df[name])
+        elif ch_type in ("Date", "Date32"):
+            df[name] = pd.to_datetime(df[name]).dt.date
+        elif ch_type.startswith(("Int", "UInt", "Float", "Decimal")):
+            df[name] = pd.to_numeric(df[name])
+        elif ch_type == "Bool":
+            df[name] = df[name].astype(bool)
+    return df
+
+
+class AsyncClickHouse:
+    """
+    Асинхронный клиент ClickHouse через HTTP-интерфейс (aiohttp).
+
+    Пока запрос выполняется на сервере, event loop обслуживает другие запросы —
+    поток не занят ожиданием сети. Соединения keep-alive переиспользуются
+    (не больше pool_size одновременно), ответ сжимается (gzip). Результат приходит
+    в JSONCompact вместе с типами колонок, и DataFrame собирается по этим типам:
+    в Parquet/Arrow строки и DateTime зависят от настроек и версии сервера
+    (String приходит как bytes, DateTime — как UInt32).
+    """
+
+    def __init__(self, host=CLICKHOUSE_HOST, port=CLICKHOUSE_HTTP_PORT, user=CLICKHOUSE_USER,
+                 password=CLICKHOUSE_PASSWORD, database=DB_NAME, pool_size=DB_POOL_SIZE,
+                 timeout=ASYNC_QUERY_TIMEOUT, settings=None):
+        self.url = f"http://{host}:{port}/"
+        self.headers = {"X-ClickHouse-User": user, "X-ClickHouse-Key": password}
+        self.params = {"database": database, "enable_http_compression": 1,
+                       # Int64/UInt64 числами, а не строками; nan/inf — null
+                       "output_format_json_quote_64bit_integers": 0,
+                       "output_format_json_quote_denormals": 0,
+                       **DB_SETTINGS, **(settings or {})}
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._session = None
+        self._stats = {"queries": 0, "in_flight": 0, "errors": 0}
+
+    def _get_session(self):
+        # Сессия создается внутри работающего event loop (при первом запросе)
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers=self.headers,
+            )
+        return self._session
+
+    async def _post(self, query, fmt):
+        # FORMAT с новой строки: запрос может заканчиваться комментарием "-- ..."
+        body = f"{query}\nFORMAT {fmt}"
+        self._stats["queries"] += 1
+        self._stats["in_flight"] += 1
+        try:
+            async with self._get_session().post(self.url, params=self.params, data=body.encode("utf-8"),
+                                                headers={"Accept-Encoding": "gzip"}) as response:
+                payload = await response.read()
+                if response.status != 200:
+                    raise AsyncQueryError(payload.decode("utf-8", errors="replace").strip())
+                return payload
+        except Exception:
+            self._stats["errors"] += 1
+            raise
+        finally:
+            self._stats["in_flight"] -= 1
+
+    async def query_dataframe(self, query):
+        """DataFrame с теми же типами, что у clickhouse_driver.query_dataframe."""
+        payload = await self._post(query, "JSONCompact")
+        return frame_from_json(json.loads(payload))
+
+    async def execute(self, query):
+        """Строки результата списками (для коротких служебных запросов)."""
+        payload = await self._post(query, "JSONCompact")
+        return json.loads(payload)["data"]
+
+    async def data_version(self):
+        """То же, что query_cache.data_version(), через HTTP."""
+        try:
+            loads, last_loaded = (await self.execute(DATA_VERSION_QUERY))[0]
+            return f"ledger:{loads}:{last_loaded}"
+        except AsyncQueryError:
+            last_time_id, rows = (await self.execute(DATA_VERSION_FALLBACK_QUERY))[0]
+            return f"fact:{last_time_id}:{rows}"
+
+    def stats(self):
+        return {"pool_size": self.pool_size, **self._stats}
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
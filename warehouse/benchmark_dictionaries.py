@@ -0,0 +1,83 @@
+import time
+import argparse
+import statistics
+
+from warehouse.connection import get_db_client
+from warehouse.dictionaries import create_dictionaries, dict_get
+from warehouse.grid import sql_latitude
+
+# Один и тот же многолетний запрос (средняя температура по 10-градусным поясам широты и кварталам)
+# тремя способами получить атрибуты измерений
+VARIANTS = {
+    # Как было в weather_full: hash join с обеими таблицами измерений
+    "join": """
+        SELECT floor(l.latitude / 10) * 10 AS band, t.quarter AS quarter, round(avg(f.temperature_c), 2) AS temp
+        FROM fact_weather f
+        JOIN dim_time t ON f.time_id = t.time_id
+        JOIN dim_location l ON f.location_id = l.location_id
+        WHERE t.year BETWEEN {start} AND {end}
+        GROUP BY band, quarter ORDER BY band, quarter
+    """,
+    # Словари в памяти сервера
+    "dictGet": f"""
+        SELECT floor({dict_get('weather_db.dim_location', 'latitude', 'f.location_id')} / 10) * 10 AS band,
+               {dict_get('weather_db.dim_time', 'quarter', 'f.time_id')} AS quarter,
+               round(avg(f.temperature_c), 2) AS temp
+        FROM fact_weather f
+        WHERE f.year BETWEEN {{start}} AND {{end}}
+        GROUP BY band, quarter ORDER BY band, quarter
+    """,
+    # Без измерений: координаты из индекса сетки, календарь из колонок fact_weather
+    "computed": f"""
+        SELECT floor({sql_latitude('f.location_id')} / 10) * 10 AS band, toQuarter(f.date) AS quarter,
+               round(avg(f.temperature_c), 2) AS temp
+        FROM fact_weather f
+        WHERE f.year BETWEEN {{start}} AND {{end}}
+        GROUP BY band, quarter ORDER BY band, quarter
+    """,
+}
+
+
+def run_variant(client, query, repeat):
+    client.execute(query)  # прогрев (и загрузка словарей при первом dictGet)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = client.execute(query)
+        timings.append(time.perf_counter() - started)
+    return {"seconds": statistics.median(timings), "read_bytes": client.last_query.progress.bytes, "rows": rows}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JOIN с измерениями vs dictGet vs вычисляемые колонки")
+    parser.add_argument("--start-year", type=int, default=2016)
+    parser.add_argument("--end-year", type=int, default=2025)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    client = get_db_client()
+    create_dictionaries(client)
+    for name, status, rows, mb in client.execute(
+        "SELECT name, status, element_count, round(bytes_allocated / 1048576, 1) "
+        "FROM system.dictionaries WHERE database = 'weather_db'"
+    ):
+        print(f"Словарь {name}: {status}, {rows:,} ключей, {mb} МБ")
+
+    results = {}
+    for variant, template in VARIANTS.items():
+        print(f"Запуск {variant} ({args.start_year}-{args.end_year})...")
+        results[variant] = run_variant(client, template.format(start=args.start_year, end=args.end_year), args.repeat)
+
+    print(f"\n{'Вариант':<10} {'Время, мс':>10} {'Прочитано, МБ':>14} {'Строк':>6}")
+    for variant, r in results.items():
+        print(f"{variant:<10} {r['seconds'] * 1000:>10.1f} {r['read_bytes'] / 1024 ** 2:>14.1f} {len(r['rows']):>6}")
+
+    reference = results["join"]["rows"]
+    for variant, r in results.items():
+        same = r["rows"] == reference
+        print(f"{variant}: результат {'совпадает с join ✅' if same else 'отличается от join ❌'}")
+    print(f"\ndictGet быстрее join в {results['join']['seconds'] / max(results['dictGet']['seconds'], 1e-9):.1f} раза")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import time
+import argparse
+import statistics
+
+from warehouse.connection import get_db_client
+from warehouse.fact_schema import FACT_SCHEMAS, create_fact_table
+from warehouse.grid import sql_latitude, sql_longitude
+
+# Запросы app.py, которые читают почасовые факты ({table} — копия fact_weather в нужной схеме)
+APP_QUERIES = {
+    "kpi": """
+        SELECT
+            round(avgIf(temperature_c, year = {last_year}), 2),
+            round(avgIf(temperature_c, year < {last_year}), 2),
+            uniqExactIf(date, year = {last_year} AND (temperature_c > 35 OR temperature_c < -20)),
+            round(uniqExactIf(date, year < {last_year} AND (temperature_c > 35 OR temperature_c < -20))
+                  / uniqExact(year), 1)
+        FROM {table}
+    """,
+    "histogram": """
+        SELECT floor(daily_avg) AS temp_bin, count()
+        FROM (SELECT date, avg(temperature_c) AS daily_avg FROM {table} GROUP BY date)
+        GROUP BY temp_bin ORDER BY temp_bin
+    """,
+    "correlations": """
+        SELECT
+            round(corr(temperature_c, solar_radiation), 3), round(corr(temperature_c, dewpoint_c), 3),
+            round(corr(temperature_c, pressure_hpa), 3), round(corr(temperature_c, cloud_cover), 3),
+            round(corr(temperature_c, wind_speed_ms), 3), round(corr(temperature_c, precipitation_mm), 3)
+        FROM {table}
+    """,
+    "predictive": f"""
+        SELECT
+            f.pressure_hpa, f.dewpoint_c, f.precipitation_mm, f.wind_speed_ms, f.cloud_cover, f.solar_radiation,
+            {sql_latitude('f.location_id')} AS latitude, {sql_longitude('f.location_id')} AS longitude,
+            f.month, f.hour, f.day_of_week, f.timestamp
+        FROM {{table}} f
+        ORDER BY f.time_id DESC
+        LIMIT 168
+    """,
+}
+
+
+def bench_table(schema):
+    return f"weather_db.fact_weather_bench_{schema}"
+
+
+def prepare(client, schema, months):
+    """Копия последних months месяцев fact_weather в схеме schema, слитая в один кусок на партицию."""
+    table = bench_table(schema)
+    columns = ", ".join(name for name, _, _ in FACT_SCHEMAS[schema])
+    client.execute(f"DROP TABLE IF EXISTS {table}")
+    create_fact_table(client, table, schema)
+    client.execute(f'''
+        INSERT INTO {table} ({columns})
+        SELECT {columns} FROM weather_db.fact_weather
+        WHERE year * 100 + month IN (
+            SELECT DISTINCT year * 100 + month AS p FROM weather_db.fact_weather ORDER BY p DESC LIMIT {months}
+        )
+    ''')
+    client.execute(f"OPTIMIZE TABLE {table} FINAL")
+
+
+def disk_size(client, schema):
+    name = bench_table(schema).split(".")[1]
+    rows, on_disk, compressed, uncompressed = client.execute(
+        "SELECT sum(rows), sum(bytes_on_disk), sum(data_compressed_bytes), sum(data_uncompressed_bytes) "
+        f"FROM system.parts WHERE database = 'weather_db' AND table = '{name}' AND active"
+    )[0]
+    return {"rows": rows, "on_disk": on_disk, "compressed": compressed, "uncompressed": uncompressed}
+
+
+def run_queries(client, schema, repeat):
+    """Медиана времени и прочитанные байты по каждому запросу (первый прогон — прогрев)."""
+    table = bench_table(schema)
+    last_year = client.execute(f"SELECT max(year) FROM {table}")[0][0]
+    results = {}
+    for name, template in APP_QUERIES.items():
+        query = template.format(table=table, last_year=last_year)
+        client.execute(query)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            client.execute(query)
+            timings.append(time.perf_counter() - started)
+        results[name] = {"seconds": statistics.median(timings),
+                         "read_bytes": client.last_query.progress.bytes}
+    return results
+
+
+def _mb(value):
+    return value / 1024 ** 2
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сравнение схем fact_weather: размер, чтение, задержка")
+    parser.add_argument("--months", type=int, default=12, help="Сколько последних месяцев скопировать")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help="Не удалять таблицы fact_weather_bench_*")
+    args = parser.parse_args(argv)
+
+    client = get_db_client()
+    sizes, timings = {}, {}
+    try:
+        for schema in FACT_SCHEMAS:
+            print(f"Подготовка {bench_table(schema)} ({args.months} мес.)...")
+            prepare(client, schema, args.months)
+            sizes[schema] = disk_size(client, schema)
+            timings[schema] = run_queries(client, schema, args.repeat)
+    finally:
+        if not args.keep:
+            for schema in FACT_SCHEMAS:
+                client.execute(f"DROP TABLE IF EXISTS {bench_table(schema)}")
+
+    print(f"\n{'Схема':<8} {'Строк':>12} {'На диске, МБ':>13} {'Сжато, МБ':>10} {'Без сжатия, МБ':>15}")
+    for schema, size in sizes.items():
+        print(f"{schema:<8} {size['rows']:>12,} {_mb(size['on_disk']):>13.1f} "
+              f"{_mb(size['compressed']):>10.1f} {_mb(size['uncompressed']):>15.1f}")
+
+    print(f"\n{'Запрос':<13} " + " ".join(f"{s + ', мс':>12} {s + ', МБ':>12}" for s in FACT_SCHEMAS))
+    for name in APP_QUERIES:
+        cells = [f"{timings[s][name]['seconds'] * 1000:>12.1f} {_mb(timings[s][name]['read_bytes']):>12.1f}"
+                 for s in FACT_SCHEMAS]
+        print(f"{name:<13} " + " ".join(cells))
+
+    if "wide" in sizes and "compact" in sizes:
+        ratio = sizes["wide"]["on_disk"] / max(sizes["compact"]["on_disk"], 1)
+        print(f"\ncompact меньше wide на диске в {ratio:.2f} раза")
+
+
+if __name__ == "__main__":
+    main()
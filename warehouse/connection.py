@@ -1,5 +1,12 @@
+import time
+import threading
+from contextlib import contextmanager
+
 from clickhouse_driver import Client
-from config import db_config, DB_NAME
+from config import (
+    db_config, DB_NAME, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_HEALTH_CHECK_IDLE,
+    DB_COMPRESSION, DB_SETTINGS
+)
 
 def get_server_client():
     """
@@ -13,4 +20,133 @@ def get_db_client():
     Возвращает клиент, подключенный к нашей базе данных (weather_db).
     Используется для вставки данных и запросов.
     """
-    return Client(database=DB_NAME, **db_config)
\ No newline at end of file
+    return Client(database=DB_NAME, **db_config)
+
+
+class PoolTimeout(TimeoutError):
+    """Свободное соединение не появилось за timeout секунд."""
+
+
+class ConnectionPool:
+    """
+    Ограниченный пул соединений с weather_db для многопоточного кода (Flask, ML).
+
+    Клиент clickhouse_driver не потокобезопасен, поэтому каждый поток берет
+    свой клиент через connection() и возвращает его после запроса. Соединения
+    переиспользуются (без TCP, handshake и авторизации на каждый запрос);
+    больше size одновременно не открывается, остальные ждут до timeout.
+    """
+
+    def __init__(self, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT, health_check_idle=DB_HEALTH_CHECK_IDLE,
+                 compression=DB_COMPRESSION, settings=None, **params):
+        self.size = size
+        self.timeout = timeout
+        self.health_check_idle = health_check_idle
+        self.params = {"database": DB_NAME, **db_config, **params,
+                       "compression": compression, "settings": dict(DB_SETTINGS, **(settings or {}))}
+        self._idle = []          # [(client, время возврата в пул)], последний — самый свежий
+        self._created = 0
+        self._cond = threading.Condition()
+        self._stats = {"checkouts": 0, "waits": 0, "wait_seconds": 0.0, "timeouts": 0,
+                       "errors": 0, "health_failures": 0}
+
+    def _new_client(self):
+        return Client(**self.params)
+
+    def _healthy(self, client):
+        try:
+            client.execute("SELECT 1")
+            return True
+        except Exception:
+            client.disconnect()
+            return False
+
+    def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        with self._cond:
+            waited = False
+            while not self._idle and self._created >= self.size:
+                remaining = timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(f"Нет свободного соединения с ClickHouse за {timeout} с "
+                                      f"(занято {self._created} из {self.size})")
+                waited = True
+                self._cond.wait(remaining)
+            if waited:
+                self._stats["waits"] += 1
+                self._stats["wait_seconds"] += time.monotonic() - started
+            self._stats["checkouts"] += 1
+            if self._idle:
+                client, returned_at = self._idle.pop()
+            else:
+                client, returned_at = None, None
+                self._created += 1
+
+        if client is None:
+            try:
+                return self._new_client()
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._stats["errors"] += 1
+                    self._cond.notify()
+                raise
+        # Долго лежавшее соединение мог закрыть сервер — проверяем до выдачи (при сбое клиент переподключится)
+        if time.monotonic() - returned_at > self.health_check_idle and not self._healthy(client):
+            with self._cond:
+                self._stats["health_failures"] += 1
+        return client
+
+    def release(self, client, broken=False):
+        if broken:
+            # После ошибки состояние соединения неизвестно: следующий запрос откроет новое
+            client.disconnect()
+        with self._cond:
+            if broken:
+                self._stats["errors"] += 1
+            self._idle.append((client, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        client = self.acquire(timeout)
+        try:
+            yield client
+        except Exception:
+            self.release(client, broken=True)
+            raise
+        else:
+            self.release(client)
+
+    def stats(self):
+        with self._cond:
+            return {"size": self.size, "created": self._created,
+                    "in_use": self._created - len(self._idle), "idle": len(self._idle),
+                    **self._stats}
+
+    def close(self):
+        with self._cond:
+            for client, _ in self._idle:
+                client.disconnect()
+            self._created -= len(self._idle)
+            self._idle = []
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Общий пул процесса (создается при первом обращении)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+def pooled_client(timeout=None):
+    """with pooled_client() as client: ... — клиент из общего пула на время блока."""
+    return get_pool().connection(timeout)
@@ -1,10 +1,15 @@
 from clickhouse_driver.errors import Error
 # Импортируем наши новые методы и конфиг
 from warehouse.connection import get_server_client, get_db_client
-from config import DB_NAME
+from warehouse.grid import sql_latitude, sql_longitude
+from warehouse.partition_loader import create_ledger
+from warehouse.fact_schema import FACT_SCHEMAS, create_fact_table
+from warehouse.rollups import create_rollups, drop_rollups
+from warehouse.dictionaries import create_dictionaries, drop_dictionaries, dict_get
+from config import DB_NAME, FACT_SCHEMA
 
-def create_db_structure():
-    print(f"--- НАСТРОЙКА СХЕМЫ ЗВЕЗДА В CLICKHOUSE ({DB_NAME}) ---")
+def create_db_structure(schema=FACT_SCHEMA):
+    print(f"--- НАСТРОЙКА СХЕМЫ ЗВЕЗДА В CLICKHOUSE ({DB_NAME}, fact_weather: {schema}) ---")
     
     try:
         # 1. Создание базы данных (используем server_client)
@@ -17,6 +22,9 @@ def create_db_structure():
 
         print("Удаление старых таблиц (DROP)...")
         client.execute('DROP TABLE IF EXISTS weather_full') # Сначала удаляем View
+        drop_rollups(client)
+        drop_dictionaries(client)
+        client.execute('DROP TABLE IF EXISTS fact_weather_staging')
         client.execute('DROP TABLE IF EXISTS fact_weather')
         client.execute('DROP TABLE IF EXISTS dim_time')
         client.execute('DROP TABLE IF EXISTS dim_location')
@@ -40,10 +48,10 @@ def create_db_structure():
 
         # --- B. DIM_LOCATION ---
         print("Создание таблицы dim_location...")
-        # Заменили UInt64 -> Int64, так как хэш может быть отрицательным
+        # location_id — индекс точки сетки 0.25° (lat_idx * 1440 + lon_idx), см. warehouse/grid.py
         client.execute('''
             CREATE TABLE dim_location (
-                location_id Int64,      
+                location_id UInt32,
                 latitude Float64,
                 longitude Float64
             ) ENGINE = ReplacingMergeTree()
@@ -52,37 +60,44 @@ def create_db_structure():
 
         # --- C. FACT_WEATHER ---
         print("Создание таблицы fact_weather...")
-        client.execute('''
-            CREATE TABLE fact_weather (
-                time_id Int64,
-                location_id Int64,
-                temperature_c Float64,
-                dewpoint_c Float64,
-                max_temp_c Float64,
-                min_temp_c Float64,
-                pressure_hpa Float64,
-                precipitation_mm Float32,
-                wind_speed_ms Float64,
-                cloud_cover Float32,
-                solar_radiation Float32
-            ) ENGINE = MergeTree()
-            ORDER BY (time_id, location_id)
-        ''')
+        # year/month/day/hour/date/timestamp/day_of_week считаются из time_id при вставке (MATERIALIZED):
+        # дашборд фильтрует и группирует по ним без JOIN с dim_time
+        # Типы и кодеки мер — по схеме schema ('wide' / 'compact'), см. warehouse/fact_schema.py.
+        # Плюс проекция fact_by_location (ORDER BY location_id, time_id) для истории точки/области
+        create_fact_table(client, 'fact_weather', schema)
+        # Партиция = месяц (YYYYMM): загрузчик пишет в staging и заменяет месяц целиком
+        client.execute('CREATE TABLE fact_weather_staging AS fact_weather')
+
+        # Журнал загрузок (что, когда, сколько строк, контрольная сумма партиции)
+        print("Создание таблицы load_ledger...")
+        create_ledger(client)
+
+        # --- C2. ROLLUPS ---
+        # Агрегаты по дням/месяцам/годам (AggregatingMergeTree), их обновляют materialized views
+        print("Создание rollup-таблиц weather_daily / weather_monthly / weather_yearly...")
+        create_rollups(client)
+
+        # --- C3. DICTIONARIES ---
+        # dim_location / dim_time в памяти сервера: атрибуты измерений через dictGet, без JOIN
+        print("Создание словарей dim_location_dict / dim_time_dict...")
+        create_dictionaries(client)
         
         # --- D. VIEW ---
         print("Создание представления weather_full...")
-        client.execute('''
+        # Календарь и координаты берутся из самой fact_weather — JOIN не нужен;
+        # то, чего в fact_weather нет (quarter), — из словаря dim_time_dict
+        client.execute(f'''
             CREATE VIEW weather_full AS
             SELECT 
                 f.*,
-                t.timestamp, t.year, t.month, t.day, t.hour, t.day_of_week,
-                l.latitude, l.longitude
+                f.timestamp, f.year, f.month, f.day, f.hour, f.day_of_week,
+                {sql_latitude('f.location_id')} AS latitude,
+                {sql_longitude('f.location_id')} AS longitude,
+                {dict_get('weather_db.dim_time', 'quarter', 'f.time_id')} AS quarter
             FROM fact_weather f
-            JOIN dim_time t ON f.time_id = t.time_id
-            JOIN dim_location l ON f.location_id = l.location_id
         ''')
 
-        print("\n✅ Успешно! Таблицы пересозданы с типом Int64.")
+        print("\n✅ Успешно! Таблицы пересозданы.")
 
     except Error as e:
         print(f"❌ Ошибка ClickHouse: {e}")
@@ -90,4 +105,8 @@ def create_db_structure():
         print(f"❌ Общая ошибка: {e}")
 
 if __name__ == "__main__":
-    create_db_structure()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Пересоздание таблиц weather_db")
+    parser.add_argument("--schema", choices=list(FACT_SCHEMAS), default=FACT_SCHEMA,
+                        help="Типы и кодеки колонок fact_weather")
+    create_db_structure(parser.parse_args().schema)
\ No newline at end of file
@@ -0,0 +1,85 @@
+import argparse
+
+from config import CLICKHOUSE_USER, CLICKHOUSE_PASSWORD, DB_NAME
+from warehouse.connection import get_db_client
+from warehouse.grid import LAT_CELLS, LON_CELLS
+
+# Словари ClickHouse поверх таблиц измерений: dictGet вместо JOIN, данные держатся в памяти сервера.
+# Таблица измерения -> (словарь, ключ, колонки-атрибуты, LAYOUT); ключ словаря всегда UInt64
+DICTIONARIES = {
+    "weather_db.dim_location": (
+        "weather_db.dim_location_dict", "location_id",
+        [("latitude", "Float64"), ("longitude", "Float64")],
+        # location_id — плотный индекс сетки: массив по ключу, без хэш-таблицы
+        f"FLAT(INITIAL_ARRAY_SIZE {LAT_CELLS * LON_CELLS} MAX_ARRAY_SIZE {LAT_CELLS * LON_CELLS})",
+    ),
+    "weather_db.dim_time": (
+        "weather_db.dim_time_dict", "time_id",
+        [("timestamp", "DateTime('UTC')"), ("year", "UInt16"), ("month", "UInt8"), ("day", "UInt8"),
+         ("hour", "UInt8"), ("day_of_week", "UInt8"), ("quarter", "UInt8")],
+        # time_id = YYYYMMDDHH — разреженный ключ
+        "HASHED()",
+    ),
+}
+
+def create_dictionaries(client):
+    """
+    Создает словари. Кроме LIFETIME (перечитывание раз в 5-10 минут) загрузчик
+    перезагружает словарь сразу после вставки новых ключей (reload_for_table).
+    """
+    for table, (dictionary, key, attributes, layout) in DICTIONARIES.items():
+        columns = ", ".join([f"{key} UInt64"] + [f"{name} {type_}" for name, type_ in attributes])
+        client.execute(f'''
+            CREATE DICTIONARY IF NOT EXISTS {dictionary} ({columns})
+            PRIMARY KEY {key}
+            SOURCE(CLICKHOUSE(DB '{DB_NAME}' TABLE '{table.split(".")[1]}'
+                              USER '{CLICKHOUSE_USER}' PASSWORD '{CLICKHOUSE_PASSWORD}'))
+            LAYOUT({layout})
+            LIFETIME(MIN 300 MAX 600)
+        ''')
+
+
+def drop_dictionaries(client):
+    for dictionary, _, _, _ in DICTIONARIES.values():
+        client.execute(f"DROP DICTIONARY IF EXISTS {dictionary}")
+
+
+def reload_for_table(client, table):
+    """Перезагружает словарь измерения table, если он есть (после вставки новых ключей)."""
+    if table not in DICTIONARIES:
+        return
+    dictionary = DICTIONARIES[table][0]
+    exists = client.execute(
+        "SELECT count() FROM system.dictionaries WHERE database = 'weather_db' "
+        f"AND name = '{dictionary.split('.')[1]}'"
+    )[0][0]
+    if exists:
+        client.execute(f"SYSTEM RELOAD DICTIONARY {dictionary}")
+
+
+def dict_get(table, attribute, key_expr):
+    """SQL-выражение dictGet для атрибута измерения table по ключу key_expr."""
+    return f"dictGet('{DICTIONARIES[table][0]}', '{attribute}', toUInt64({key_expr}))"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Словари ClickHouse для измерений")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("create", help="Создать словари dim_location_dict / dim_time_dict")
+    sub.add_parser("reload", help="Перечитать словари из таблиц измерений")
+    args = parser.parse_args(argv)
+
+    client = get_db_client()
+    create_dictionaries(client)
+    if args.command == "reload":
+        for table in DICTIONARIES:
+            reload_for_table(client, table)
+    for name, status, rows, mb in client.execute(
+        "SELECT name, status, element_count, round(bytes_allocated / 1048576, 1) "
+        "FROM system.dictionaries WHERE database = 'weather_db'"
+    ):
+        print(f"{name:<20} {status:<10} {rows:>12,} ключей {mb:>8} МБ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import os
+import json
+import numpy as np
+
+from config import DIM_CACHE_PATH
+from warehouse.loader import insert_columns
+from warehouse.dictionaries import reload_for_table
+
+# Версия формата ключей: 2 — location_id как индекс сетки (раньше xxhash64)
+DIM_CACHE_VERSION = 2
+
+# Таблицы измерений и их ключи
+DIM_KEYS = {
+    "weather_db.dim_location": "location_id",
+    "weather_db.dim_time": "time_id",
+}
+
+
+class DimKeyCache:
+    """
+    Ключи, которые уже лежат в таблицах измерений ClickHouse.
+
+    Хранится локально (DIM_CACHE_PATH), при первом запуске заполняется из ClickHouse.
+    Загрузчик вставляет только строки с новыми ключами, поэтому dim_location/dim_time
+    не копят дубли до слияния ReplacingMergeTree. Промахи (новые ключи) считаются по таблицам.
+    """
+
+    def __init__(self, path=DIM_CACHE_PATH):
+        self.path = path
+        self.keys = {table: set() for table in DIM_KEYS}
+        self.hits = {table: 0 for table in DIM_KEYS}
+        self.misses = {table: 0 for table in DIM_KEYS}
+
+    def load(self, client):
+        """Читает локальный файл; если его нет или таблицы в ClickHouse пересоздавали — берет ключи из ClickHouse."""
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == DIM_CACHE_VERSION:
+                self.keys = {table: set(data.get(table, [])) for table in DIM_KEYS}
+
+        for table, key in DIM_KEYS.items():
+            # Число ключей не совпало с сервером (таблицу пересоздали или грузили в обход кэша) — перечитываем
+            server_count = client.execute(f"SELECT uniqExact({key}) FROM {table}")[0][0]
+            if server_count != len(self.keys[table]):
+                print(f"Кэш ключей {table}: {len(self.keys[table])} -> {server_count}, загрузка из ClickHouse...")
+                self.keys[table] = {row[0] for row in client.execute(f"SELECT DISTINCT {key} FROM {table}")}
+        self.save()
+        return self
+
+    def save(self):
+        # Атомарная запись: при падении посреди записи остается прежний файл
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            data = {table: sorted(keys) for table, keys in self.keys.items()}
+            data["version"] = DIM_CACHE_VERSION
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def new_mask(self, table, values):
+        """Маска строк с ключами, которых еще нет в таблице (и счетчики попаданий/промахов)."""
+        values = np.asarray(values)
+        known = self.keys[table]
+        mask = np.fromiter((int(v) not in known for v in values), dtype=bool, count=len(values))
+        missed = int(mask.sum())
+        self.misses[table] += missed
+        self.hits[table] += len(values) - missed
+        return mask
+
+    def add(self, table, values):
+        self.keys[table].update(int(v) for v in values)
+
+    def report(self):
+        for table in DIM_KEYS:
+            print(f"   {table}: новых ключей {self.misses[table]}, уже известных {self.hits[table]}")
+
+
+def load_dimension(client, cache, table, columns, verbose=True):
+    """
+    Вставляет в таблицу измерения только строки с новыми ключами.
+    columns — pandas DataFrame или {колонка: numpy массив}. Возвращает число вставленных строк.
+    """
+    if hasattr(columns, "columns"):
+        columns = {name: columns[name] for name in columns.columns}
+    key = DIM_KEYS[table]
+    mask = cache.new_mask(table, columns[key])
+    if not mask.any():
+        if verbose:
+            print(f"   -> {table}: новых ключей нет")
+        return 0
+
+    new_columns = {name: np.asarray(values)[mask] for name, values in columns.items()}
+    insert_columns(client, table, new_columns, verbose=verbose)
+    # Ключи запоминаются только после успешной вставки
+    cache.add(table, new_columns[key])
+    cache.save()
+    # Словарь измерения (dictGet) видит новые ключи сразу, не дожидаясь LIFETIME
+    reload_for_table(client, table)
+    return int(mask.sum())
@@ -0,0 +1,150 @@
+import argparse
+
+from config import FACT_SCHEMA
+from warehouse.connection import get_db_client
+from warehouse import rollups
+from warehouse.partition_loader import (
+    FACT_TABLE, PARTITION_EXPR, time_columns_ddl
+)
+
+# Колонки fact_weather (без календарных MATERIALIZED): (имя, тип, кодек или None)
+FACT_SCHEMAS = {
+    # Исходная схема: меры во Float64, сжатие по умолчанию (LZ4)
+    "wide": [
+        ("time_id", "Int64", None),
+        ("location_id", "UInt32", None),
+        ("temperature_c", "Float64", None),
+        ("dewpoint_c", "Float64", None),
+        ("max_temp_c", "Float64", None),
+        ("min_temp_c", "Float64", None),
+        ("pressure_hpa", "Float64", None),
+        ("precipitation_mm", "Float32", None),
+        ("wind_speed_ms", "Float64", None),
+        ("cloud_cover", "Float32", None),
+        ("solar_radiation", "Float32", None),
+    ],
+    # ERA5 отдает float32, Spark округляет до 2-4 знаков — Float64 точности не добавляет.
+    # Строки отсортированы по (time_id, location_id): time_id идет ступеньками (DoubleDelta),
+    # location_id растет с шагом 1 внутри часа (Delta), соседние точки сетки дают близкие
+    # значения мер — Gorilla (XOR с предыдущим) + ZSTD.
+    "compact": [
+        ("time_id", "Int64", "DoubleDelta, ZSTD(1)"),
+        ("location_id", "UInt32", "Delta, ZSTD(1)"),
+        ("temperature_c", "Float32", "Gorilla, ZSTD(1)"),
+        ("dewpoint_c", "Float32", "Gorilla, ZSTD(1)"),
+        ("max_temp_c", "Float32", "Gorilla, ZSTD(1)"),
+        ("min_temp_c", "Float32", "Gorilla, ZSTD(1)"),
+        ("pressure_hpa", "Float32", "Gorilla, ZSTD(1)"),
+        ("precipitation_mm", "Float32", "Gorilla, ZSTD(1)"),
+        ("wind_speed_ms", "Float32", "Gorilla, ZSTD(1)"),
+        ("cloud_cover", "Float32", "Gorilla, ZSTD(1)"),
+        ("solar_radiation", "Float32", "Gorilla, ZSTD(1)"),
+    ],
+}
+
+
+# Вторая копия данных, отсортированная по точке: история одной точки или прямоугольника
+# читает несколько гранул вместо всей таблицы (основной ключ начинается с time_id).
+# ClickHouse выбирает проекцию сам, если запрос фильтрует по location_id.
+LOCATION_PROJECTION = "fact_by_location"
+LOCATION_PROJECTION_DDL = f"PROJECTION {LOCATION_PROJECTION} (SELECT * ORDER BY (location_id, time_id))"
+
+
+def fact_columns_ddl(schema=FACT_SCHEMA):
+    """Колонки fact_weather для CREATE TABLE (меры + календарные MATERIALIZED)."""
+    columns = [f"{name} {type_}" + (f" CODEC({codec})" if codec else "")
+               for name, type_, codec in FACT_SCHEMAS[schema]]
+    return columns + time_columns_ddl()
+
+
+def create_fact_table(client, table, schema=FACT_SCHEMA):
+    client.execute(f'''
+        CREATE TABLE {table} (
+            {", ".join(fact_columns_ddl(schema))},
+            {LOCATION_PROJECTION_DDL}
+        ) ENGINE = MergeTree()
+        PARTITION BY {PARTITION_EXPR}
+        ORDER BY (time_id, location_id)
+    ''')
+
+
+def current_schema(client, table="fact_weather"):
+    """Какой из FACT_SCHEMAS соответствует таблице (по типам мер), None — ни один."""
+    rows = client.execute(
+        "SELECT name, type FROM system.columns WHERE database = 'weather_db' "
+        f"AND table = '{table}' AND default_kind != 'MATERIALIZED'"
+    )
+    types = dict(rows)
+    for schema, columns in FACT_SCHEMAS.items():
+        if all(types.get(name) == type_ for name, type_, _ in columns):
+            return schema
+    return None
+
+
+def add_location_projection(client):
+    """Добавляет проекцию по location_id в существующую fact_weather и строит ее для старых кусков."""
+    projections = client.execute(
+        "SELECT count() FROM system.projections WHERE database = 'weather_db' "
+        f"AND table = 'fact_weather' AND name = '{LOCATION_PROJECTION}'"
+    )[0][0]
+    if projections:
+        print(f"Проекция {LOCATION_PROJECTION} уже есть.")
+        return
+    client.execute(f"ALTER TABLE {FACT_TABLE} ADD {LOCATION_PROJECTION_DDL}")
+    print(f"Построение {LOCATION_PROJECTION} для существующих данных...")
+    client.execute(f"ALTER TABLE {FACT_TABLE} MATERIALIZE PROJECTION {LOCATION_PROJECTION}",
+                   settings={'mutations_sync': 1})
+    # staging должен совпадать по структуре с fact_weather (REPLACE PARTITION); MV rollups — вместе с ним
+    rollups.recreate_fact_staging(client)
+    print(f"✅ Проекция {LOCATION_PROJECTION} построена.")
+
+
+def migrate(client, schema=FACT_SCHEMA):
+    """
+    Переносит fact_weather на схему schema: данные копируются на сервере
+    в fact_weather_new, после сверки числа строк таблицы меняются через EXCHANGE TABLES.
+    """
+    current = current_schema(client)
+    if current == schema:
+        print(f"fact_weather уже в схеме '{schema}'.")
+        return
+
+    columns = ", ".join(name for name, _, _ in FACT_SCHEMAS[schema])
+    print(f"Создание fact_weather_new (схема '{schema}')...")
+    client.execute("DROP TABLE IF EXISTS weather_db.fact_weather_new")
+    create_fact_table(client, "weather_db.fact_weather_new", schema)
+    print("Копирование данных...")
+    client.execute(f"INSERT INTO weather_db.fact_weather_new ({columns}) SELECT {columns} FROM {FACT_TABLE}")
+
+    old_rows = client.execute(f"SELECT count() FROM {FACT_TABLE}")[0][0]
+    new_rows = client.execute("SELECT count() FROM weather_db.fact_weather_new")[0][0]
+    if old_rows != new_rows:
+        raise RuntimeError(f"fact_weather: {old_rows} строк, в новой схеме {new_rows} — миграция отменена")
+
+    client.execute(f"EXCHANGE TABLES weather_db.fact_weather_new AND {FACT_TABLE}")
+    client.execute("DROP TABLE weather_db.fact_weather_new")
+    # staging должен совпадать по структуре с fact_weather (REPLACE PARTITION); MV rollups — вместе с ним
+    rollups.recreate_fact_staging(client)
+    print(f"✅ fact_weather: '{current}' -> '{schema}', {new_rows} строк.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Схема колонок fact_weather")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("show", help="Текущая схема fact_weather")
+    migrate_parser = sub.add_parser("migrate", help="Перенести fact_weather на другую схему")
+    migrate_parser.add_argument("--schema", choices=list(FACT_SCHEMAS), default=FACT_SCHEMA)
+    sub.add_parser("projection", help="Добавить проекцию по location_id в существующую fact_weather")
+    args = parser.parse_args(argv)
+
+    client = get_db_client()
+    if args.command == "show":
+        print(f"fact_weather: {current_schema(client) or 'нестандартная схема'}")
+    elif args.command == "migrate":
+        migrate(client, args.schema)
+    elif args.command == "projection":
+        add_location_projection(client)
+
+
+if __name__ == "__main__":
+    main()
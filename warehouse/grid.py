@@ -0,0 +1,163 @@
+import os
+import math
+import numpy as np
+
+from config import GRID_STEP, DIM_CACHE_PATH
+from warehouse.connection import get_db_client
+from warehouse import rollups
+
+# Регулярная сетка ERA5: строки с севера на юг (90 .. -90), колонки по долготе [0, 360)
+LAT_CELLS = int(round(180 / GRID_STEP)) + 1   # 721
+LON_CELLS = int(round(360 / GRID_STEP))       # 1440
+
+
+def location_id(latitude, longitude):
+    """
+    Плотный индекс точки сетки: lat_idx * LON_CELLS + lon_idx (влезает в UInt32).
+    Соседние точки одной широты — соседние ключи, поэтому сортировка по location_id
+    идет построчно по карте.
+    """
+    lat_idx = np.rint((90 - np.asarray(latitude, dtype=np.float64)) / GRID_STEP).astype(np.int64)
+    lon_idx = np.rint(np.mod(np.asarray(longitude, dtype=np.float64), 360) / GRID_STEP).astype(np.int64) % LON_CELLS
+    return (lat_idx * LON_CELLS + lon_idx).astype(np.uint32)
+
+
+def coordinates(location_ids):
+    """Обратное преобразование: (latitude, longitude) по индексу, долгота в [-180, 180)."""
+    ids = np.asarray(location_ids, dtype=np.int64)
+    latitude = 90 - (ids // LON_CELLS) * GRID_STEP
+    longitude = (ids % LON_CELLS) * GRID_STEP
+    return latitude, np.where(longitude >= 180, longitude - 360, longitude)
+
+
+# --- SQL (ClickHouse) ---
+
+def sql_location_id(lat="latitude", lon="longitude"):
+    """Тот же индекс, что location_id(), в SQL (для миграции)."""
+    lat_idx = f"toUInt32(round((90 - {lat}) / {GRID_STEP}))"
+    lon_idx = f"(toUInt32(round(({lon} - floor({lon} / 360) * 360) / {GRID_STEP})) % {LON_CELLS})"
+    return f"toUInt32({lat_idx} * {LON_CELLS} + {lon_idx})"
+
+
+def sql_latitude(loc="location_id"):
+    """Широта из location_id без JOIN с dim_location."""
+    return f"(90 - intDiv({loc}, {LON_CELLS}) * {GRID_STEP})"
+
+
+def sql_longitude(loc="location_id"):
+    """Долгота из location_id без JOIN с dim_location (в [-180, 180))."""
+    lon = f"(({loc} % {LON_CELLS}) * {GRID_STEP})"
+    return f"if({lon} >= 180, {lon} - 360, {lon})"
+
+
+def check_coordinates(latitudes=(), longitudes=()):
+    """
+    ValueError, если координата не конечное число или вне [-90, 90] (широта) / [-180, 360) (долгота).
+    Иначе nan/inf ломают округление, а выход за диапазон молча дает чужой location_id.
+    """
+    for value in latitudes:
+        if not (math.isfinite(value) and -90 <= value <= 90):
+            raise ValueError(f"Недопустимая широта: {value} (нужно от -90 до 90)")
+    for value in longitudes:
+        if not (math.isfinite(value) and -180 <= value < 360):
+            raise ValueError(f"Недопустимая долгота: {value} (нужно от -180 до 360, не включая 360)")
+
+
+def sql_point_filter(latitude, longitude, loc="location_id"):
+    """Условие на ближайшую к (latitude, longitude) точку сетки."""
+    check_coordinates([latitude], [longitude])
+    return f"{loc} = {int(location_id(latitude, longitude))}"
+
+
+def sql_bbox_filter(lat_min, lat_max, lon_min, lon_max, loc="location_id"):
+    """
+    Условие на точки сетки внутри прямоугольника (градусы, долгота в [-180, 180] или [0, 360)).
+
+    Широта дает непрерывный диапазон location_id (строки сетки идут подряд) —
+    по нему работает первичный индекс при сортировке по location_id; долгота
+    проверяется остатком от деления. Прямоугольник через 180-й меридиан
+    (lon_min > lon_max) тоже поддерживается.
+    """
+    check_coordinates([lat_min, lat_max], [lon_min, lon_max])
+    row_first = max(math.ceil((90 - lat_max) / GRID_STEP - 1e-9), 0)
+    row_last = min(math.floor((90 - lat_min) / GRID_STEP + 1e-9), LAT_CELLS - 1)
+    if row_first > row_last:
+        return "0"
+    condition = f"{loc} BETWEEN {row_first * LON_CELLS} AND {(row_last + 1) * LON_CELLS - 1}"
+
+    span = lon_max - lon_min if lon_max >= lon_min else lon_max - lon_min + 360
+    if span >= 360:
+        return condition
+    col_first = math.ceil((lon_min % 360) / GRID_STEP - 1e-9) % LON_CELLS
+    col_last = math.floor((lon_max % 360) / GRID_STEP + 1e-9) % LON_CELLS
+    col = f"({loc} % {LON_CELLS})"
+    if col_first <= col_last:
+        return f"{condition} AND {col} BETWEEN {col_first} AND {col_last}"
+    return f"{condition} AND ({col} >= {col_first} OR {col} <= {col_last})"
+
+
+def migrate(client):
+    """
+    Переводит существующие dim_location и fact_weather с xxhash64-ключей на индекс сетки.
+    Новые таблицы строятся рядом (*_new) и подменяются через EXCHANGE TABLES.
+    """
+    rows = client.execute(
+        "SELECT type FROM system.columns WHERE database = 'weather_db' "
+        "AND table = 'fact_weather' AND name = 'location_id'"
+    )
+    if rows and rows[0][0] == "UInt32":
+        print("location_id уже индекс сетки (UInt32).")
+        return
+
+    print("dim_location: пересчет ключей...")
+    client.execute("DROP TABLE IF EXISTS dim_location_new")
+    client.execute("CREATE TABLE dim_location_new AS dim_location")
+    client.execute("ALTER TABLE dim_location_new MODIFY COLUMN location_id UInt32")
+    client.execute(f'''
+        INSERT INTO dim_location_new
+        SELECT {sql_location_id()} AS location_id, latitude, longitude
+        FROM (SELECT DISTINCT latitude, longitude FROM dim_location)
+    ''')
+
+    print("fact_weather: пересчет ключей (JOIN со старым dim_location)...")
+    client.execute("DROP TABLE IF EXISTS fact_weather_new")
+    client.execute("CREATE TABLE fact_weather_new AS fact_weather")
+    client.execute("ALTER TABLE fact_weather_new MODIFY COLUMN location_id UInt32")
+    columns = [name for name, in client.execute(
+        "SELECT name FROM system.columns WHERE database = 'weather_db' AND table = 'fact_weather' "
+        "AND default_kind != 'MATERIALIZED' ORDER BY position"
+    )]
+    select = ", ".join("l.new_id AS location_id" if c == "location_id" else f"f.{c}" for c in columns)
+    client.execute(f'''
+        INSERT INTO fact_weather_new ({", ".join(columns)})
+        SELECT {select}
+        FROM fact_weather f
+        JOIN (
+            SELECT DISTINCT location_id, {sql_location_id()} AS new_id FROM dim_location
+        ) l ON f.location_id = l.location_id
+    ''')
+
+    old_rows = client.execute("SELECT count() FROM fact_weather")[0][0]
+    new_rows = client.execute("SELECT count() FROM fact_weather_new")[0][0]
+    if old_rows != new_rows:
+        raise RuntimeError(f"fact_weather: {old_rows} строк, после пересчета {new_rows} — миграция отменена")
+
+    client.execute("EXCHANGE TABLES dim_location_new AND dim_location")
+    client.execute("EXCHANGE TABLES fact_weather_new AND fact_weather")
+    client.execute("DROP TABLE dim_location_new")
+    client.execute("DROP TABLE fact_weather_new")
+    # staging должен совпадать по структуре с fact_weather (REPLACE PARTITION); MV rollups — вместе с ним
+    rollups.recreate_fact_staging(client)
+
+    # Агрегаты построены по старым ключам
+    if rollups.rollups_exist(client):
+        rollups.backfill(client)
+
+    # Локальный кэш ключей измерений хранит старые хэши
+    if os.path.exists(DIM_CACHE_PATH):
+        os.remove(DIM_CACHE_PATH)
+    print(f"✅ Миграция завершена: {new_rows} строк фактов.")
+
+
+if __name__ == "__main__":
+    migrate(get_db_client())
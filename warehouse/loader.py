@@ -0,0 +1,183 @@
+import time
+import numpy as np
+import pandas as pd
+
+from config import db_config, LOADER_BLOCK_SIZE, LOADER_MODE, LOADER_MAX_WRITERS
+
+
+class LoadResult:
+    """Итог загрузки одной таблицы: строки, блоки, время и скорость."""
+
+    def __init__(self, table, rows=0, blocks=0, seconds=0.0):
+        self.table = table
+        self.rows = rows
+        self.blocks = blocks
+        self.seconds = seconds
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def __add__(self, other):
+        return LoadResult(self.table, self.rows + other.rows, self.blocks + other.blocks,
+                          self.seconds + other.seconds)
+
+    def __repr__(self):
+        return (f"LoadResult({self.table}: {self.rows} строк, {self.blocks} блоков, "
+                f"{self.seconds:.1f} с, {self.rows_per_sec:,.0f} строк/с)")
+
+
+def _to_numpy(values):
+    if isinstance(values, np.ndarray):
+        return values
+    if isinstance(values, (pd.Series, pd.Index)):
+        return values.to_numpy()
+    if hasattr(values, "to_numpy"):
+        # pyarrow Array / ChunkedArray
+        return values.to_numpy(zero_copy_only=False)
+    return np.asarray(values)
+
+
+def insert_columns(client, table, columns, block_size=LOADER_BLOCK_SIZE, verbose=True):
+    """
+    Вставляет данные в ClickHouse по колонкам, блоками по block_size строк.
+
+    columns — {имя колонки: numpy массив / pandas Series / pyarrow Array}.
+    В драйвер уходят колоночные срезы numpy (columnar=True, use_numpy),
+    без словаря на каждую строку. Возвращает LoadResult.
+    """
+    started = time.time()
+    names = list(columns)
+    arrays = [_to_numpy(columns[name]) for name in names]
+    total = len(arrays[0]) if arrays else 0
+    query = f"INSERT INTO {table} ({', '.join(names)}) VALUES"
+
+    result = LoadResult(table)
+    for start in range(0, total, block_size):
+        block = [a[start:start + block_size] for a in arrays]
+        client.execute(query, block, columnar=True, settings={'use_numpy': True})
+        result.rows += len(block[0])
+        result.blocks += 1
+        if verbose and total > block_size:
+            print(f"   -> {table}: {result.rows} / {total} ({result.rows / total * 100:.1f}%)")
+    result.seconds = time.time() - started
+
+    if verbose:
+        print(f"✅ {result}")
+    return result
+
+
+def insert_dataframe(client, table, df, block_size=LOADER_BLOCK_SIZE, verbose=True):
+    """Колоночная вставка pandas DataFrame."""
+    return insert_columns(client, table, {c: df[c] for c in df.columns}, block_size, verbose)
+
+
+def insert_arrow(client, table, arrow_table, block_size=LOADER_BLOCK_SIZE, verbose=True):
+    """
+    Колоночная вставка pyarrow Table.
+    Таблица режется на срезы (без копирования), в numpy переводится только текущий блок.
+    """
+    result = LoadResult(table)
+    total = arrow_table.num_rows
+    for start in range(0, total, block_size):
+        chunk = arrow_table.slice(start, block_size)
+        columns = {name: chunk.column(name) for name in chunk.column_names}
+        result += insert_columns(client, table, columns, block_size, verbose=False)
+        if verbose and total > block_size:
+            print(f"   -> {table}: {result.rows} / {total} ({result.rows / total * 100:.1f}%)")
+    if verbose:
+        print(f"✅ {result}")
+    return result
+
+
+def insert_spark(client, table, spark_df, block_size=LOADER_BLOCK_SIZE, verbose=True):
+    """
+    Колоночная вставка Spark DataFrame через Arrow.
+    На драйвер данные приходят колоночным Arrow-буфером, а не Row-объектами.
+    """
+    if hasattr(spark_df, "toArrow"):
+        # Spark 4+: Arrow-таблица без pandas
+        return insert_arrow(client, table, spark_df.toArrow(), block_size, verbose)
+    # Spark 3.x: toPandas с включенным spark.sql.execution.arrow.pyspark.enabled
+    return insert_dataframe(client, table, spark_df.toPandas(), block_size, verbose)
+
+
+def _partition_writer(table, names, config, block_size):
+    """
+    Функция для mapPartitions: пишет одну партицию Spark своим соединением.
+    Выполняется в Python-воркере Spark, поэтому клиент создается внутри.
+    """
+    query = f"INSERT INTO {table} ({', '.join(names)}) VALUES"
+
+    def write(rows):
+        from clickhouse_driver import Client
+        client = Client(**config)
+        columns = [[] for _ in names]
+        count = blocks = 0
+        try:
+            for row in rows:
+                for i, value in enumerate(row):
+                    columns[i].append(value)
+                if len(columns[0]) >= block_size:
+                    client.execute(query, columns, columnar=True)
+                    count += len(columns[0])
+                    blocks += 1
+                    columns = [[] for _ in names]
+            if columns[0]:
+                client.execute(query, columns, columnar=True)
+                count += len(columns[0])
+                blocks += 1
+        finally:
+            client.disconnect()
+        yield count, blocks
+
+    return write
+
+
+def insert_spark_partitions(table, spark_df, max_writers=LOADER_MAX_WRITERS,
+                            block_size=LOADER_BLOCK_SIZE, config=db_config, expected=None, verbose=True):
+    """
+    Параллельная вставка Spark DataFrame: каждая партиция пишет в ClickHouse
+    из своего воркера и своим соединением, данные через драйвер не идут.
+
+    Одновременно пишут не больше max_writers партиций (coalesce).
+    В конце число вставленных строк сверяется с expected (по умолчанию spark_df.count());
+    при расхождении — RuntimeError. В local[*] задачи не перезапускаются,
+    поэтому дублей от повторных попыток не бывает; на кластере расхождение
+    как раз и покажет такие повторы.
+    """
+    if expected is None:
+        expected = spark_df.count()
+
+    started = time.time()
+    df = spark_df
+    if df.rdd.getNumPartitions() > max_writers:
+        df = df.coalesce(max_writers)
+    writers = df.rdd.getNumPartitions()
+    if verbose:
+        print(f"   -> {table}: {expected} строк, писателей: {writers}")
+
+    # Воркеры импортируют warehouse.loader — скрипты запускаются из корня проекта
+    stats = df.rdd.mapPartitions(_partition_writer(table, df.columns, config, block_size)).collect()
+
+    result = LoadResult(table, sum(c for c, _ in stats), sum(b for _, b in stats), time.time() - started)
+    if result.rows != expected:
+        raise RuntimeError(f"{table}: вставлено {result.rows} строк, ожидалось {expected}")
+    if verbose:
+        print(f"✅ {result} (сверка с count() пройдена)")
+    return result
+
+
+def load_spark(client, table, spark_df, mode=LOADER_MODE, expected=None, **kwargs):
+    """
+    Вставка Spark DataFrame в выбранном режиме: 'driver' или 'partitions'.
+    Если передан expected (уже известное число строк), сверка идет с ним без лишнего count().
+    """
+    if mode == "partitions":
+        return insert_spark_partitions(table, spark_df, expected=expected, **kwargs)
+    if mode == "driver":
+        result = insert_spark(client, table, spark_df, **kwargs)
+        if expected is not None and result.rows != expected:
+            raise RuntimeError(f"{table}: вставлено {result.rows} строк, ожидалось {expected}")
+        return result
+    raise ValueError(f"Неизвестный режим загрузки: {mode}")
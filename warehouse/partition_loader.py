@@ -0,0 +1,205 @@
+import time
+import argparse
+
+from warehouse.connection import get_db_client
+from warehouse import rollups
+
+FACT_TABLE = "weather_db.fact_weather"
+STAGING_TABLE = "weather_db.fact_weather_staging"
+LEDGER_TABLE = "weather_db.load_ledger"
+
+# Календарные колонки fact_weather, вычисляемые из time_id (YYYYMMDDHH) при вставке.
+# Загрузчики их не передают; запросы фильтруют и группируют по ним без JOIN с dim_time.
+_DATE_EXPR = "makeDate(intDiv(time_id, 1000000), intDiv(time_id, 10000) % 100, intDiv(time_id, 100) % 100)"
+FACT_TIME_COLUMNS = [
+    ("year", "UInt16", "intDiv(time_id, 1000000)"),
+    ("month", "UInt8", "intDiv(time_id, 10000) % 100"),
+    ("day", "UInt8", "intDiv(time_id, 100) % 100"),
+    ("hour", "UInt8", "time_id % 100"),
+    ("date", "Date", _DATE_EXPR),
+    ("timestamp", "DateTime('UTC')", f"addHours(toDateTime({_DATE_EXPR}, 'UTC'), time_id % 100)"),
+    ("day_of_week", "UInt8", f"toDayOfWeek({_DATE_EXPR})"),
+]
+
+# Ключ партиции fact_weather: месяц YYYYMM. Строится из колонок year/month,
+# поэтому по ним есть minmax-индекс партиций и фильтр "year BETWEEN" отсекает лишние месяцы.
+PARTITION_EXPR = "year * 100 + month"
+
+
+def time_columns_ddl():
+    """Календарные колонки для CREATE TABLE fact_weather."""
+    return [f"{name} {type_} MATERIALIZED {expr}" for name, type_, expr in FACT_TIME_COLUMNS]
+
+FACT_COLUMNS = [
+    "time_id", "location_id",
+    "temperature_c", "dewpoint_c",
+    "max_temp_c", "min_temp_c",
+    "pressure_hpa", "precipitation_mm",
+    "wind_speed_ms", "cloud_cover", "solar_radiation"
+]
+
+# Контрольная сумма не зависит от порядка строк; дубль строки ее меняет (в отличие от XOR)
+CHECKSUM_EXPR = f"sum(cityHash64({', '.join(FACT_COLUMNS)}))"
+
+
+def create_ledger(client):
+    client.execute(f'''
+        CREATE TABLE IF NOT EXISTS {LEDGER_TABLE} (
+            partition UInt32,
+            loaded_at DateTime('UTC'),
+            source String,
+            engine String,
+            loaded_rows UInt64,
+            partition_rows UInt64,
+            checksum UInt64,
+            seconds Float32
+        ) ENGINE = MergeTree()
+        ORDER BY (partition, loaded_at)
+    ''')
+
+
+def check_fact_partitioning(client):
+    """REPLACE PARTITION на таблице без партиций заменил бы ее целиком — проверяем ключ заранее."""
+    rows = client.execute(
+        "SELECT partition_key FROM system.tables WHERE database = 'weather_db' AND name = 'fact_weather'"
+    )
+    key = rows[0][0] if rows else None
+    if key is None or _normalize(key) != _normalize(PARTITION_EXPR):
+        raise RuntimeError(
+            f"fact_weather разбита по '{key}', ожидалось '{PARTITION_EXPR}'. "
+            "Запустите: python -m warehouse.partition_loader migrate"
+        )
+
+
+def _normalize(expr):
+    # ClickHouse хранит ключ со скобками: "(year * 100) + month"
+    return expr.replace(" ", "").replace("(", "").replace(")", "")
+
+
+def month_partition(d):
+    return d.year * 100 + d.month
+
+
+def replace_partition(client, partition, load, replaced_days=None, source="", engine=""):
+    """
+    Идемпотентная загрузка одного месяца fact_weather.
+
+    1. staging (копия структуры fact_weather) очищается;
+    2. если грузится не весь месяц, а отдельные дни (replaced_days — список дат),
+       остальные дни месяца копируются в staging из fact_weather на стороне сервера;
+    3. load(STAGING_TABLE) вставляет новые строки (должен вернуть LoadResult);
+    4. ALTER TABLE ... REPLACE PARTITION атомарно подменяет месяц;
+       materialized views на staging собрали тот же месяц в rollup-staging,
+       он подменяется в weather_daily/weather_monthly, год пересчитывается;
+    5. в load_ledger пишется строка с числом строк и контрольной суммой.
+
+    Повторный запуск за ту же дату дает тот же результат, а не второй экземпляр строк.
+    Одновременно может работать только один загрузчик (staging общий).
+    """
+    started = time.time()
+    check_fact_partitioning(client)
+    client.execute(f"CREATE TABLE IF NOT EXISTS {STAGING_TABLE} AS {FACT_TABLE}")
+    client.execute(f"TRUNCATE TABLE {STAGING_TABLE}")
+    with_rollups = rollups.rollups_exist(client)
+    if with_rollups:
+        rollups.truncate_staging(client)
+
+    if replaced_days:
+        days = ", ".join(d.strftime("%Y%m%d") for d in replaced_days)
+        client.execute(f'''
+            INSERT INTO {STAGING_TABLE}
+            SELECT * FROM {FACT_TABLE}
+            WHERE {PARTITION_EXPR} = {partition} AND intDiv(time_id, 100) NOT IN ({days})
+        ''')
+
+    result = load(STAGING_TABLE)
+
+    stray = client.execute(f"SELECT count() FROM {STAGING_TABLE} WHERE {PARTITION_EXPR} != {partition}")[0][0]
+    if stray:
+        raise RuntimeError(f"В staging {stray} строк не из партиции {partition} — загрузка отменена")
+    partition_rows, checksum = client.execute(
+        f"SELECT count(), {CHECKSUM_EXPR} FROM {STAGING_TABLE}"
+    )[0]
+
+    client.execute(f"ALTER TABLE {FACT_TABLE} REPLACE PARTITION ID '{partition}' FROM {STAGING_TABLE}")
+    client.execute(f"TRUNCATE TABLE {STAGING_TABLE}")
+    if with_rollups:
+        rollups.publish_partition(client, partition)
+
+    entry = {
+        "partition": partition, "source": source, "engine": engine,
+        "loaded_rows": result.rows, "partition_rows": partition_rows,
+        "checksum": checksum, "seconds": time.time() - started,
+    }
+    create_ledger(client)
+    client.execute(
+        f"INSERT INTO {LEDGER_TABLE} (partition, loaded_at, source, engine, loaded_rows, partition_rows, checksum, seconds) VALUES",
+        [(partition, int(time.time()), source, engine, result.rows, partition_rows, checksum, entry["seconds"])]
+    )
+    print(f"✅ Партиция {partition} заменена: {partition_rows} строк ({result.rows} новых), checksum {checksum}")
+    return entry
+
+
+def migrate(client):
+    """
+    Переводит существующую fact_weather на партиции по месяцам с календарными колонками
+    (данные копируются на сервере, таблицы подменяются через EXCHANGE TABLES).
+    """
+    try:
+        check_fact_partitioning(client)
+        print("fact_weather уже разбита по месяцам.")
+        return
+    except RuntimeError:
+        pass
+
+    time_names = ", ".join(f"'{name}'" for name, _, _ in FACT_TIME_COLUMNS)
+    base = client.execute(
+        "SELECT name, type FROM system.columns WHERE database = 'weather_db' AND table = 'fact_weather' "
+        f"AND default_kind != 'MATERIALIZED' AND name NOT IN ({time_names}) ORDER BY position"
+    )
+    columns = [name for name, _ in base]
+    ddl = ",\n".join([f"{name} {type_}" for name, type_ in base] + time_columns_ddl())
+
+    print("Создание fact_weather_new (календарные колонки, PARTITION BY месяц)...")
+    client.execute("DROP TABLE IF EXISTS weather_db.fact_weather_new")
+    client.execute(f"CREATE TABLE weather_db.fact_weather_new ({ddl}) ENGINE = MergeTree() "
+                   f"PARTITION BY {PARTITION_EXPR} ORDER BY (time_id, location_id)")
+    print("Копирование данных...")
+    client.execute(f"INSERT INTO weather_db.fact_weather_new ({', '.join(columns)}) "
+                   f"SELECT {', '.join(columns)} FROM {FACT_TABLE}")
+    client.execute(f"EXCHANGE TABLES weather_db.fact_weather_new AND {FACT_TABLE}")
+    client.execute("DROP TABLE weather_db.fact_weather_new")
+    # staging должен совпадать по структуре с fact_weather (REPLACE PARTITION)
+    client.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+    client.execute(f"CREATE TABLE {STAGING_TABLE} AS {FACT_TABLE}")
+    create_ledger(client)
+    print("✅ fact_weather разбита по месяцам.")
+
+
+def print_ledger(client, limit=20):
+    rows = client.execute(
+        f"SELECT partition, loaded_at, source, engine, loaded_rows, partition_rows, checksum "
+        f"FROM {LEDGER_TABLE} ORDER BY loaded_at DESC LIMIT {limit}"
+    )
+    print(f"{'Партиция':<9} {'Когда':<20} {'Источник':<18} {'Движок':<8} {'Новых':>10} {'Всего':>10}  Checksum")
+    for partition, loaded_at, source, engine, loaded, total, checksum in rows:
+        print(f"{partition:<9} {str(loaded_at):<20} {source:<18} {engine:<8} {loaded:>10} {total:>10}  {checksum}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Загрузка fact_weather через REPLACE PARTITION")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("migrate", help="Разбить существующую fact_weather по месяцам")
+    ledger = sub.add_parser("ledger", help="Последние загрузки из load_ledger")
+    ledger.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    client = get_db_client()
+    if args.command == "migrate":
+        migrate(client)
+    elif args.command == "ledger":
+        print_ledger(client, args.limit)
+
+
+if __name__ == "__main__":
+    main()
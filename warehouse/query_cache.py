@@ -0,0 +1,228 @@
+import os
+import re
+import time
+import uuid
+import atexit
+import pickle
+import shutil
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from config import QUERY_CACHE_MAX_MB, QUERY_CACHE_DIR, QUERY_CACHE_VERSION_TTL
+
+
+def normalize_sql(query):
+    """Запрос без комментариев и лишних пробелов: одинаковый SQL с разным форматированием — один ключ."""
+    query = re.sub(r"--[^\n]*", " ", query)
+    return re.sub(r"\s+", " ", query).strip()
+
+
+# Маркер версии данных: число загрузок в load_ledger и время последней (для базы без журнала —
+# последний time_id и число строк fact_weather, оба берутся из метаданных кусков)
+DATA_VERSION_QUERY = "SELECT count(), max(loaded_at) FROM load_ledger"
+DATA_VERSION_FALLBACK_QUERY = "SELECT max(time_id), count() FROM fact_weather"
+
+
+def data_version(client):
+    """
+    Дешевый маркер версии данных. Меняется ровно тогда, когда загрузчик заменил партицию.
+    """
+    try:
+        loads, last_loaded = client.execute(DATA_VERSION_QUERY)[0]
+        return f"ledger:{loads}:{last_loaded}"
+    except Exception:
+        last_time_id, rows = client.execute(DATA_VERSION_FALLBACK_QUERY)[0]
+        return f"fact:{last_time_id}:{rows}"
+
+
+class QueryCache:
+    """
+    LRU-кэш DataFrame-результатов по ключу (версия данных, нормализованный SQL).
+
+    Держит в памяти не больше max_mb; вытесненные результаты пишутся в disk_dir
+    и поднимаются оттуда при следующем обращении. Когда версия данных меняется,
+    все старые записи становятся недостижимыми и удаляются.
+
+    Каждый кэш (и каждый процесс) пишет в свою подпапку disk_dir, поэтому воркеры Flask
+    и ASGI-приложение не удаляют файлы друг друга. Чтение и запись файлов идут вне
+    блокировки, а в aget_or_run — в пуле потоков, не в event loop.
+
+    get_or_run — для синхронного кода (version_func обычная функция),
+    aget_or_run — для asyncio (version_func и run — корутины).
+    """
+
+    def __init__(self, version_func, max_mb=QUERY_CACHE_MAX_MB, disk_dir=QUERY_CACHE_DIR,
+                 version_ttl=QUERY_CACHE_VERSION_TTL):
+        self.version_func = version_func
+        self.max_bytes = int(max_mb * 1024 ** 2)
+        self.disk_dir = disk_dir
+        self.version_ttl = version_ttl
+        self._instance = uuid.uuid4().hex[:8]
+        self._entries = OrderedDict()    # key -> (DataFrame, байт)
+        self._spilled = set()            # ключи, лежащие на диске
+        self._bytes = 0
+        self._version = None
+        self._version_checked = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "spills": 0, "invalidations": 0}
+        if disk_dir:
+            atexit.register(self._remove_spill_dir)
+
+    def _version_stale(self):
+        # Версию спрашиваем не чаще раза в version_ttl секунд
+        return self._version is None or time.monotonic() - self._version_checked > self.version_ttl
+
+    def _set_version(self, version):
+        """Запоминает версию; при смене очищает память. Возвращает ключи устаревших файлов на диске."""
+        stale = []
+        with self._lock:
+            if version != self._version:
+                if self._version is not None:
+                    self._stats["invalidations"] += 1
+                self._entries.clear()
+                self._bytes = 0
+                stale, self._spilled = list(self._spilled), set()
+                self._version = version
+            self._version_checked = time.monotonic()
+        return stale
+
+    def _key(self, version, query):
+        version_hash = hashlib.sha1(version.encode()).hexdigest()[:12]
+        query_hash = hashlib.sha1(normalize_sql(query).encode()).hexdigest()
+        return f"{version_hash}_{query_hash}"
+
+    def _spill_dir(self):
+        # pid берется при каждом вызове: после fork у процесса-потомка своя папка
+        return os.path.join(self.disk_dir, f"{os.getpid()}_{self._instance}")
+
+    def _disk_path(self, key):
+        return os.path.join(self._spill_dir(), f"{key}.pkl")
+
+    def _remove_spill_dir(self):
+        shutil.rmtree(self._spill_dir(), ignore_errors=True)
+
+    def _remove_files(self, keys):
+        for key in keys:
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+
+    def _put(self, key, df):
+        """Кладет результат в память (под блокировкой). Возвращает вытесненные [(key, df)]."""
+        size = int(df.memory_usage(deep=True).sum())
+        if size > self.max_bytes:
+            return []
+        self._entries[key] = (df, size)
+        self._bytes += size
+        evicted = []
+        while self._bytes > self.max_bytes:
+            old_key, (old_df, old_size) = self._entries.popitem(last=False)
+            self._bytes -= old_size
+            self._stats["evictions"] += 1
+            if self.disk_dir:
+                evicted.append((old_key, old_df))
+        return evicted
+
+    def _spill(self, version, evicted):
+        """Пишет вытесненные результаты на диск (блокирующий вызов, без блокировки кэша)."""
+        if not evicted:
+            return
+        os.makedirs(self._spill_dir(), exist_ok=True)
+        for key, df in evicted:
+            path = self._disk_path(key)
+            df.to_pickle(path + ".tmp")
+            os.replace(path + ".tmp", path)
+            with self._lock:
+                if version == self._version:
+                    self._spilled.add(key)
+                    self._stats["spills"] += 1
+                    continue
+            # Пока писали, версия сменилась — файл уже не нужен
+            os.remove(path)
+
+    def _lookup(self, version, query):
+        """
+        Поиск в памяти: (key, копия результата, False) при попадании,
+        (key, None, True) — результат на диске, (key, None, False) — промах.
+        """
+        key = self._key(version, query)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return key, self._entries[key][0].copy(), False
+            if key in self._spilled:
+                self._spilled.discard(key)
+                return key, None, True
+            self._stats["misses"] += 1
+        return key, None, False
+
+    def _load_spilled(self, version, key):
+        """Поднимает результат с диска обратно в память (блокирующий вызов). None — файла нет."""
+        path = self._disk_path(key)
+        try:
+            df = pd.read_pickle(path)
+            os.remove(path)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        with self._lock:
+            self._stats["disk_hits"] += 1
+        self._store(version, key, df)
+        return df.copy()
+
+    def _remember(self, version, key, df):
+        """В память (под блокировкой). Возвращает вытесненное — его пишет на диск вызывающий."""
+        with self._lock:
+            # Пока шел запрос, могли загрузить новые данные — такой результат не сохраняем
+            return self._put(key, df) if version == self._version else []
+
+    def _store(self, version, key, df):
+        self._spill(version, self._remember(version, key, df))
+
+    def get_or_run(self, query, run):
+        """Результат query из кэша или run(query) (и сохранить). Возвращает копию — вызывающий может ее менять."""
+        if self._version_stale():
+            self._remove_files(self._set_version(self.version_func()))
+        version = self._version
+        key, df, on_disk = self._lookup(version, query)
+        if on_disk:
+            df = self._load_spilled(version, key)
+        if df is None:
+            df = run(query)
+            self._store(version, key, df)
+            df = df.copy()
+        return df
+
+    async def aget_or_run(self, query, run):
+        """То же для asyncio: run(query) и version_func() — корутины; работа с диском — в пуле потоков."""
+        loop = asyncio.get_running_loop()
+        if self._version_stale():
+            stale = self._set_version(await self.version_func())
+            if stale:
+                await loop.run_in_executor(None, self._remove_files, stale)
+        version = self._version
+        key, df, on_disk = self._lookup(version, query)
+        if on_disk:
+            df = await loop.run_in_executor(None, self._load_spilled, version, key)
+        if df is None:
+            df = await run(query)
+            evicted = self._remember(version, key, df)
+            if evicted:
+                await loop.run_in_executor(None, self._spill, version, evicted)
+            df = df.copy()
+        return df
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["disk_hits"] + self._stats["misses"]
+            hit_rate = (self._stats["hits"] + self._stats["disk_hits"]) / lookups if lookups else 0.0
+            return {"version": self._version, "entries": len(self._entries),
+                    "memory_mb": round(self._bytes / 1024 ** 2, 2), "max_mb": round(self.max_bytes / 1024 ** 2, 2),
+                    "hit_rate": round(hit_rate, 3), **self._stats}
@@ -0,0 +1,204 @@
+import time
+import argparse
+
+from warehouse.connection import get_db_client
+
+# Агрегаты по точке и периоду: состояния avg/min/max температуры и sum/min/max осадков
+AGGREGATES = [
+    # (колонка, функция, исходная колонка fact_weather, тип аргумента состояния)
+    ("temp_avg", "avg", "temperature_c", "Float64"),
+    ("temp_min", "min", "temperature_c", "Float64"),
+    ("temp_max", "max", "temperature_c", "Float64"),
+    ("precip_sum", "sum", "precipitation_mm", "Float32"),
+    ("precip_min", "min", "precipitation_mm", "Float32"),
+    ("precip_max", "max", "precipitation_mm", "Float32"),
+]
+
+# Уровни: таблица, ключевые колонки, ключ партиции, ORDER BY.
+# Период отсекается партициями, поэтому сортировка начинается с точки:
+# фильтр по location_id (точка, прямоугольник) читает несколько гранул.
+ROLLUPS = {
+    "daily": {
+        "table": "weather_daily",
+        "keys": [("date", "Date"), ("year", "UInt16"), ("month", "UInt8"), ("location_id", "UInt32")],
+        "partition": "year * 100 + month",
+        "order": "(location_id, date)",
+    },
+    "monthly": {
+        "table": "weather_monthly",
+        "keys": [("year", "UInt16"), ("month", "UInt8"), ("location_id", "UInt32")],
+        "partition": "year * 100 + month",
+        "order": "(location_id, year, month)",
+    },
+    "yearly": {
+        "table": "weather_yearly",
+        "keys": [("year", "UInt16"), ("location_id", "UInt32")],
+        "partition": "year",
+        "order": "(location_id, year)",
+    },
+}
+
+# Таблица, из которой строится уровень, и нужен ли -MergeState (источник уже агрегирован)
+SOURCES = {"daily": ("fact_weather", False), "monthly": ("daily", True), "yearly": ("monthly", True)}
+
+# Какой уровень отвечает на группировку дашборда (самый грубый из подходящих)
+LEVEL_FOR_GROUP = {"year": "yearly", "month": "monthly", "day": "daily"}
+
+
+def rollup_table(group_by):
+    """Таблица, из которой читать группировку 'day' / 'month' / 'year' (по умолчанию — год)."""
+    return ROLLUPS[LEVEL_FOR_GROUP.get(group_by, "yearly")]["table"]
+
+
+def staging(table):
+    return f"{table}_staging"
+
+
+def _source_table(level):
+    source, _ = SOURCES[level]
+    return source if source == "fact_weather" else ROLLUPS[source]["table"]
+
+
+def rollup_select(level, source_table=None):
+    """
+    SELECT, строящий уровень level из источника (fact_weather или уровня ниже).
+    Используется и в materialized view, и в backfill — формулы одни и те же.
+    """
+    source, merge = SOURCES[level]
+    source_table = source_table or _source_table(level)
+    keys = [name for name, _ in ROLLUPS[level]["keys"]]
+    if merge:
+        states = [f"{func}MergeState({col}) AS {col}" for col, func, _, _ in AGGREGATES]
+    else:
+        # CAST: тип состояния не зависит от схемы fact_weather (Float64 или Float32, см. fact_schema)
+        states = [f"{func}State(CAST({src}, '{type_}')) AS {col}" for col, func, src, type_ in AGGREGATES]
+    return (f"SELECT {', '.join(keys)}, {', '.join(states)} "
+            f"FROM {source_table} GROUP BY {', '.join(keys)}")
+
+
+def _table_ddl(name, level):
+    spec = ROLLUPS[level]
+    columns = [f"{col} {type_}" for col, type_ in spec["keys"]]
+    columns += [f"{col} AggregateFunction({func}, {type_})" for col, func, _, type_ in AGGREGATES]
+    return (f"CREATE TABLE IF NOT EXISTS {name} ({', '.join(columns)}) "
+            f"ENGINE = AggregatingMergeTree() PARTITION BY {spec['partition']} ORDER BY {spec['order']}")
+
+
+def create_rollups(client):
+    """
+    Таблицы weather_daily/monthly/yearly и их staging-копии + materialized views.
+
+    Загрузчик пишет факты в fact_weather_staging и подменяет месяц через REPLACE PARTITION,
+    а REPLACE materialized views не запускает. Поэтому MV висят на staging-цепочке
+    (fact_weather_staging -> weather_daily_staging -> weather_monthly_staging),
+    и после загрузки месяц подменяется и в rollup-таблицах (см. publish_partition).
+    """
+    for level in ROLLUPS:
+        table = ROLLUPS[level]["table"]
+        client.execute(_table_ddl(table, level))
+        client.execute(_table_ddl(staging(table), level))
+
+    client.execute("CREATE TABLE IF NOT EXISTS fact_weather_staging AS fact_weather")
+    for level in ("daily", "monthly"):
+        _create_view(client, level)
+
+
+def _create_view(client, level):
+    table = ROLLUPS[level]["table"]
+    source = staging(_source_table(level))
+    client.execute(
+        f"CREATE MATERIALIZED VIEW IF NOT EXISTS {table}_mv TO {staging(table)} "
+        f"AS {rollup_select(level, source)}"
+    )
+
+
+def recreate_fact_staging(client):
+    """
+    Пересоздает fact_weather_staging по текущей структуре fact_weather (после миграций схемы,
+    REPLACE PARTITION требует одинаковой структуры). MV weather_daily_mv читает этот staging,
+    поэтому пересоздается вместе с ним — иначе rollups молча перестанут обновляться.
+    """
+    view = f"{ROLLUPS['daily']['table']}_mv"
+    client.execute(f"DROP VIEW IF EXISTS {view}")
+    client.execute("DROP TABLE IF EXISTS fact_weather_staging")
+    client.execute("CREATE TABLE fact_weather_staging AS fact_weather")
+    if rollups_exist(client):
+        _create_view(client, "daily")
+
+
+def drop_rollups(client):
+    for level in ("daily", "monthly"):
+        client.execute(f"DROP VIEW IF EXISTS {ROLLUPS[level]['table']}_mv")
+    for level in ROLLUPS:
+        table = ROLLUPS[level]["table"]
+        client.execute(f"DROP TABLE IF EXISTS {staging(table)}")
+        client.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def rollups_exist(client):
+    rows = client.execute(
+        "SELECT count() FROM system.tables WHERE database = 'weather_db' "
+        f"AND name IN ({', '.join(repr(r['table']) for r in ROLLUPS.values())})"
+    )
+    return rows[0][0] == len(ROLLUPS)
+
+
+def truncate_staging(client):
+    for level in ROLLUPS:
+        client.execute(f"TRUNCATE TABLE IF EXISTS {staging(ROLLUPS[level]['table'])}")
+
+
+def publish_partition(client, partition):
+    """
+    Вызывается после REPLACE PARTITION в fact_weather: MV уже собрали месяц в
+    weather_daily_staging / weather_monthly_staging, подменяем его и там;
+    год (12 строк на точку) пересобирается из weather_monthly.
+    """
+    for level in ("daily", "monthly"):
+        table = ROLLUPS[level]["table"]
+        client.execute(f"ALTER TABLE {table} REPLACE PARTITION ID '{partition}' FROM {staging(table)}")
+
+    year = partition // 100
+    yearly = ROLLUPS["yearly"]["table"]
+    monthly = ROLLUPS["monthly"]["table"]
+    client.execute(f"TRUNCATE TABLE {staging(yearly)}")
+    client.execute(f"INSERT INTO {staging(yearly)} "
+                   f"{rollup_select('yearly', f'(SELECT * FROM {monthly} WHERE year = {year})')}")
+    client.execute(f"ALTER TABLE {yearly} REPLACE PARTITION ID '{year}' FROM {staging(yearly)}")
+    truncate_staging(client)
+
+
+def backfill(client):
+    """Пересобирает все уровни из fact_weather (после создания rollup-таблиц на непустой базе)."""
+    for level in ROLLUPS:
+        table = ROLLUPS[level]["table"]
+        started = time.time()
+        client.execute(f"TRUNCATE TABLE {table}")
+        client.execute(f"INSERT INTO {table} {rollup_select(level)}")
+        rows = client.execute(f"SELECT count() FROM {table}")[0][0]
+        print(f"✅ {table}: {rows} строк за {time.time() - started:.1f} с")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Агрегаты fact_weather по дням/месяцам/годам")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("create", help="Создать rollup-таблицы и materialized views")
+    sub.add_parser("backfill", help="Пересчитать все уровни из fact_weather")
+    sub.add_parser("rebuild", help="Пересоздать rollup-таблицы (новая структура) и пересчитать")
+    args = parser.parse_args(argv)
+
+    client = get_db_client()
+    if args.command == "create":
+        create_rollups(client)
+        print("✅ Rollup-таблицы созданы.")
+    elif args.command == "backfill":
+        create_rollups(client)
+        backfill(client)
+    elif args.command == "rebuild":
+        drop_rollups(client)
+        create_rollups(client)
+        backfill(client)
+
+
+if __name__ == "__main__":
+    main()